@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Сквозной бенчмарк: синтетические данные в локальном Postgres и корпус запросов
+через parse_intent_rule_based -> сборку SQL -> execute_intent.
+
+Пишет p50/p95/p99 и пропускную способность в JSON; с --baseline сравнивает
+с прошлым прогоном и завершается с кодом 1 при регрессии p95 больше --max-regression.
+
+Пример:
+    python benchmarks/bench_e2e.py --scale 1m --output bench-1m.json
+    python benchmarks/bench_e2e.py --skip-load --output new.json --baseline bench-1m.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from benchmarks.corpus import QUERIES
+from benchmarks.synthetic import SyntheticConfig, SyntheticData, creators_from_texts, parse_scale
+from config.settings import settings
+from db.database import async_database_session_maker, async_read_session_maker, dispose_engines
+from db.partitions import ensure_snapshot_partitions
+from ingest.copy import copy_records
+from ingest.rollups import rebuild_creator_totals, rebuild_daily_stats
+from nlq.rule_based_intent import parse_intent_rule_based
+from nlq.service import execute_intent, set_result_cache
+from nlq.sql_builder import build_grouped_statement, build_metrics_statement, build_scalar_query
+from nlq.time_range import to_utc_datetime_range
+from scripts.import_videos import SNAPSHOT_COLUMNS, VIDEO_COLUMNS, create_tables
+
+STAGES = ("parse", "build", "execute", "total")
+
+
+async def load_synthetic(config: SyntheticConfig, append: bool) -> None:
+    await create_tables()
+    async with async_database_session_maker() as session:
+        has_rows = (await session.execute(text("SELECT EXISTS (SELECT 1 FROM videos)"))).scalar_one()
+        if has_rows and not append:
+            raise SystemExit(
+                "В videos уже есть данные: бенчмарк грузит данные только в пустую БД "
+                "(--append - дописать, --skip-load - мерить на текущих)"
+            )
+
+        data = SyntheticData(config, known_creators=creators_from_texts(QUERIES))
+        print(
+            f"Генерация: {config.snapshots} снапшотов, {config.videos} видео, "
+            f"{config.creators} креаторов, seed={config.seed}"
+        )
+        started_at = time.monotonic()
+        loaded = 0
+        for videos, snapshots in data.batches():
+            await ensure_snapshot_partitions(session, (record[10] for record in snapshots))
+            # Первый execute открывает транзакцию для COPY
+            await session.execute(text("SELECT 1"))
+            await copy_records(session, "videos", videos, VIDEO_COLUMNS)
+            await copy_records(session, "video_snapshots", snapshots, SNAPSHOT_COLUMNS)
+            await session.commit()
+            loaded += len(snapshots)
+            elapsed = time.monotonic() - started_at
+            print(f"Загружено снапшотов: {loaded}, {loaded / elapsed:.0f} строк/с")
+
+        print("Пересчет video_daily_stats и creator_daily_totals...")
+        await rebuild_daily_stats(session)
+        await rebuild_creator_totals(session)
+        # Статистика планировщика под новые объемы, иначе планы будут от пустых таблиц
+        await session.execute(text("ANALYZE videos, video_snapshots, video_daily_stats, creator_daily_totals"))
+        await session.commit()
+
+
+def build_statement(intent):
+    tr = to_utc_datetime_range(intent.time_range)
+    if intent.group_by is not None:
+        return build_grouped_statement(intent, tr)
+    if intent.metrics:
+        return build_metrics_statement(intent, tr)
+    return build_scalar_query(intent, tr)
+
+
+async def run_query(query: str) -> dict[str, float]:
+    timings = {}
+    start = time.perf_counter()
+    intent = parse_intent_rule_based(query)
+    timings["parse"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    build_statement(intent)
+    timings["build"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    async with async_read_session_maker() as session:
+        await execute_intent(session, intent)
+    timings["execute"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+    return timings
+
+
+async def run_corpus(rounds: int, concurrency: int) -> tuple[dict[str, dict[str, list[float]]], list[str], float]:
+    """Время стадий по каждому запросу, неразобранные запросы и общее время прогона."""
+    queries = []
+    unsupported = []
+    for query in QUERIES:
+        try:
+            parse_intent_rule_based(query)
+        except ValueError:
+            unsupported.append(query)
+        else:
+            queries.append(query)
+
+    samples = {query: {stage: [] for stage in STAGES} for query in queries}
+    jobs = [query for _ in range(rounds) for query in queries]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(query: str) -> None:
+        async with semaphore:
+            timings = await run_query(query)
+        for stage, value in timings.items():
+            samples[query][stage].append(value)
+
+    # Прогрев: пул соединений, кэши подготовленных запросов и сборки SQL
+    for query in queries:
+        await run_query(query)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(query) for query in jobs))
+    return samples, unsupported, time.perf_counter() - started_at
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        value = values[0] * 1000 if values else 0.0
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value, "n": len(values)}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "n": len(values),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> bool:
+    """Печатает изменение p95 по запросам, True - если регрессий сверх порога нет."""
+    ok = True
+    rows = [("overall", report["overall"]["total"], baseline["overall"]["total"])]
+    rows += [
+        (query, stats["total"], baseline["queries"][query]["total"])
+        for query, stats in report["queries"].items()
+        if query in baseline.get("queries", {})
+    ]
+    for name, current, previous in rows:
+        if not previous["p95_ms"]:
+            continue
+        change = (current["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        mark = ""
+        if change > max_regression:
+            ok = False
+            mark = "  <-- регрессия"
+        print(f"{change:+7.1f}%  p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms  {name}{mark}")
+    return ok
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк на синтетических данных")
+    parser.add_argument("--scale", default="10k", help="Число снапшотов: 10k, 1m, 100m или число")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=61, help="Длина окна данных с 2025-10-01")
+    parser.add_argument("--hours-per-video", type=int, default=72, help="Снапшотов (часов) на ролик")
+    parser.add_argument("--skip-load", action="store_true", help="Мерить на данных, уже лежащих в БД")
+    parser.add_argument("--append", action="store_true", help="Дописать данные в непустую БД")
+    parser.add_argument("--rounds", type=int, default=20, help="Сколько раз прогнать корпус")
+    parser.add_argument("--concurrency", type=int, default=1, help="Одновременных запросов")
+    parser.add_argument("--with-cache", action="store_true", help="Не отключать кэш результатов")
+    parser.add_argument("--output", default="bench-results.json", help="Куда записать JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Допустимый рост p95, %%")
+    args = parser.parse_args()
+
+    config = SyntheticConfig(
+        snapshots=parse_scale(args.scale),
+        days=args.days,
+        hours_per_video=args.hours_per_video,
+        seed=args.seed,
+    )
+    if not args.with_cache:
+        # Иначе после первого круга мерился бы только кэш
+        settings.RESULT_CACHE_BACKEND = "none"
+        set_result_cache(None)
+
+    try:
+        if not args.skip_load:
+            await load_synthetic(config, args.append)
+        samples, unsupported, elapsed = await run_corpus(args.rounds, args.concurrency)
+    finally:
+        await dispose_engines()
+
+    executed = sum(len(stats["total"]) for stats in samples.values())
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "scale": None if args.skip_load else config.snapshots,
+            "videos": None if args.skip_load else config.videos,
+            "creators": None if args.skip_load else config.creators,
+            "seed": args.seed,
+            "rounds": args.rounds,
+            "concurrency": args.concurrency,
+            "result_cache": args.with_cache,
+            "use_daily_rollups": settings.USE_DAILY_ROLLUPS,
+            "use_creator_totals": settings.USE_CREATOR_TOTALS,
+        },
+        "overall": {
+            stage: percentiles([v for stats in samples.values() for v in stats[stage]])
+            for stage in STAGES
+        },
+        "throughput_qps": round(executed / elapsed, 2) if elapsed else None,
+        "queries": {
+            query: {stage: percentiles(stats[stage]) for stage in STAGES}
+            for query, stats in samples.items()
+        },
+        "unsupported": unsupported,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    total = report["overall"]["total"]
+    print(
+        f"Запросов: {executed}, p50 {total['p50_ms']:.2f} ms, p95 {total['p95_ms']:.2f} ms, "
+        f"p99 {total['p99_ms']:.2f} ms, {report['throughput_qps']} запросов/с"
+    )
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if not compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
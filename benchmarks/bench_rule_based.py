@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Микробенчмарк parse_intent_rule_based: сообщений в секунду на корпусе запросов.
+
+Текущий разбор сравнивается с исходным из benchmarks/baseline_rule_based.py.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.baseline_rule_based import parse_intent_rule_based as parse_baseline
+from benchmarks.corpus import QUERIES
+from nlq.rule_based_intent import parse_intent_rule_based
+
+
+def run(parse, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in QUERIES:
+            try:
+                parse(text)
+            except ValueError:
+                pass
+    return rounds * len(QUERIES) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора запросов без LLM")
+    parser.add_argument("--rounds", type=int, default=2000, help="Сколько раз прогнать корпус")
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько замеров сделать, берется лучший")
+    args = parser.parse_args()
+
+    print(f"Запросов в корпусе: {len(QUERIES)}")
+    results = {}
+    for name, parse in (("исходный", parse_baseline), ("текущий", parse_intent_rule_based)):
+        run(parse, max(1, args.rounds // 10))
+        results[name] = max(run(parse, args.rounds) for _ in range(args.repeat))
+        print(f"Сообщений в секунду ({name}): {results[name]:,.0f}")
+    print(f"Ускорение: {results['текущий'] / results['исходный']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Набор типичных запросов к боту для бенчмарков."""
+
+QUERIES = [
+    "Сколько всего видео есть в системе?",
+    "сколько видео в системе",
+    "Сколько видео появилось сегодня?",
+    "Сколько видео вышло вчера",
+    "Сколько видео у креатора aca1061a9d324ecf8c3fa2bb32d7be63 вышло с 1 ноября 2025 по 5 ноября 2025 включительно?",
+    "Сколько видео у креатора 8b76e572-635d-4a32-9c6b-e38d3ad7b6f9 набрало больше 10000 просмотров за все время?",
+    "Сколько видео набрало больше 100000 просмотров за всё время?",
+    "Сколько разных видео получали новые просмотры 27 ноября 2025?",
+    "Сколько уникальных роликов получили прирост лайков 2025-11-20",
+    "На сколько просмотров в сумме выросли все видео 28 ноября 2025?",
+    "На сколько выросли просмотры за 7 дней",
+    "Прирост лайков за последние 3 дня",
+    "Какой суммарный прирост комментариев с 01.11.2025 по 15.11.2025?",
+    "Сколько просмотров набрали видео, опубликованные в июне 2025?",
+    "просмотры за 30 дней",
+    "лайки вчера",
+    "лайки сегодня",
+    "комментарии 01.11.2025-28.11.2025",
+    "Сколько жалоб было вчера?",
+    "Сколько репортов пришло на ролики креатора 8b76e572-635d-4a32-9c6b-e38d3ad7b6f9 за 14 дней",
+    "Увеличение числа просмотров у креатора 8b76e572-635d-4a32-9c6b-e38d3ad7b6f9 с 2025-11-01 по 2025-11-07",
+    "Сколько видосиков вышло 3 октября 2025",
+    "how many views today",
+    "views delta yesterday",
+    "total likes last 7 days",
+    "comments growth last 30 days",
+    "how many videos all time",
+    "reports for creator 8b76e572-635d-4a32-9c6b-e38d3ad7b6f9 2025-11-01 2025-11-30",
+    "how many videos with more than 5000 views all-time",
+    "views delta between 2025-11-10 and 2025-11-12",
+]
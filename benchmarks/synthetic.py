@@ -0,0 +1,138 @@
+"""Синтетические videos и почасовые video_snapshots для бенчмарков.
+
+Данные детерминированы seed'ом. Креаторы распределены по закону Ципфа:
+несколько крупных авторов выпускают большую часть роликов, у остальных - единицы.
+Популярность ролика логнормальная, прирост просмотров затухает с возрастом.
+"""
+from __future__ import annotations
+
+import math
+import random
+import re
+import uuid
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Iterator, Sequence
+
+# Размеры из задачи: число снапшотов
+SCALES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "100m": 100_000_000,
+}
+
+_UUID_RE = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}", re.IGNORECASE)
+
+
+def parse_scale(value: str) -> int:
+    """'10k', '1m', '100m' или просто число снапшотов."""
+    return SCALES.get(value.lower()) or int(value.replace("_", ""))
+
+
+def creators_from_texts(texts: Sequence[str]) -> list[uuid.UUID]:
+    """UUID креаторов из корпуса запросов - им отдаются верхние места рейтинга."""
+    seen: dict[uuid.UUID, None] = {}
+    for text in texts:
+        for match in _UUID_RE.findall(text):
+            seen.setdefault(uuid.UUID(match), None)
+    return list(seen)
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    snapshots: int
+    start: datetime = datetime(2025, 10, 1, tzinfo=timezone.utc)
+    days: int = 61
+    # Сколько часов после публикации у ролика снимается статистика
+    hours_per_video: int = 72
+    videos_per_creator: int = 25
+    zipf_exponent: float = 1.1
+    seed: int = 42
+
+    @property
+    def videos(self) -> int:
+        return max(1, math.ceil(self.snapshots / self.hours_per_video))
+
+    @property
+    def creators(self) -> int:
+        return max(1, self.videos // self.videos_per_creator)
+
+
+class SyntheticData:
+    """Поток строк для COPY в порядке колонок VIDEO_COLUMNS и SNAPSHOT_COLUMNS."""
+
+    def __init__(self, config: SyntheticConfig, known_creators: Sequence[uuid.UUID] = ()):
+        self.config = config
+        rng = random.Random(config.seed)
+        creators = list(known_creators)[: config.creators]
+        creators += [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(config.creators - len(creators))]
+        self._creators = creators
+        self._cum_weights = list(
+            accumulate(1 / (rank + 1) ** config.zipf_exponent for rank in range(len(creators)))
+        )
+
+    def _pick_creator(self, rng: random.Random) -> uuid.UUID:
+        point = rng.random() * self._cum_weights[-1]
+        return self._creators[bisect_left(self._cum_weights, point)]
+
+    def batches(self, batch_rows: int = 50_000) -> Iterator[tuple[list[tuple], list[tuple]]]:
+        """Пачки (видео, их снапшоты), в пачке около batch_rows строк.
+
+        Снапшоты ролика не выходят за конец окна, общее число снапшотов - ровно config.snapshots.
+        """
+        config = self.config
+        rng = random.Random(config.seed + 1)
+        window = timedelta(days=config.days)
+        end = config.start + window
+        remaining = config.snapshots
+
+        videos: list[tuple] = []
+        snapshots: list[tuple] = []
+        for index in range(config.videos):
+            if remaining <= 0:
+                break
+            video_id = uuid.UUID(int=rng.getrandbits(128), version=4)
+            # Публикация с точностью до часа, чтобы снапшоты шли ровно раз в час
+            published = config.start + timedelta(hours=rng.randrange(config.days * 24))
+            hours = min(config.hours_per_video, remaining, int((end - published).total_seconds() // 3600) or 1)
+            # Последние ролики добирают остаток, чтобы сумма сошлась
+            if index == config.videos - 1:
+                hours = remaining
+            remaining -= hours
+
+            popularity = rng.lognormvariate(6, 1.5)
+            totals = [0, 0, 0, 0]
+            for hour in range(hours):
+                decay = math.exp(-hour / 24)
+                views = int(popularity * decay * rng.uniform(0.5, 1.5))
+                deltas = (
+                    views,
+                    int(views * rng.uniform(0.02, 0.08)),
+                    int(views * rng.uniform(0.001, 0.01)),
+                    1 if rng.random() < 0.01 else 0,
+                )
+                totals = [total + delta for total, delta in zip(totals, deltas)]
+                snapshots.append(
+                    (
+                        uuid.UUID(int=rng.getrandbits(128), version=4),
+                        video_id,
+                        *totals,
+                        *deltas,
+                        published + timedelta(hours=hour),
+                    )
+                )
+            videos.append(
+                (
+                    video_id,
+                    self._pick_creator(rng),
+                    published.replace(tzinfo=None),
+                    *totals,
+                )
+            )
+            if len(videos) + len(snapshots) >= batch_rows:
+                yield videos, snapshots
+                videos, snapshots = [], []
+        if videos:
+            yield videos, snapshots
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Какой запрос выбирается для интентов с approximate: итоги креаторов, выборка, HLL или точный.
+
+Порог APPROXIMATE_MIN_ROWS снимается, поэтому каждая форма, которая вообще может стать
+приближенной, становится ею. Для каждого интента проверяется путь запроса, нужны ли ему
+оценки размеров таблиц и что execute_intent возвращает тот же признак approximate,
+что и запрос, по которому он считал. Код выхода 1 при расхождении.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем путь к src директории
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from sqlalchemy import select
+
+from config.settings import settings
+from db.database import async_read_session_maker, dispose_engines
+from models.videos import Video
+from nlq.estimates import refresh_row_estimates
+from nlq.schemas import QueryIntent
+from nlq.service import execute_intent, set_columnar_store, set_result_cache
+from nlq.sql_builder import build_scalar_plan, uses_row_estimates
+from nlq.time_range import to_utc_datetime_range
+
+WHOLE_DAYS = {"type": "last_n_days", "n": 36500}
+
+# (описание, интент, ожидаемый путь при USE_CREATOR_TOTALS)
+CASES = [
+    ("final по целым дням", {"metric": "views", "measure": "final", "time_range": WHOLE_DAYS}, "totals"),
+    (
+        "final с min_views",
+        {"metric": "views", "measure": "final", "time_range": WHOLE_DAYS, "filters": {"min_views": 1000}},
+        "sample",
+    ),
+    ("delta_sum по целым дням", {"metric": "views", "measure": "delta_sum", "time_range": WHOLE_DAYS}, "sample"),
+    (
+        "delta_sum, разные видео",
+        {"metric": "views", "measure": "delta_sum", "time_range": WHOLE_DAYS, "filters": {"unique_videos": True}},
+        "hll",
+    ),
+]
+
+
+def query_path(intent: QueryIntent) -> tuple[str, bool]:
+    q, _, approximate = build_scalar_plan(intent, to_utc_datetime_range(intent.time_range))
+    sql = str(q)
+    if "creator_daily_totals" in sql:
+        path = "totals"
+    elif "video_daily_hll" in sql:
+        path = "hll"
+    elif approximate:
+        path = "sample"
+    else:
+        path = "exact"
+    return path, approximate
+
+
+async def check() -> int:
+    settings.COLUMNAR_BACKEND = False
+    settings.RESULT_CACHE_BACKEND = "none"
+    settings.APPROXIMATE_MIN_ROWS = 0
+    set_result_cache(None)
+    set_columnar_store(None)
+
+    failures = 0
+    async with async_read_session_maker() as session:
+        creator = (await session.execute(select(Video.creator_id).limit(1))).scalar_one_or_none()
+        if creator is None:
+            print("videos пуста, проверять нечего")
+            return 0
+        cases = CASES + [(
+            "final по одному креатору",
+            {
+                "metric": "views",
+                "measure": "final",
+                "time_range": WHOLE_DAYS,
+                "filters": {"creator_id": str(creator), "min_views": 1},
+            },
+            "exact",
+        )]
+        await refresh_row_estimates(session)
+
+        for use_totals in (True, False):
+            settings.USE_CREATOR_TOTALS = use_totals
+            print(f"USE_CREATOR_TOTALS={use_totals}")
+            for name, data, expected in cases:
+                intent = QueryIntent.model_validate({**data, "approximate": True})
+                if expected == "totals" and not use_totals:
+                    expected = "sample"
+                path, approximate = query_path(intent)
+                result = await execute_intent(session, intent)
+                problems = []
+                if path != expected:
+                    problems.append(f"ожидался путь {expected}")
+                if uses_row_estimates(intent) != (expected in ("sample", "hll")):
+                    problems.append("оценки размеров таблиц нужны не тем формам")
+                if result.approximate != approximate:
+                    problems.append(f"execute_intent вернул approximate={result.approximate}")
+                mark = "!" if problems else "+"
+                print(f"[{mark}] {name}: {path}, approximate={approximate}, ответ {result.value}")
+                for problem in problems:
+                    print(f"    {problem}")
+                failures += bool(problems)
+    return 1 if failures else 0
+
+
+async def main() -> int:
+    try:
+        return await check()
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
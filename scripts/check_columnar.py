@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Сверка колоночного бэкенда с Postgres.
+
+Загружает колоночную копию из БД и прогоняет набор интентов (меры, метрики, фильтры,
+разбивки, диапазоны по данным) через колоночную копию и через SQL: скалярные - через
+build_scalar_query, остальные - через execute_intent. Код выхода 1 при расхождении.
+
+С --backfill дополнительно проверяется дочитывание: в БД вставляется снапшот с давним
+created_at, копия дочитывается и сверяется с суммой по video_snapshots, затем строка удаляется.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import timedelta
+from itertools import product
+from pathlib import Path
+
+# Добавляем путь к src директории
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from sqlalchemy import func, select, text
+
+from config.settings import settings
+from db.database import async_database_session_maker, async_read_session_maker, dispose_engines
+from models.video_snapshots import VideoSnapshot
+from models.videos import Video
+from nlq.columnar import ColumnarStore
+from nlq.schemas import GroupBy, Measure, Metric, QueryIntent
+from nlq.service import execute_intent, set_columnar_store, set_result_cache
+from nlq.sql_builder import build_scalar_query, group_row_limit
+from nlq.time_range import to_utc_datetime_range
+
+
+def build_intents(first_day, last_day, creators: list[str], seed: int) -> list[QueryIntent]:
+    rng = random.Random(seed)
+    days = (last_day - first_day).days
+    ranges = [
+        {"type": "last_n_days", "n": 36500},
+        {"type": "today"},
+        {"type": "between", "from": first_day, "to": last_day},
+        {"type": "between", "from": first_day, "to": first_day},
+    ]
+    for _ in range(4):
+        start = first_day + timedelta(days=rng.randrange(days + 1))
+        ranges.append({"type": "between", "from": start, "to": start + timedelta(days=rng.randrange(7))})
+
+    filters = [{}, {"unique_videos": True}, {"min_views": 1000}]
+    filters += [{"creator_id": creator} for creator in creators]
+
+    intents = []
+    for time_range, measure, metric, extra in product(ranges, Measure, Metric, filters):
+        if measure == Measure.delta_sum and metric == Metric.videos:
+            continue
+        if measure == Measure.delta_sum and "min_views" in extra:
+            continue
+        base = {"metric": metric, "measure": measure, "time_range": time_range, "filters": extra}
+        intents.append(QueryIntent.model_validate(base))
+        for group_by in GroupBy:
+            intents.append(QueryIntent.model_validate({**base, "group_by": group_by, "limit": rng.choice([None, 3])}))
+        if metric != Metric.videos and not extra.get("unique_videos"):
+            metrics = [Metric.views, Metric.likes, Metric.comments, Metric.reports]
+            if measure == Measure.final:
+                metrics.append(Metric.videos)
+            intents.append(QueryIntent.model_validate({**base, "metrics": metrics}))
+    return intents
+
+
+async def sql_answer(session, intent: QueryIntent):
+    if intent.group_by is None and not intent.metrics:
+        return int((await session.execute(build_scalar_query(intent))).scalar_one())
+    return (await execute_intent(session, intent)).value
+
+
+def _delta_views_intent(day) -> QueryIntent:
+    return QueryIntent.model_validate({
+        "metric": Metric.views,
+        "measure": Measure.delta_sum,
+        "time_range": {"type": "between", "from": day, "to": day},
+    })
+
+
+async def check_backfill(store: ColumnarStore) -> int:
+    """Снапшот с created_at в начале данных должен попасть в копию при дочитывании."""
+    async with async_database_session_maker() as session:
+        snapshot_id = (await session.execute(text(
+            "INSERT INTO video_snapshots (id, video_id, views_count, likes_count, comments_count, "
+            "reports_count, delta_views_count, delta_likes_count, delta_comments_count, "
+            "delta_reports_count, created_at) "
+            "SELECT gen_random_uuid(), video_id, 0, 0, 0, 0, 1000000, 0, 0, 0, created_at "
+            "FROM video_snapshots ORDER BY created_at LIMIT 1 "
+            "RETURNING id"
+        ))).scalar_one()
+        await session.commit()
+    try:
+        async with async_read_session_maker() as session:
+            await store.refresh(session)
+            created_at = (await session.execute(
+                select(VideoSnapshot.created_at).where(VideoSnapshot.id == snapshot_id)
+            )).scalar_one()
+            intent = _delta_views_intent(created_at.date())
+            tr = to_utc_datetime_range(intent.time_range)
+            expected = (await session.execute(
+                select(func.coalesce(func.sum(VideoSnapshot.delta_views_count), 0))
+                .where(VideoSnapshot.created_at >= tr.start, VideoSnapshot.created_at < tr.end)
+            )).scalar_one()
+        actual = store.answer(intent, tr)
+    finally:
+        async with async_database_session_maker() as session:
+            await session.execute(text("DELETE FROM video_snapshots WHERE id = :id"), {"id": snapshot_id})
+            await session.commit()
+    print(f"Дозагрузка снапшота за {created_at.date()}: SQL {expected}, columnar {actual}")
+    return 0 if actual == expected else 1
+
+
+async def check(seed: int, show: int, backfill: bool = False) -> int:
+    settings.COLUMNAR_BACKEND = False
+    settings.RESULT_CACHE_BACKEND = "none"
+    set_result_cache(None)
+    set_columnar_store(None)
+
+    store = ColumnarStore(settings.COLUMNAR_REFRESH_OVERLAP_SECONDS)
+    async with async_read_session_maker() as session:
+        started_at = time.monotonic()
+        await store.refresh(session)
+        print(
+            f"Колоночная копия: {store.videos_count} видео, {store.snapshots_count} снапшотов "
+            f"за {time.monotonic() - started_at:.2f} с"
+        )
+        first, last = (await session.execute(
+            select(func.min(Video.video_created_at), func.max(Video.video_created_at))
+        )).one()
+        if first is None:
+            print("videos пуста, сверять нечего")
+            return 0
+        result = await session.execute(
+            select(Video.creator_id).group_by(Video.creator_id).order_by(func.count().desc()).limit(2)
+        )
+        creators = [str(creator) for creator in result.scalars()]
+        creators.append("00000000-0000-0000-0000-000000000000")
+
+        intents = build_intents(first.date(), last.date() + timedelta(days=3), creators, seed)
+        mismatches = 0
+        sql_seconds = columnar_seconds = 0.0
+        for intent in intents:
+            mark = time.perf_counter()
+            expected = await sql_answer(session, intent)
+            sql_seconds += time.perf_counter() - mark
+
+            mark = time.perf_counter()
+            tr = to_utc_datetime_range(intent.time_range)
+            actual = store.answer(intent, tr, group_row_limit(intent) if intent.group_by is not None else None)
+            columnar_seconds += time.perf_counter() - mark
+
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= show:
+                    print(f"Расхождение: {intent.model_dump_json()}\n  SQL: {expected}\n  columnar: {actual}")
+
+    print(
+        f"Интентов: {len(intents)}, расхождений: {mismatches}; "
+        f"SQL {sql_seconds:.2f} с, колоночная копия {columnar_seconds:.2f} с"
+    )
+    if backfill:
+        mismatches += await check_backfill(store)
+    return 1 if mismatches else 0
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Сверка колоночного бэкенда с ответами Postgres")
+    parser.add_argument("--seed", type=int, default=42, help="Seed случайных диапазонов")
+    parser.add_argument("--show", type=int, default=10, help="Сколько расхождений вывести")
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="Проверить дочитывание дозагрузки (пишет в БД и удаляет один снапшот)",
+    )
+    args = parser.parse_args()
+    try:
+        return await check(args.seed, args.show, args.backfill)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,36 +1,194 @@
 #!/usr/bin/env python3
-import sys
+"""Состояние БД без чтения таблиц целиком.
+
+Число строк берется из статистики планировщика (pg_class.reltuples), с --exact -
+через COUNT(*). Для секций video_snapshots - строки, размер и последний замер
+по каждой секции, по дням - из video_daily_stats. Пример строк читается курсором.
+"""
+import argparse
 import asyncio
+import sys
 from pathlib import Path
 
 # Добавляем путь к src директории
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
-from db.database import async_database_session_maker
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.database import async_database_session_maker, dispose_engines
+from db.partitions import SNAPSHOTS_TABLE
+from models.video_daily_stats import VideoDailyStat
 from models.videos import Video
-from models.video_snapshots import VideoSnapshot
-from sqlalchemy import select
 
+TABLES = ("videos", SNAPSHOTS_TABLE, "video_daily_stats", "creator_daily_totals", "video_daily_hll")
+
+
+def format_size(size: int | None) -> str:
+    if size is None:
+        return "-"
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+async def relation_oids(session: AsyncSession, table: str) -> list[int]:
+    """Сама таблица, а если она секционирована - ее секции (у родителя нет данных)."""
+    result = await session.execute(
+        text(
+            "SELECT c.oid FROM pg_class c WHERE c.oid = to_regclass(:table) AND c.relkind = 'r' "
+            "UNION ALL "
+            "SELECT i.inhrelid FROM pg_inherits i WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    )
+    return list(result.scalars())
+
+
+async def table_stats(session: AsyncSession, table: str, exact: bool) -> dict | None:
+    oids = await relation_oids(session, table)
+    if not oids:
+        return None
+    row = (await session.execute(
+        text(
+            # reltuples = -1 - таблицу еще не анализировали
+            "SELECT sum(greatest(c.reltuples, 0))::bigint, "
+            "bool_or(c.reltuples < 0 AND pg_relation_size(c.oid) > 0), "
+            "sum(pg_relation_size(c.oid))::bigint, sum(pg_indexes_size(c.oid))::bigint, "
+            "sum(pg_total_relation_size(c.oid))::bigint "
+            "FROM pg_class c WHERE c.oid = ANY(:oids)"
+        ),
+        {"oids": oids},
+    )).one()
+    rows, never_analyzed, heap_size, index_size, total_size = row
+    stats = {
+        "rows": rows,
+        "estimated": True,
+        "never_analyzed": never_analyzed,
+        "heap_size": heap_size,
+        "index_size": index_size,
+        "total_size": total_size,
+    }
+    if exact:
+        stats["rows"] = (await session.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one()
+        stats["estimated"] = False
+    return stats
+
+
+async def index_sizes(session: AsyncSession, table: str) -> list[tuple[str, int]]:
+    """Размер индексов; индексы секций суммируются по индексу родителя."""
+    result = await session.execute(
+        text(
+            "SELECT coalesce(parent.relname, idx.relname), sum(pg_relation_size(idx.oid))::bigint "
+            "FROM pg_index i "
+            "JOIN pg_class idx ON idx.oid = i.indexrelid "
+            "LEFT JOIN pg_inherits inh ON inh.inhrelid = i.indexrelid "
+            "LEFT JOIN pg_class parent ON parent.oid = inh.inhparent "
+            "WHERE i.indrelid = to_regclass(:table) "
+            "OR i.indrelid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table)) "
+            "GROUP BY 1 ORDER BY 2 DESC"
+        ),
+        {"table": table},
+    )
+    return [tuple(row) for row in result]
+
+
+async def snapshot_partitions(session: AsyncSession) -> list[tuple]:
+    """Секции: имя, границы, оценка строк, размер."""
+    result = await session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), "
+            "greatest(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ),
+        {"table": SNAPSHOTS_TABLE},
+    )
+    return [tuple(row) for row in result]
 
-async def check_records():
-    """Проверка количества записей в БД"""
+
+async def last_snapshot_at(session: AsyncSession, relation: str):
+    # max(created_at) берется с конца индекса по created_at
+    return (await session.execute(text(f"SELECT max(created_at) FROM {relation}"))).scalar_one()
+
+
+async def print_daily_counts(session: AsyncSession, days: int) -> None:
+    result = await session.execute(
+        select(VideoDailyStat.day, func.sum(VideoDailyStat.snapshots_count), func.count())
+        .group_by(VideoDailyStat.day)
+        .order_by(VideoDailyStat.day.desc())
+        .limit(days)
+    )
+    rows = result.all()
+    if not rows:
+        print("  video_daily_stats пуста (python scripts/import_videos.py --rebuild-rollups)")
+        return
+    for day, snapshots, videos in reversed(rows):
+        print(f"  {day}: {snapshots} снапшотов, {videos} видео")
+
+
+async def print_sample(session: AsyncSession, limit: int) -> None:
+    # Серверный курсор: строки приходят пачками, а не списком всей выборки
+    result = await session.stream_scalars(
+        select(Video).limit(limit).execution_options(yield_per=100)
+    )
+    async for video in result:
+        print(f"  ID: {video.id}, Creator: {video.creator_id}, Views: {video.views_count}")
+
+
+async def check_records(exact: bool = False, days: int = 14, sample: int = 5):
+    """Статистика по таблицам, секциям и дням"""
     async with async_database_session_maker() as session:
-        # Считаем видео
-        video_result = await session.execute(select(Video))
-        videos = video_result.scalars().all()
-        
-        # Считаем снапшоты
-        snapshot_result = await session.execute(select(VideoSnapshot))
-        snapshots = snapshot_result.scalars().all()
-        
-        print(f"Видео в БД: {len(videos)}")
-        print(f"Снапшотов в БД: {len(snapshots)}")
-        
-        if videos:
-            print("\nПервые 5 видео:")
-            for video in videos[:5]:
-                print(f"  ID: {video.id}, Creator: {video.creator_id}, Views: {video.views_count}")
+        for table in TABLES:
+            stats = await table_stats(session, table, exact)
+            if stats is None:
+                print(f"{table}: таблицы нет")
+                continue
+            rows = f"~{stats['rows']}" if stats["estimated"] else str(stats["rows"])
+            note = ""
+            if stats["estimated"] and stats["never_analyzed"]:
+                note = " (нет статистики, нужен ANALYZE или --exact)"
+            print(
+                f"{table}: строк {rows}{note}, данные {format_size(stats['heap_size'])}, "
+                f"индексы {format_size(stats['index_size'])}, всего {format_size(stats['total_size'])}"
+            )
+            for name, size in await index_sizes(session, table):
+                print(f"  индекс {name}: {format_size(size)}")
+
+        print(f"\nПоследний снапшот: {await last_snapshot_at(session, SNAPSHOTS_TABLE)}")
+        last_video = (await session.execute(select(func.max(Video.video_created_at)))).scalar_one()
+        print(f"Последнее опубликованное видео: {last_video}")
+        last_day = (await session.execute(select(func.max(VideoDailyStat.day)))).scalar_one()
+        print(f"Последний день в video_daily_stats: {last_day}")
+
+        partitions = await snapshot_partitions(session)
+        if partitions:
+            print(f"\nСекции {SNAPSHOTS_TABLE}:")
+            for name, bounds, rows, size in partitions:
+                last = await last_snapshot_at(session, name)
+                print(f"  {name}: ~{rows} строк, {format_size(size)}, последний замер {last}, {bounds}")
+
+        if days:
+            print(f"\nСнапшоты по дням (последние {days}, по video_daily_stats):")
+            await print_daily_counts(session, days)
+
+        if sample:
+            print(f"\nПервые {sample} видео:")
+            await print_sample(session, sample)
+
+    await dispose_engines()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Статистика БД: строки, размеры, секции, дни")
+    parser.add_argument("--exact", action="store_true", help="Точный COUNT(*) вместо оценки планировщика")
+    parser.add_argument("--days", type=int, default=14, help="Сколько последних дней показать (0 - не показывать)")
+    parser.add_argument("--sample", type=int, default=5, help="Сколько видео вывести для примера")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(check_records())
+    args = parse_args()
+    asyncio.run(check_records(args.exact, args.days, args.sample))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Бюджет холодного старта: время импорта модулей бота по python -X importtime.
+
+Каждый модуль импортируется в отдельном процессе без переменных окружения (как на
+свежей машине без .env), несколько раз; берется медиана cumulative-времени модуля.
+Кроме бюджета проверяется, что импорт не читает настройки, не создает движки БД
+и не грузит то, что нужно только по требованию (numpy, pyarrow, redis, колоночная
+копия, выгрузка, aiohttp вне бота). Код выхода 1 при нарушении.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).parent.parent / "src"
+
+# Бюджеты в миллисекундах с запасом к замерам; основное время main и bot.handlers - aiogram.types
+BUDGETS_MS = {
+    "main": 6000,
+    "bot.handlers": 6000,
+    "nlq.service": 1500,
+    "nlq.sql_builder": 1000,
+    "nlq.parsing": 800,
+    "db.database": 1000,
+    "ingest.snapshots": 1000,
+}
+
+# Грузятся при первом использовании, а не при старте
+LAZY_MODULES = ("numpy", "pyarrow", "redis", "nlq.columnar", "nlq.export", "aiohttp")
+
+# aiohttp нужен только боту (через aiogram) и эндпоинту /metrics, остальным модулям - нет
+AIOHTTP_MODULES = ("main", "bot.handlers")
+
+_PROBE = """
+import json
+import sys
+
+import {module}
+from config.settings import get_settings
+
+database = sys.modules.get("db.database")
+print(json.dumps({{
+    "settings_loaded": get_settings.cache_info().currsize > 0,
+    "engines_created": database is not None and (
+        database._engine is not None or database._read_engine is not None
+    ),
+    "lazy_loaded": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def _clean_env() -> dict[str, str]:
+    env = {"PYTHONPATH": str(SRC), "PYTHONDONTWRITEBYTECODE": "1"}
+    for name in ("PATH", "HOME", "SYSTEMROOT"):
+        if name in os.environ:
+            env[name] = os.environ[name]
+    return env
+
+
+def _import_time_us(stderr: str, module: str) -> int:
+    # Строка importtime: "import time: self [us] | cumulative | imported package"
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def probe(module: str) -> tuple[int, dict]:
+    """Время импорта module в микросекундах и состояние процесса после импорта."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=SRC,
+        env=_clean_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.splitlines()[-1]}")
+    return _import_time_us(result.stderr, module), json.loads(result.stdout)
+
+
+def check(modules: list[str], runs: int, scale: float) -> int:
+    failures = 0
+    for module in modules:
+        try:
+            samples = [probe(module) for _ in range(runs)]
+        except RuntimeError as e:
+            print(f"[!] {e}")
+            failures += 1
+            continue
+
+        elapsed_ms = statistics.median(us for us, _ in samples) / 1000
+        budget_ms = BUDGETS_MS[module] * scale
+        state = samples[-1][1]
+        problems = []
+        if elapsed_ms > budget_ms:
+            problems.append(f"бюджет {budget_ms:.0f} мс превышен")
+        if state["settings_loaded"]:
+            problems.append("настройки читаются при импорте")
+        if state["engines_created"]:
+            problems.append("движки БД создаются при импорте")
+        lazy_loaded = [
+            name for name in state["lazy_loaded"]
+            if name != module and not (name == "aiohttp" and module in AIOHTTP_MODULES)
+        ]
+        if lazy_loaded:
+            problems.append(f"загружены при импорте: {', '.join(lazy_loaded)}")
+
+        mark = "!" if problems else "+"
+        print(f"[{mark}] {module}: {elapsed_ms:.0f} мс (бюджет {budget_ms:.0f} мс)")
+        for problem in problems:
+            print(f"    {problem}")
+        failures += bool(problems)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Проверка времени холодного старта по -X importtime")
+    parser.add_argument("modules", nargs="*", help="модули для проверки (по умолчанию все из BUDGETS_MS)")
+    parser.add_argument("--runs", type=int, default=3, help="запусков на модуль, берется медиана")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель бюджетов для медленной машины")
+    args = parser.parse_args()
+
+    unknown = [module for module in args.modules if module not in BUDGETS_MS]
+    if unknown:
+        parser.error(f"нет бюджета для: {', '.join(unknown)}")
+    return check(args.modules or list(BUDGETS_MS), args.runs, args.scale)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,51 +1,122 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import json
+import multiprocessing
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Добавляем путь к src директории
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.database import async_database_session_maker, Base
+from config.settings import settings
+from db.database import async_database_session_maker
+from db.migrations import run_migrations
+from db.notifications import notify_data_changed
+from db.partitions import create_schema, ensure_snapshot_partitions, ensure_upcoming_partitions
+from ingest.copy import copy_records
+from ingest.json_stream import detect_format, iter_videos, plan_chunks, stream_video_chunks
+from ingest.rollups import (
+    add_creator_totals,
+    add_daily_stats,
+    aggregate_creator_totals,
+    aggregate_daily_stats,
+    rebuild_creator_totals,
+    rebuild_daily_stats,
+)
 from models.videos import Video
 from models.video_snapshots import VideoSnapshot
-from sqlalchemy import select
-from datetime import datetime
+from models.video_daily_stats import VideoDailyStat
+from models.creator_daily_totals import CreatorDailyTotal
+from models.video_daily_hll import VideoDailyHll
+from sqlalchemy import select, text
+from datetime import datetime, timezone
 import uuid
 
 
+DEFAULT_BATCH_SIZE = 50_000
+DEFAULT_CHUNK_SIZE = 10_000
+
+VIDEO_COLUMNS = (
+    "id",
+    "creator_id",
+    "video_created_at",
+    "views_count",
+    "likes_count",
+    "comments_count",
+    "reports_count",
+)
+
+SNAPSHOT_COLUMNS = (
+    "id",
+    "video_id",
+    "views_count",
+    "likes_count",
+    "comments_count",
+    "reports_count",
+    "delta_views_count",
+    "delta_likes_count",
+    "delta_comments_count",
+    "delta_reports_count",
+    "created_at",
+)
+
+
 async def create_tables():
     """Создание таблиц в БД"""
-    from db.database import engine
+    from db.database import get_engine
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await create_schema(conn, settings.SNAPSHOT_PARTITION_INTERVAL)
+    # Индексы и таблицы, появившиеся позже, в существующей БД create_all не создаст
+    for version in await run_migrations(engine):
+        print(f"Применена миграция {version}")
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        for name in await ensure_upcoming_partitions(conn, settings.SNAPSHOT_PARTITIONS_AHEAD):
+            print(f"Создана секция {name}")
     print("Таблицы созданы успешно")
 
 
-async def import_videos_from_json(json_file_path: str):
+def parse_video_created_at(value: str) -> datetime:
+    """video_created_at хранится без таймзоны"""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None)
+    return dt
+
+
+def parse_snapshot_created_at(value: str) -> datetime:
+    """created_at снапшота хранится с таймзоной, наивное время считаем UTC"""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+async def import_videos_from_json(json_file_path: str, input_format: str = "auto"):
     """Импорт видео из JSON файла в БД"""
     print(f"Загрузка данных из {json_file_path}...")
-    
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Данные находятся в поле "videos"
-        if 'videos' in data:
-            videos_data = data['videos']
-        else:
-            videos_data = data
-            
-    except Exception as e:
-        print(f"Ошибка чтения JSON файла: {e}")
-        return
-    
+    videos_data = iter_videos(json_file_path, input_format)
+
     async with async_database_session_maker() as session:
         imported_count = 0
-        
+        # Снапшоты для дневных агрегатов: (video_id, creator_id, created_at, дельты)
+        rollup_snapshots = []
+        # Новые видео для итогов креаторов: (creator_id, video_created_at, 1, счетчики)
+        creator_videos = []
+
+        async def flush_rollups():
+            await session.flush()
+            await add_daily_stats(session, aggregate_daily_stats(rollup_snapshots))
+            rollup_snapshots.clear()
+            await add_creator_totals(session, aggregate_creator_totals(creator_videos))
+            creator_videos.clear()
+            await notify_data_changed(session)
+
         for video_data in videos_data:
             try:
                 # Проверяем, существует ли уже видео
@@ -56,11 +127,17 @@ async def import_videos_from_json(json_file_path: str):
                     print(f"Видео {video_data['id']} уже существует, пропускаем")
                     continue
                 
+                snapshots_data = video_data.get('snapshots', [])
+                # Секции под снапшоты создаются до того, как видео попадет в транзакцию
+                await ensure_snapshot_partitions(
+                    session,
+                    (parse_snapshot_created_at(s['created_at']) for s in snapshots_data),
+                    before_commit=flush_rollups,
+                )
+
                 # Создаем запись видео
-                video_created_dt = datetime.fromisoformat(video_data['video_created_at'])
-                if video_created_dt.tzinfo is not None:
-                    video_created_dt = video_created_dt.replace(tzinfo=None)
-                
+                video_created_dt = parse_video_created_at(video_data['video_created_at'])
+
                 video = Video(
                     id=video_data['id'],
                     creator_id=video_data['creator_id'],
@@ -73,6 +150,15 @@ async def import_videos_from_json(json_file_path: str):
                 
                 session.add(video)
                 await session.flush()  # Сохраняем видео чтобы получить ID для foreign key
+                creator_videos.append((
+                    uuid.UUID(str(video.creator_id)),
+                    video.video_created_at,
+                    1,
+                    video.views_count,
+                    video.likes_count,
+                    video.comments_count,
+                    video.reports_count,
+                ))
                 
                 # Добавляем снапшоты если они есть
                 if 'snapshots' in video_data:
@@ -91,7 +177,16 @@ async def import_videos_from_json(json_file_path: str):
                             created_at=datetime.fromisoformat(snapshot_data['created_at'])
                         )
                         session.add(snapshot)
-                
+                        rollup_snapshots.append((
+                            snapshot.video_id,
+                            video.creator_id,
+                            snapshot.created_at,
+                            snapshot.delta_views_count,
+                            snapshot.delta_likes_count,
+                            snapshot.delta_comments_count,
+                            snapshot.delta_reports_count,
+                        ))
+
                 imported_count += 1
                 if imported_count % 100 == 0:
                     print(f"Импортировано: {imported_count} видео")
@@ -99,25 +194,436 @@ async def import_videos_from_json(json_file_path: str):
             except Exception as e:
                 print(f"Ошибка импорта видео {video_data.get('id', 'unknown')}: {e}")
                 continue
-        
+
+        await flush_rollups()
         await session.commit()
         print(f"Импорт завершен. Всего импортировано: {imported_count} видео")
 
 
+async def rebuild_rollups():
+    """Пересчет дневных агрегатов, нужен для БД, загруженных до их появления"""
+    print("Пересчет video_daily_stats и creator_daily_totals...")
+    async with async_database_session_maker() as session:
+        await rebuild_daily_stats(session)
+        await rebuild_creator_totals(session)
+        await notify_data_changed(session)
+        await session.commit()
+    print("Дневные агрегаты пересчитаны")
+
+
+def video_record(video_data: dict) -> tuple:
+    """Строка для COPY в таблицу videos"""
+    return (
+        uuid.UUID(video_data['id']),
+        uuid.UUID(video_data['creator_id']),
+        parse_video_created_at(video_data['video_created_at']),
+        video_data.get('views_count', 0),
+        video_data.get('likes_count', 0),
+        video_data.get('comments_count', 0),
+        video_data.get('reports_count', 0),
+    )
+
+
+def snapshot_records(video_data: dict) -> list[tuple]:
+    """Строки для COPY в таблицу video_snapshots"""
+    video_id = uuid.UUID(video_data['id'])
+    return [
+        (
+            uuid.uuid4(),
+            video_id,
+            snapshot_data.get('views_count', 0),
+            snapshot_data.get('likes_count', 0),
+            snapshot_data.get('comments_count', 0),
+            snapshot_data.get('reports_count', 0),
+            snapshot_data.get('delta_views_count', 0),
+            snapshot_data.get('delta_likes_count', 0),
+            snapshot_data.get('delta_comments_count', 0),
+            snapshot_data.get('delta_reports_count', 0),
+            parse_snapshot_created_at(snapshot_data['created_at']),
+        )
+        for snapshot_data in video_data.get('snapshots', [])
+    ]
+
+
+async def copy_batch(
+    session: AsyncSession,
+    videos: dict[str, tuple],
+    snapshots: dict[str, list[tuple]],
+    ensure_partitions: bool = True,
+) -> tuple[int, int]:
+    """Запись пачки через COPY, дубликаты видео пропускаются через ON CONFLICT DO NOTHING.
+
+    Видео сначала копируются во временную таблицу, затем одним INSERT ... SELECT
+    переносятся в videos. Снапшоты пишутся только для реально вставленных видео,
+    в той же транзакции к video_daily_stats прибавляются их дневные суммы.
+    Возвращает количество вставленных видео и снапшотов.
+    С ensure_partitions=False секции должны быть созданы заранее.
+    """
+    if ensure_partitions:
+        # Недостающие секции создаются до записи пачки, предыдущие пачки при этом коммитятся
+        await ensure_snapshot_partitions(
+            session,
+            (record[10] for records in snapshots.values() for record in records),
+        )
+
+    # Первый execute открывает транзакцию, в которой дальше работает COPY
+    await session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS import_videos_stage "
+        "(LIKE videos INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+
+    columns = ", ".join(VIDEO_COLUMNS)
+    await copy_records(session, "import_videos_stage", list(videos.values()), VIDEO_COLUMNS)
+    result = await session.execute(text(
+        f"INSERT INTO videos ({columns}) "
+        f"SELECT {columns} FROM import_videos_stage "
+        "ON CONFLICT (id) DO NOTHING "
+        "RETURNING id"
+    ))
+    inserted_ids = {str(video_id) for video_id in result.scalars()}
+    await session.execute(text("TRUNCATE import_videos_stage"))
+
+    records = [
+        record
+        for video_id in inserted_ids
+        for record in snapshots.get(video_id, ())
+    ]
+    await copy_records(session, "video_snapshots", records, SNAPSHOT_COLUMNS)
+    await add_daily_stats(session, aggregate_daily_stats(
+        (record[1], videos[str(record[1])][1], record[10], *record[6:10])
+        for record in records
+    ))
+    await add_creator_totals(session, aggregate_creator_totals(
+        (videos[video_id][1], videos[video_id][2], 1, *videos[video_id][3:7])
+        for video_id in inserted_ids
+    ))
+    # Бот сбросит кэш результатов, когда транзакция закоммитится
+    await notify_data_changed(session)
+
+    return len(inserted_ids), len(records)
+
+
+async def bulk_import_videos(
+    video_chunks,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    label: str = "",
+    ensure_partitions: bool = True,
+    commit_batches: bool = True,
+) -> tuple[int, int, int]:
+    """Пакетный импорт видео и снапшотов через COPY.
+
+    video_chunks - асинхронный поток списков видео, см. stream_video_chunks.
+    batch_size - сколько строк (видео + снапшоты) копится в памяти перед записью.
+    ensure_partitions - создавать недостающие секции по ходу (с коммитом записанных пачек);
+    False - секции созданы заранее.
+    commit_batches - коммит после каждой пачки, чтобы импорт не держал одну транзакцию
+    с блокировками и WAL на весь файл; False - весь импорт одной транзакцией (чанк
+    параллельного импорта, который целиком отмечается в чекпоинте).
+    Возвращает количество импортированных видео, снапшотов и пропущенных видео.
+    """
+    imported_videos = 0
+    imported_snapshots = 0
+    skipped_videos = 0
+    started_at = time.monotonic()
+
+    videos: dict[str, tuple] = {}
+    snapshots: dict[str, list[tuple]] = {}
+    pending_rows = 0
+
+    async with async_database_session_maker() as session:
+
+        async def flush():
+            nonlocal imported_videos, imported_snapshots, skipped_videos, pending_rows
+            if not videos:
+                return
+            inserted_videos, inserted_snapshots = await copy_batch(
+                session, videos, snapshots, ensure_partitions
+            )
+            if commit_batches:
+                await session.commit()
+            imported_videos += inserted_videos
+            imported_snapshots += inserted_snapshots
+            skipped_videos += len(videos) - inserted_videos
+            videos.clear()
+            snapshots.clear()
+            pending_rows = 0
+
+            elapsed = time.monotonic() - started_at
+            rate = (imported_videos + imported_snapshots) / elapsed if elapsed > 0 else 0.0
+            print(
+                f"{label}Импортировано: {imported_videos} видео, {imported_snapshots} снапшотов, "
+                f"пропущено: {skipped_videos}, {rate:.0f} строк/с"
+            )
+
+        async for chunk in video_chunks:
+            for video_data in chunk:
+                try:
+                    video_id = str(uuid.UUID(video_data['id']))
+                    if video_id in videos:
+                        skipped_videos += 1
+                        continue
+                    record = video_record(video_data)
+                    records = snapshot_records(video_data)
+                except Exception as e:
+                    print(f"Ошибка импорта видео {video_data.get('id', 'unknown')}: {e}")
+                    continue
+
+                videos[video_id] = record
+                snapshots[video_id] = records
+                pending_rows += 1 + len(records)
+                if pending_rows >= batch_size:
+                    await flush()
+
+        await flush()
+        await session.commit()
+
+    elapsed = time.monotonic() - started_at
+    print(
+        f"{label}Импорт завершен. Всего импортировано: {imported_videos} видео, "
+        f"{imported_snapshots} снапшотов, пропущено: {skipped_videos} за {elapsed:.1f} с"
+    )
+    return imported_videos, imported_snapshots, skipped_videos
+
+
+def load_checkpoint(checkpoint_file: str) -> dict | None:
+    try:
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(checkpoint_file: str, state: dict):
+    """Атомарная запись чекпоинта, чтобы падение не оставило битый файл"""
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def chunk_snapshot_timestamps(json_file: str, input_format: str, start: int, count: int) -> set[datetime]:
+    """created_at снапшотов чанка; битые видео пропускаются, их отклонит сам импорт"""
+    timestamps = set()
+    for video_data in iter_videos(json_file, input_format, start, count):
+        try:
+            timestamps.update(
+                parse_snapshot_created_at(snapshot_data['created_at'])
+                for snapshot_data in video_data.get('snapshots', [])
+            )
+        except Exception:
+            continue
+    return timestamps
+
+
+async def import_chunk_async(
+    json_file: str, input_format: str, start: int, count: int, batch_size: int, label: str
+) -> tuple[int, int, int]:
+    from db.database import get_engine
+
+    engine = get_engine()
+    try:
+        # Секции под весь чанк создаются заранее отдельной транзакцией: создание секции
+        # посреди чанка закоммитило бы уже записанные пачки
+        timestamps = await asyncio.to_thread(chunk_snapshot_timestamps, json_file, input_format, start, count)
+        async with async_database_session_maker() as session:
+            await ensure_snapshot_partitions(session, timestamps)
+        return await bulk_import_videos(
+            stream_video_chunks(json_file, input_format, start=start, limit=count),
+            batch_size,
+            label=label,
+            ensure_partitions=False,
+            commit_batches=False,
+        )
+    finally:
+        # Пул соединений привязан к event loop, следующий чанк запустит новый
+        await engine.dispose()
+
+
+def import_chunk(
+    json_file: str, input_format: str, start: int, count: int, batch_size: int, label: str
+) -> tuple[int, int, int]:
+    """Точка входа процесса-воркера: один чанк - одна транзакция"""
+    return asyncio.run(
+        import_chunk_async(json_file, input_format, start, count, batch_size, label)
+    )
+
+
+async def parallel_import_videos(
+    json_file: str,
+    input_format: str,
+    workers: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint_file: str | None = None,
+):
+    """Параллельный импорт чанками в пуле процессов.
+
+    Каждый чанк коммитится отдельно и отмечается в файле чекпоинта,
+    повторный запуск пропускает уже загруженные чанки.
+    """
+    if input_format == "auto":
+        input_format = detect_format(json_file)
+    if checkpoint_file is None:
+        checkpoint_file = f"{json_file}.checkpoint.json"
+
+    file_stat = os.stat(json_file)
+    signature = {
+        "file": os.path.abspath(json_file),
+        "size": file_stat.st_size,
+        "mtime_ns": file_stat.st_mtime_ns,
+        "format": input_format,
+        "chunk_size": chunk_size,
+    }
+
+    state = load_checkpoint(checkpoint_file)
+    if state is None or state.get("signature") != signature:
+        print(f"Разбивка {json_file} на чанки по {chunk_size} видео...")
+        chunks = await asyncio.to_thread(plan_chunks, json_file, input_format, chunk_size)
+        state = {"signature": signature, "chunks": chunks, "done": []}
+        save_checkpoint(checkpoint_file, state)
+    else:
+        print(f"Найден чекпоинт {checkpoint_file}")
+
+    chunks = state["chunks"]
+    done = set(state["done"])
+    pending = [index for index in range(len(chunks)) if index not in done]
+    print(f"Чанков: {len(chunks)}, уже загружено: {len(done)}, осталось: {len(pending)}")
+
+    imported_videos = 0
+    imported_snapshots = 0
+    failed = 0
+    started_at = time.monotonic()
+
+    loop = asyncio.get_running_loop()
+    # spawn, чтобы воркеры не унаследовали соединения родительского процесса
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        tasks = {
+            loop.run_in_executor(
+                pool,
+                import_chunk,
+                json_file,
+                input_format,
+                chunks[index][0],
+                chunks[index][1],
+                batch_size,
+                f"[чанк {index + 1}/{len(chunks)}] ",
+            ): index
+            for index in pending
+        }
+
+        while tasks:
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                index = tasks.pop(task)
+                try:
+                    chunk_videos, chunk_snapshots, _ = task.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Ошибка импорта чанка {index + 1}: {e}")
+                    continue
+
+                imported_videos += chunk_videos
+                imported_snapshots += chunk_snapshots
+                done.add(index)
+                state["done"] = sorted(done)
+                save_checkpoint(checkpoint_file, state)
+
+                elapsed = time.monotonic() - started_at
+                rate = (imported_videos + imported_snapshots) / elapsed if elapsed > 0 else 0.0
+                print(
+                    f"Готово чанков: {len(done)}/{len(chunks)}, "
+                    f"импортировано: {imported_videos} видео, {imported_snapshots} снапшотов, "
+                    f"{rate:.0f} строк/с"
+                )
+
+    if failed:
+        raise RuntimeError(
+            f"не загружено чанков: {failed}, повторный запуск продолжит с чекпоинта {checkpoint_file}"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Импорт видео из JSON файла в БД")
+    parser.add_argument("json_file", nargs="?", help="путь к videos.json или videos.ndjson")
+    parser.add_argument(
+        "--format",
+        choices=("auto", "json", "ndjson"),
+        default="auto",
+        help="формат входного файла, auto - по расширению (.ndjson/.jsonl - NDJSON)",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="пакетный импорт через COPY (для больших выгрузок)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"строк в одной пачке для --bulk (по умолчанию {DEFAULT_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="число процессов для параллельного импорта чанками (включает --bulk)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"видео в одном чанке для --workers (по умолчанию {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="файл чекпоинта для --workers (по умолчанию <json_file>.checkpoint.json)",
+    )
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="пересчитать video_daily_stats по всем снапшотам и creator_daily_totals по videos (можно без json_file)",
+    )
+    return parser.parse_args()
+
+
 async def main():
     """Главная функция"""
-    if len(sys.argv) != 2:
-        print("Использование: python import_videos.py <путь_к_videos.json>")
+    args = parse_args()
+
+    json_file = args.json_file
+    if json_file is None and not args.rebuild_rollups:
+        print("Использование: python import_videos.py <путь_к_videos.json> [--rebuild-rollups]")
         sys.exit(1)
-    
-    json_file = sys.argv[1]
-    if not os.path.exists(json_file):
+    if json_file is not None and not os.path.exists(json_file):
         print(f"Файл {json_file} не найден")
         sys.exit(1)
-    
+    if args.batch_size < 1 or args.chunk_size < 1 or args.workers < 0:
+        print("--batch-size и --chunk-size должны быть больше 0, --workers не меньше 0")
+        sys.exit(1)
+
     try:
         await create_tables()
-        await import_videos_from_json(json_file)
+        if json_file is not None and args.workers:
+            await parallel_import_videos(
+                json_file,
+                args.format,
+                args.workers,
+                chunk_size=args.chunk_size,
+                batch_size=args.batch_size,
+                checkpoint_file=args.checkpoint,
+            )
+        elif json_file is not None and args.bulk:
+            print(f"Загрузка данных из {json_file}...")
+            await bulk_import_videos(
+                stream_video_chunks(json_file, args.format), args.batch_size
+            )
+        elif json_file is not None:
+            await import_videos_from_json(json_file, args.format)
+
+        if args.rebuild_rollups:
+            await rebuild_rollups()
         print("Импорт данных завершен успешно!")
     except Exception as e:
         print(f"Ошибка при импорте: {e}")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Загрузка почасового фида абсолютных счетчиков видео.
+
+Файл - NDJSON (объект на строку) или JSON-массив (либо {"snapshots": [...]}) с полями
+video_id, created_at, views_count, likes_count, comments_count, reports_count.
+Приросты к предыдущим снапшотам и новые счетчики videos считаются в БД, каждая пачка -
+отдельная транзакция.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+# Добавляем путь к src директории
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from db.database import async_database_session_maker, dispose_engines
+from ingest.json_stream import iter_items
+from ingest.snapshots import feed_row, ingest_snapshots
+
+DEFAULT_BATCH_SIZE = 10_000
+
+
+def iter_feed(path: str, input_format: str):
+    # JSON разбирается потоково, как и NDJSON: в памяти только текущая пачка
+    return iter_items(path, input_format, "snapshots")
+
+
+async def ingest_file(path: str, input_format: str, batch_size: int) -> None:
+    started_at = time.monotonic()
+    totals = {"inserted": 0, "skipped": 0, "unknown_videos": 0, "videos_updated": 0}
+    items = iter_feed(path, input_format)
+    async with async_database_session_maker() as session:
+        while batch := list(islice(items, batch_size)):
+            result = await ingest_snapshots(session, [feed_row(item) for item in batch])
+            await session.commit()
+            for key in totals:
+                totals[key] += getattr(result, key)
+            print(
+                f"Снапшотов записано: {totals['inserted']}, пропущено: {totals['skipped']}, "
+                f"неизвестных видео: {totals['unknown_videos']}, видео обновлено: {totals['videos_updated']}"
+            )
+    print(f"Загрузка фида завершена за {time.monotonic() - started_at:.1f} с")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Загрузка фида снапшотов с подсчетом приростов в БД")
+    parser.add_argument("feed_file", help="NDJSON или JSON с замерами")
+    parser.add_argument("--format", choices=("auto", "json", "ndjson"), default="auto")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Замеров в одной транзакции")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    try:
+        await ingest_file(args.feed_file, args.format, args.batch_size)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
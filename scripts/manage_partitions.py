@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем путь к src директории
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from config.settings import settings
+from db.database import get_engine
+from db.partitions import (
+    convert_to_partitioned,
+    ensure_upcoming_partitions,
+    existing_partitions,
+    partition_interval,
+    partition_name,
+)
+
+
+async def main():
+    """Обслуживание секций video_snapshots"""
+    parser = argparse.ArgumentParser(description="Секции таблицы video_snapshots")
+    parser.add_argument(
+        "--ahead",
+        type=int,
+        help="сколько будущих секций создать заранее (по умолчанию SNAPSHOT_PARTITIONS_AHEAD)",
+    )
+    parser.add_argument(
+        "--convert",
+        choices=("month", "week"),
+        help="перенести обычную таблицу в секционированную с указанным интервалом",
+    )
+    args = parser.parse_args()
+    ahead = args.ahead if args.ahead is not None else settings.SNAPSHOT_PARTITIONS_AHEAD
+
+    engine = get_engine()
+    try:
+        if args.convert:
+            print(f"Перенос video_snapshots в секционированную таблицу ({args.convert})...")
+            async with engine.begin() as conn:
+                moved = await convert_to_partitioned(conn, args.convert)
+            print(f"Перенесено снапшотов: {moved}")
+
+        async with engine.begin() as conn:
+            interval = await partition_interval(conn)
+            if interval is None:
+                print("Таблица video_snapshots не секционирована")
+                return
+            for name in await ensure_upcoming_partitions(conn, ahead):
+                print(f"Создана секция {name}")
+            partitions = sorted(await existing_partitions(conn))
+
+        print(f"Интервал: {interval}, секций: {len(partitions)}")
+        for start in partitions:
+            print(f"  {partition_name(start)}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
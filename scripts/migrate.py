@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем путь к src директории
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from db.database import get_engine
+from db.migrations import applied_migrations, discover_migrations, run_migrations
+
+
+async def show_status():
+    """Список миграций и их состояние"""
+    engine = get_engine()
+    async with engine.connect() as conn:
+        applied = await applied_migrations(conn)
+        await conn.commit()
+    for version, module in discover_migrations():
+        mark = "+" if version in applied else " "
+        print(f"[{mark}] {version}: {module.description}")
+
+
+async def main():
+    """Применение миграций схемы к существующей БД"""
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--status", action="store_true", help="только показать состояние миграций")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    try:
+        if args.status:
+            await show_status()
+            return
+        applied = await run_migrations(engine)
+        if applied:
+            for version in applied:
+                print(f"Применена миграция {version}")
+        else:
+            print("Схема актуальна, новых миграций нет")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
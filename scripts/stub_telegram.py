@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Заглушка Telegram для локальной проверки webhook-режима.
+
+Поднимает минимальный Bot API (getMe, setWebhook, deleteWebhook, sendMessage, sendDocument),
+шлет на вебхук бота синтетические апдейты с запросами из benchmarks/corpus.py
+и считает время до ответа бота. Бота запускать с
+BOT_MODE=webhook TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_TOKEN=123:stub
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+from aiohttp import ClientError, ClientSession, web
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.corpus import QUERIES
+
+
+class StubTelegram:
+    def __init__(self):
+        self.sent_at: dict[int, deque[float]] = defaultdict(deque)
+        self.latencies: list[float] = []
+        self.replies = 0
+        self.all_replied = asyncio.Event()
+        self.expected: int | None = None
+        self._message_ids = itertools.count(1)
+
+    async def api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "stub", "username": "stub_bot"}
+        elif method in ("setWebhook", "deleteWebhook"):
+            result = True
+        elif method == "sendMessage":
+            data = await request.post()
+            chat_id = int(data["chat_id"])
+            result = self._message(chat_id, str(data.get("text", "")), from_bot=True)
+            self._on_reply(chat_id)
+        elif method == "sendDocument":
+            # Выгрузка: файл приходит multipart-ом, в ответе достаточно подписи
+            data = await request.post()
+            chat_id = int(data["chat_id"])
+            result = self._message(chat_id, str(data.get("caption", "")), from_bot=True)
+            self._on_reply(chat_id)
+        else:
+            return web.json_response({"ok": False, "error_code": 404, "description": f"{method} is not stubbed"})
+        return web.json_response({"ok": True, "result": result})
+
+    def _on_reply(self, chat_id: int) -> None:
+        sent = self.sent_at.get(chat_id)
+        if sent:
+            self.latencies.append(time.perf_counter() - sent.popleft())
+        self.replies += 1
+        self._check_done()
+
+    def _check_done(self) -> None:
+        if self.expected is not None and self.replies >= self.expected:
+            self.all_replied.set()
+
+    def expect(self, replies: int) -> None:
+        self.expected = replies
+        self._check_done()
+
+    def _message(self, chat_id: int, text: str, from_bot: bool = False) -> dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1 if from_bot else chat_id, "is_bot": from_bot, "first_name": "stub"},
+            "text": text,
+        }
+
+    def update(self, update_id: int, chat_id: int, text: str) -> dict:
+        return {"update_id": update_id, "message": self._message(chat_id, text)}
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def post_updates(stub: StubTelegram, args) -> int:
+    """Шлет апдейты, возвращает, сколько из них бот принял (HTTP 200)."""
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with ClientSession() as http:
+        async def post(update_id: int) -> bool:
+            chat_id = 1000 + rng.randrange(args.users)
+            update = stub.update(update_id, chat_id, rng.choice(QUERIES))
+            async with semaphore:
+                sent_at = time.perf_counter()
+                stub.sent_at[chat_id].append(sent_at)
+                try:
+                    async with http.post(args.webhook_url, json=update, headers=headers) as response:
+                        status = response.status
+                except ClientError as exc:
+                    status = type(exc).__name__
+                if status == 200:
+                    return True
+                stub.sent_at[chat_id].remove(sent_at)
+                print(f"Апдейт {update_id} не принят: {status}")
+                return False
+
+        results = await asyncio.gather(*(post(update_id) for update_id in range(1, args.updates + 1)))
+        return sum(results)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram и генератор апдейтов для webhook-режима")
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081, help="Порт заглушки Bot API")
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8080/webhook", help="Куда слать апдейты")
+    parser.add_argument("--secret", default=None, help="WEBHOOK_SECRET бота")
+    parser.add_argument("--updates", type=int, default=200, help="Сколько апдейтов отправить")
+    parser.add_argument("--users", type=int, default=20, help="Сколько разных пользователей")
+    parser.add_argument("--concurrency", type=int, default=20, help="Одновременных POST на вебхук")
+    parser.add_argument("--timeout", type=float, default=60, help="Сколько ждать ответы, секунд")
+    parser.add_argument("--serve-only", action="store_true", help="Только поднять Bot API, апдейты не слать")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = StubTelegram()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", stub.api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.api_host, args.api_port).start()
+    print(f"Заглушка Bot API: http://{args.api_host}:{args.api_port}")
+
+    try:
+        if args.serve_only:
+            await asyncio.Event().wait()
+
+        started = time.perf_counter()
+        accepted = await post_updates(stub, args)
+        stub.expect(accepted)
+        try:
+            await asyncio.wait_for(stub.all_replied.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            print(f"Не дождались ответов: {stub.replies} из {accepted}")
+        elapsed = time.perf_counter() - started
+
+        print(
+            f"Апдейтов: {args.updates}, принято ботом: {accepted}, ответов: {stub.replies}, "
+            f"за {elapsed:.2f} с ({stub.replies / elapsed:.1f}/с)"
+        )
+        if stub.latencies:
+            print(
+                "Время до ответа, мс: "
+                f"p50={percentile(stub.latencies, 50) * 1000:.1f} "
+                f"p95={percentile(stub.latencies, 95) * 1000:.1f} "
+                f"max={max(stub.latencies) * 1000:.1f}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
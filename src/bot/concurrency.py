@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from monitoring.metrics import COALESCED_CALLS, RATE_LIMITED_UPDATES
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LaneBusyError(Exception):
+    pass
+
+
+class QueryLane:
+    """Ограниченное число одновременных запросов и очередь ожидания перед ними.
+
+    Если очередь заполнена или is_saturated() говорит, что ресурс уже исчерпан,
+    slot() сразу бросает LaneBusyError, а не копит ожидающих.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_waiting: int,
+        is_saturated: Callable[[], bool] | None = None,
+    ):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(limit)
+        self._max_waiting = max_waiting
+        self._is_saturated = is_saturated
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked():
+            if self._waiting >= self._max_waiting:
+                raise LaneBusyError(f"{self.name} lane queue is full")
+            if self._is_saturated is not None and self._is_saturated():
+                raise LaneBusyError(f"{self.name} lane backend is saturated")
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+class SingleFlight:
+    """Одновременные вызовы с одинаковым ключом ждут одно выполнение и получают
+    его результат или исключение; следующий вызов после завершения выполняется заново.
+
+    Работа идет отдельной задачей: отмена одного из ожидающих не отменяет ее для остальных.
+    Результат общий для всех ожидающих - менять его нельзя.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.create_task(func())
+            task.add_done_callback(lambda done: self._land(key, done))
+        else:
+            COALESCED_CALLS.inc(flight=self.name)
+        return await asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Исключение забирается здесь, даже если все ожидающие уже отменены
+            task.exception()
+
+
+class _TokenBucket:
+    __slots__ = ("tokens", "updated_at", "warned")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+        self.warned = False
+
+
+class ChatRateLimitMiddleware(BaseMiddleware):
+    """Outer-middleware на апдейты: токен-бакет на чат.
+
+    Бакет вмещает burst токенов и пополняется на per_minute токенов в минуту, апдейт
+    тратит один. Апдейт без токена отбрасывается до очереди пользователя и до БД;
+    подсказка отправляется один раз за серию отказов.
+    """
+
+    def __init__(self, per_minute: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        if per_minute <= 0 or burst < 1:
+            raise ValueError("Rate limit needs per_minute > 0 and burst >= 1")
+        self._rate = per_minute / 60
+        self._burst = burst
+        self._clock = clock
+        # За это время любой бакет наполняется и ничем не отличается от нового
+        self._refill_seconds = burst / self._rate
+        self._buckets: dict[int, _TokenBucket] = {}
+        self._pruned_at = clock()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        if chat is None:
+            return await handler(event, data)
+
+        now = self._clock()
+        self._prune(now)
+        bucket = self._buckets.get(chat.id)
+        if bucket is None:
+            bucket = self._buckets[chat.id] = _TokenBucket(self._burst, now)
+        else:
+            bucket.tokens = min(self._burst, bucket.tokens + (now - bucket.updated_at) * self._rate)
+            bucket.updated_at = now
+
+        if bucket.tokens < 1:
+            RATE_LIMITED_UPDATES.inc()
+            logger.warning("Rate limiting chat %s", chat.id)
+            if not bucket.warned and isinstance(event, Update) and event.message is not None:
+                bucket.warned = True
+                wait = math.ceil((1 - bucket.tokens) / self._rate)
+                await event.message.answer(f"Слишком много запросов, попробуй через {wait} с.")
+            return None
+
+        bucket.tokens -= 1
+        bucket.warned = False
+        return await handler(event, data)
+
+    def _prune(self, now: float) -> None:
+        if now - self._pruned_at < self._refill_seconds:
+            return
+        self._pruned_at = now
+        self._buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self._buckets.items()
+            if now - bucket.updated_at < self._refill_seconds
+        }
+
+
+class _UserQueue:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class OrderedConcurrencyMiddleware(BaseMiddleware):
+    """Outer-middleware на апдейты: не больше max_in_flight хендлеров одновременно,
+    апдейты одного пользователя обрабатываются строго по очереди.
+
+    asyncio.Lock отдает блокировку в порядке ожидания, а задачи апдейтов доходят
+    до него в порядке получения, так что порядок сообщений пользователя сохраняется.
+    Сверх per_user_limit ожидающих апдейтов от пользователя новые отклоняются.
+    """
+
+    def __init__(self, max_in_flight: int, per_user_limit: int):
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._per_user_limit = per_user_limit
+        self._queues: dict[int, _UserQueue] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            async with self._in_flight:
+                return await handler(event, data)
+
+        queue = self._queues.get(user.id)
+        if queue is None:
+            queue = self._queues[user.id] = _UserQueue()
+        if queue.pending >= self._per_user_limit:
+            logger.warning("Dropping update from user %s: %s updates pending", user.id, queue.pending)
+            if isinstance(event, Update) and event.message is not None:
+                await event.message.answer("Слишком много запросов подряд, дождись ответа на предыдущие.")
+            return None
+
+        queue.pending += 1
+        try:
+            async with queue.lock:
+                async with self._in_flight:
+                    return await handler(event, data)
+        finally:
+            queue.pending -= 1
+            if queue.pending == 0:
+                del self._queues[user.id]
@@ -1,20 +1,127 @@
 import logging
+import os
+import tempfile
+from datetime import datetime, timezone
 from typing import cast
 
 from aiogram import Router
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import FSInputFile, Message
 
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import async_database_session_maker
-from nlq.schemas import QueryIntent
-from nlq.rule_based_intent import parse_intent_rule_based
-from nlq.service import execute_intent
+from bot.concurrency import LaneBusyError, QueryLane, SingleFlight
+from config.settings import settings
+from db.database import async_read_session_maker, pool_is_saturated
+from monitoring.metrics import STAGE_SECONDS
+from nlq.parsing import parse_intent
+from nlq.schemas import GroupBy, Measure, Metric, QueryIntent
+from nlq.service import IntentResult, execute_intent, get_cached_result, intent_key
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Полоса для запросов в БД: ответы из кэша ее не ждут
+_slow_lane: QueryLane | None = None
+
+
+def get_slow_lane() -> QueryLane:
+    global _slow_lane
+    if _slow_lane is None:
+        _slow_lane = QueryLane(
+            "slow",
+            limit=settings.SLOW_LANE_CONCURRENCY,
+            max_waiting=settings.SLOW_LANE_MAX_WAITING,
+            is_saturated=pool_is_saturated,
+        )
+    return _slow_lane
+
+
+# Одинаковые запросы, пришедшие одновременно (вопрос из канала от многих пользователей),
+# выполняются в БД один раз: остальные ждут тот же результат
+_query_flights = SingleFlight("db_query")
+
+
+async def _query_db(intent: QueryIntent) -> IntentResult:
+    async with get_slow_lane().slot():
+        async with async_read_session_maker() as session:
+            return await execute_intent(cast(AsyncSession, session), intent)
+
+_METRIC_LABELS = {
+    Metric.views: "просмотры",
+    Metric.likes: "лайки",
+    Metric.comments: "комментарии",
+    Metric.reports: "жалобы",
+    Metric.videos: "видео",
+}
+
+
+# Лимит Telegram - 4096 символов, запас под строку "... еще N"
+_MAX_ANSWER_CHARS = 4000
+
+
+def _format_rows(intent: QueryIntent, grouped: dict) -> str:
+    prefix = "неделя с " if intent.group_by == GroupBy.week else ""
+    rows = grouped["rows"]
+    if not rows:
+        return "Нет данных за период."
+
+    lines: list[str] = []
+    size = 0
+    for label, value in rows:
+        line = f"{prefix}{label}: {value}"
+        if size + len(line) + 1 > _MAX_ANSWER_CHARS:
+            break
+        lines.append(line)
+        size += len(line) + 1
+
+    if len(lines) < len(rows):
+        lines.append(f"… ещё {len(rows) - len(lines)}")
+    if grouped["truncated"] and intent.limit is None:
+        lines.append(f"(показаны первые {len(rows)})")
+    return "\n".join(lines)
+
+
+def format_answer(intent: QueryIntent, value: int | dict, approximate: bool = False) -> str:
+    if intent.group_by is not None:
+        return _format_rows(intent, value)
+    if isinstance(value, dict):
+        return "\n".join(f"{_METRIC_LABELS[m]}: {value[m.value]}" for m in intent.all_metrics)
+    if approximate:
+        return f"примерно {value}"
+    return str(value)
+
+
+async def answer_export(message: Message, intent: QueryIntent) -> None:
+    """Строки под интент файлом: пишутся во временный файл курсором и отправляются документом."""
+    # Выгрузка нужна редко: модуль (и pyarrow за ним) грузится при первой
+    from nlq.export import export_intent
+
+    table = "videos" if intent.measure == Measure.final else "snapshots"
+    name = f"{table}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{intent.export.value}"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, name)
+        async with get_slow_lane().slot():
+            async with async_read_session_maker() as session:
+                result = await export_intent(
+                    cast(AsyncSession, session),
+                    intent,
+                    path,
+                    chunk_rows=settings.EXPORT_CHUNK_ROWS,
+                    max_rows=settings.EXPORT_MAX_ROWS,
+                    statement_timeout_ms=settings.EXPORT_STATEMENT_TIMEOUT_MS,
+                )
+        if not result.rows:
+            await message.answer("Нет данных за период.")
+            return
+        caption = f"Строк: {result.rows}"
+        if result.truncated:
+            caption += f" (выгружены первые {result.rows}, сузь период или фильтры)"
+        with STAGE_SECONDS.time(stage="send"):
+            await message.answer_document(FSInputFile(path, filename=name), caption=caption)
+
+
 @router.message(Command("start"))
 async def command_start_handler(message: Message) -> None:
     await message.answer("Hello! I'm a video analysis bot!")
@@ -36,20 +143,35 @@ async def nlq_message_handler(message: Message) -> None:
         return
 
     try:
-        intent = QueryIntent.model_validate_json(message.text)
+        with STAGE_SECONDS.time(stage="parse"):
+            intent = parse_intent(message.text)
     except ValueError:
+        logger.exception("NLQ parse error")
+        await message.answer(
+            "Не смог распознать запрос. "
+            "Попробуй переформулировать или пришли JSON-intent по схеме. "
+            "Поддерживаемые примеры: 'сколько видео в системе', 'просмотры за 7 дней', 'лайки вчера', 'комментарии 01.11.2025-28.11.2025'."
+        )
+        return
+
+    result = None if intent.export is not None else await get_cached_result(intent)
+    if result is None:
         try:
-            intent = parse_intent_rule_based(message.text)
-        except ValueError:
-            logger.exception("NLQ parse error")
-            await message.answer(
-                "Не смог распознать запрос. "
-                "Попробуй переформулировать или пришли JSON-intent по схеме. "
-                "Поддерживаемые примеры: 'сколько видео в системе', 'просмотры за 7 дней', 'лайки вчера', 'комментарии 01.11.2025-28.11.2025'."
-            )
+            if intent.export is not None:
+                await answer_export(message, intent)
+                return
+            result = await _query_flights.run(intent_key(intent), lambda: _query_db(intent))
+        except LaneBusyError:
+            logger.warning("Slow lane is busy, rejecting query")
+            await message.answer("Сейчас много запросов, попробуй через несколько секунд.")
+            return
+        except DBAPIError as exc:
+            # 57014 - query_canceled, сработал statement_timeout
+            if getattr(exc.orig, "sqlstate", None) != "57014":
+                raise
+            logger.warning("Query timed out: %s", intent.model_dump_json())
+            await message.answer("Запрос выполнялся слишком долго, попробуй сузить период.")
             return
 
-    async with async_database_session_maker() as session:
-        value = await execute_intent(cast(AsyncSession, session), intent)
-
-    await message.answer(str(value))
+    with STAGE_SECONDS.time(stage="send"):
+        await message.answer(format_answer(intent, result.value, result.approximate))
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from monitoring.server import add_metrics_route
+
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """При остановке перестает принимать апдейты (503 - Telegram повторит доставку)
+    и дожидается уже принятых, прежде чем закрыть сессию бота.
+    """
+
+    def __init__(self, *args, drain_timeout: float = 30.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+        self.draining = False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+    async def drain(self) -> None:
+        self.draining = True
+        pending = set(self._background_feed_update_tasks)
+        if not pending:
+            return
+        logger.info("Draining %s in-flight updates", len(pending))
+        _, not_done = await asyncio.wait(pending, timeout=self.drain_timeout)
+        if not_done:
+            logger.warning("Drain timeout: cancelling %s updates", len(not_done))
+            for task in not_done:
+                task.cancel()
+            await asyncio.gather(*not_done, return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+def build_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str,
+    secret_token: str | None = None,
+    drain_timeout: float = 30.0,
+    metrics_path: str | None = None,
+) -> tuple[web.Application, DrainingRequestHandler]:
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token,
+        drain_timeout=drain_timeout,
+    )
+    handler.register(app, path=path)
+    if metrics_path:
+        add_metrics_route(app, metrics_path)
+    setup_application(app, dp, bot=bot)
+    return app, handler
+
+
+async def serve_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str | None = None,
+    drain_timeout: float = 30.0,
+    reuse_port: bool = False,
+    metrics_path: str | None = None,
+) -> None:
+    """Слушает до SIGTERM/SIGINT, затем дожидается начатых апдейтов и выходит.
+
+    С reuse_port несколько процессов слушают один порт, ядро раскидывает
+    соединения между ними. Порядок сообщений пользователя тогда гарантируется
+    только внутри процесса.
+    """
+    app, handler = build_webhook_app(dp, bot, path, secret_token, drain_timeout, metrics_path)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, reuse_port=reuse_port)
+    await site.start()
+    logger.info("Webhook listening on %s:%s%s", host, port, path)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Новые апдейты сразу получают 503, пока ждем начатые
+        handler.draining = True
+        await handler.drain()
+        await runner.cleanup()
@@ -1,4 +1,6 @@
+from functools import lru_cache
 from pathlib import Path
+from typing import Literal, cast
 
 from pydantic import AliasChoices, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -14,6 +16,107 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("POSTGRES_PASSWORD", "PG_PASSWORD")
     )
     BOT_TOKEN: str | None = None
+    # Адрес Bot API, если не api.telegram.org (локальный сервер или заглушка для тестов)
+    TELEGRAM_API_URL: str | None = None
+
+    # Пул соединений. pre-ping - лишний запрос на каждую выдачу соединения,
+    # вместо него соединения пересоздаются раз в DB_POOL_RECYCLE_SECONDS
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    # Размер кэша подготовленных запросов на соединение, 0 - для pgbouncer
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Пул для запросов бота: DB_READ_URL - реплика (SQLAlchemy URL), иначе основная БД.
+    # Соединения только на чтение, DB_STATEMENT_TIMEOUT_MS ограничивает один запрос (0 - без ограничения)
+    DB_READ_URL: str | None = None
+    DB_READ_POOL_SIZE: int = 5
+    DB_READ_MAX_OVERFLOW: int = 5
+    DB_STATEMENT_TIMEOUT_MS: int = 30_000
+
+    # polling - long polling, webhook - HTTP-сервер, принимающий апдейты от Telegram
+    BOT_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_PATH: str = "/webhook"
+    # Публичный URL для setWebhook; без него вебхук считается уже зарегистрированным
+    WEBHOOK_URL: str | None = None
+    WEBHOOK_SECRET: str | None = None
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    # Процессы бота за одним портом и сколько ждать начатые апдейты при остановке
+    WEBHOOK_WORKERS: int = 1
+    WEBHOOK_DRAIN_TIMEOUT_SECONDS: float = 30
+
+    # delta_sum по целым дням считается по video_daily_stats, а не по сырым снапшотам
+    USE_DAILY_ROLLUPS: bool = True
+    # measure=final по целым дням (и за все время) считается по creator_daily_totals, а не по videos
+    USE_CREATOR_TOTALS: bool = True
+    # Приближенный ответ (intent.approximate) - только если точный запрос прочитает не меньше строк
+    APPROXIMATE_MIN_ROWS: int = 5_000_000
+    # Сколько строк в среднем попадает в выборку TABLESAMPLE
+    APPROXIMATE_SAMPLE_ROWS: int = 500_000
+    # Как часто перечитывать оценки размеров таблиц для выбора точного или приближенного запроса
+    APPROXIMATE_ESTIMATES_TTL_SECONDS: float = 600
+    # Ответы из колоночной копии videos и video_snapshots в памяти процесса (нужен numpy);
+    # пока она не загружена, запросы идут в Postgres. Дочитывание - по уведомлениям и раз в интервал,
+    # хвост снапшотов за COLUMNAR_REFRESH_OVERLAP_SECONDS перечитывается (опоздавшие замеры)
+    COLUMNAR_BACKEND: bool = False
+    COLUMNAR_REFRESH_INTERVAL_SECONDS: float = 60
+    COLUMNAR_REFRESH_OVERLAP_SECONDS: float = 3 * 3600
+    # Файл копии для быстрого старта: пишется при остановке и раз в интервал (0 - только при остановке),
+    # при старте отображается в память, из БД дочитывается только новое. Пусто - не сохранять
+    COLUMNAR_SNAPSHOT_PATH: str | None = None
+    COLUMNAR_SNAPSHOT_INTERVAL_SECONDS: float = 900
+
+    # Секционирование video_snapshots по created_at, применяется при создании таблицы
+    SNAPSHOT_PARTITION_INTERVAL: Literal["none", "month", "week"] = "none"
+    # Сколько будущих секций держать созданными заранее
+    SNAPSHOT_PARTITIONS_AHEAD: int = 2
+
+    # Кэш результатов execute_intent: memory - в процессе, redis - общий для процессов
+    RESULT_CACHE_BACKEND: Literal["none", "memory", "redis"] = "memory"
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    # TTL для диапазонов, включающих сегодня, и для приростов (delta_sum) за закрытые диапазоны в прошлом
+    RESULT_CACHE_TTL_SECONDS: float = 60
+    RESULT_CACHE_CLOSED_TTL_SECONDS: float = 24 * 3600
+    # Ответы с разбивкой (group_by): предел строк и размер топа креаторов по умолчанию
+    GROUP_BY_MAX_ROWS: int = 100
+    GROUP_BY_TOP_N_DEFAULT: int = 10
+    # Выгрузка строк файлом (intent.export): пачка курсора, предел строк (Bot API принимает
+    # файлы до 50 МБ) и таймаут запроса выгрузки вместо DB_STATEMENT_TIMEOUT_MS
+    EXPORT_CHUNK_ROWS: int = 10_000
+    EXPORT_MAX_ROWS: int = 200_000
+    EXPORT_STATEMENT_TIMEOUT_MS: int = 300_000
+    # LRU "нормализованный текст сообщения -> intent"
+    INTENT_CACHE_MAX_ENTRIES: int = 4096
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Обработка апдейтов: сколько хендлеров выполняется одновременно,
+    # сколько апдейтов polling держит в работе и сколько ждет в очереди одного пользователя
+    BOT_MAX_CONCURRENT_HANDLERS: int = 64
+    BOT_MAX_PENDING_UPDATES: int = 1000
+    BOT_USER_QUEUE_LIMIT: int = 5
+    # Токен-бакет на чат: в среднем BOT_RATE_LIMIT_PER_MINUTE сообщений в минуту,
+    # до BOT_RATE_LIMIT_BURST подряд; лишние отбрасываются (0 в любой из двух - без ограничения)
+    BOT_RATE_LIMIT_PER_MINUTE: float = 30
+    BOT_RATE_LIMIT_BURST: int = 10
+    # Запросы, которым нужна БД (нет в кэше результатов), идут в отдельную полосу,
+    # чтобы ответы из кэша не ждали за тяжелыми запросами
+    SLOW_LANE_CONCURRENCY: int = 8
+    SLOW_LANE_MAX_WAITING: int = 100
+
+    # Метрики в формате Prometheus: в режиме webhook - METRICS_PATH на порту вебхука,
+    # в режиме polling - отдельный сервер на METRICS_PORT (0 - не поднимать)
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 0
+    METRICS_PATH: str = "/metrics"
+    # Периодическая строка с метриками в логе, 0 - выключено
+    METRICS_LOG_INTERVAL_SECONDS: float = 0
+    # Запросы дольше порога пишутся в лог с SQL и параметрами (0 - выключено),
+    # SLOW_QUERY_EXPLAIN добавляет EXPLAIN (ANALYZE, BUFFERS) - запрос выполнится повторно
+    SLOW_QUERY_THRESHOLD_MS: int = 0
+    SLOW_QUERY_EXPLAIN: bool = False
 
     @property
     def database_url(self) -> str:
@@ -22,10 +125,33 @@ class Settings(BaseSettings):
             f"{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    @property
+    def read_database_url(self) -> str:
+        return self.DB_READ_URL or self.database_url
+
     model_config = SettingsConfigDict(
         env_file=str(Path(__file__).resolve().parents[2] / ".env"),
         extra="ignore",
     )
 
 
-settings = Settings()
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings()
+
+
+class _LazySettings:
+    """Settings() читается из окружения и .env при первом обращении к полю, а не при импорте.
+
+    Модули можно импортировать без .env (скрипты с --help, проверки импорта);
+    ошибка конфигурации всплывет при первом использовании настройки.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(get_settings(), name, value)
+
+
+settings = cast(Settings, _LazySettings())
@@ -1,12 +1,121 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import QueuePool
 
 from config.settings import settings
 
 
-engine = create_async_engine(settings.database_url, pool_pre_ping=True)
+def _engine_options(pool_size: int, max_overflow: int, server_settings: dict[str, str] | None = None) -> dict:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            # Кэш подготовленных запросов SQLAlchemy-диалекта и самого asyncpg;
+            # 0 отключает оба (нужно за pgbouncer в transaction mode)
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": server_settings or {},
+        },
+    }
+
+
+# Движки и фабрики сессий создаются при первом обращении: импорт модуля не читает
+# настройки и не требует .env
+_engine: AsyncEngine | None = None
+_read_engine: AsyncEngine | None = None
+_session_maker: async_sessionmaker[AsyncSession] | None = None
+_read_session_maker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.database_url,
+            **_engine_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW),
+        )
+    return _engine
+
+
+def get_read_engine() -> AsyncEngine:
+    """Аналитические запросы бота: отдельный пул (или реплика), только чтение и таймаут,
+    чтобы не конкурировать за соединения с импортом и фоновыми задачами."""
+    global _read_engine
+    if _read_engine is None:
+        read_server_settings = {"default_transaction_read_only": "on"}
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            read_server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        _read_engine = create_async_engine(
+            settings.read_database_url,
+            **_engine_options(settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW, read_server_settings),
+        )
+    return _read_engine
+
+
+def __getattr__(name: str):
+    # Старые импорты "from db.database import engine" создают движок в момент импорта имени
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def async_database_session_maker() -> AsyncSession:
+    global _session_maker
+    if _session_maker is None:
+        _session_maker = async_sessionmaker(bind=get_engine(), expire_on_commit=False)
+    return _session_maker()
+
+
+def async_read_session_maker() -> AsyncSession:
+    global _read_session_maker
+    if _read_session_maker is None:
+        _read_session_maker = async_sessionmaker(bind=get_read_engine(), expire_on_commit=False)
+    return _read_session_maker()
+
+
+def pool_is_saturated(engine: AsyncEngine | None = None) -> bool:
+    """Все соединения пула (по умолчанию - пула чтения), включая overflow, уже выданы.
+
+    Предел overflow берется из настроек пула; отрицательный - пул без предела, он не насыщается.
+    """
+    if engine is None or engine is _read_engine:
+        engine, max_overflow = get_read_engine(), settings.DB_READ_MAX_OVERFLOW
+    else:
+        max_overflow = settings.DB_MAX_OVERFLOW
+    pool = engine.pool
+    if max_overflow < 0 or not isinstance(pool, QueuePool):
+        return False
+    return pool.checkedin() == 0 and pool.overflow() >= max_overflow
+
+
+def pool_stats(engine: AsyncEngine) -> dict[str, int]:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+def created_engines() -> dict[str, AsyncEngine]:
+    """Уже созданные движки по имени (main, read); не созданные не создаются."""
+    engines = {"main": _engine, "read": _read_engine}
+    return {name: engine for name, engine in engines.items() if engine is not None}
+
+
+async def dispose_engines() -> None:
+    """Закрыть созданные движки; не созданные не трогаются."""
+    for engine in created_engines().values():
+        await engine.dispose()
 
-async_database_session_maker = async_sessionmaker(bind=engine, expire_on_commit=False)
 
 async def get_async_session():
     async with async_database_session_maker() as session:
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import importlib
+import pkgutil
+import re
+from types import ModuleType
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+
+_MIGRATION_NAME_RE = re.compile(r"^m\d{4}_\w+$")
+
+# Ключ advisory lock, чтобы две миграции не шли одновременно
+_MIGRATIONS_LOCK_KEY = 7_301_845_112
+
+
+def discover_migrations() -> list[tuple[str, ModuleType]]:
+    """Модули вида m0001_name.py в этом пакете, по возрастанию версии."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        if not _MIGRATION_NAME_RE.match(module_info.name):
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append((module_info.name, module))
+    return sorted(migrations)
+
+
+async def _ensure_migrations_table(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version text PRIMARY KEY, "
+        "applied_at timestamptz NOT NULL DEFAULT now())"
+    ))
+
+
+async def applied_migrations(conn: AsyncConnection) -> set[str]:
+    await _ensure_migrations_table(conn)
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return set(result.scalars())
+
+
+async def run_migrations(engine: AsyncEngine) -> list[str]:
+    """Применяет недостающие миграции и возвращает их версии.
+
+    Миграции выполняются в AUTOCOMMIT, иначе CREATE INDEX CONCURRENTLY невозможен,
+    поэтому каждая миграция должна быть идемпотентной.
+    """
+    applied_now = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATIONS_LOCK_KEY})
+        try:
+            applied = await applied_migrations(conn)
+            for version, module in discover_migrations():
+                if version in applied:
+                    continue
+                await module.upgrade(conn)
+                await conn.execute(
+                    text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                    {"version": version},
+                )
+                applied_now.append(version)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATIONS_LOCK_KEY})
+    return applied_now
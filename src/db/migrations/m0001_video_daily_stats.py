@@ -0,0 +1,20 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+description = "video_daily_stats for delta_sum rollups"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS video_daily_stats ("
+        "video_id uuid NOT NULL REFERENCES videos (id), "
+        "day date NOT NULL, "
+        "creator_id uuid NOT NULL, "
+        "delta_views_count bigint NOT NULL, "
+        "delta_likes_count bigint NOT NULL, "
+        "delta_comments_count bigint NOT NULL, "
+        "delta_reports_count bigint NOT NULL, "
+        "snapshots_count integer NOT NULL, "
+        "PRIMARY KEY (video_id, day))"
+    ))
@@ -0,0 +1,46 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db.migrations.ops import create_index, drop_index
+
+
+description = "covering indexes for nlq.sql_builder query shapes"
+
+_VIDEO_COUNTERS = ("views_count", "likes_count", "comments_count", "reports_count")
+_DELTAS = ("delta_views_count", "delta_likes_count", "delta_comments_count", "delta_reports_count")
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await create_index(
+        conn, "ix_videos_video_created_at", "videos", ["video_created_at"], include=_VIDEO_COUNTERS
+    )
+    await create_index(
+        conn,
+        "ix_videos_creator_id_video_created_at",
+        "videos",
+        ["creator_id", "video_created_at"],
+        include=_VIDEO_COUNTERS,
+    )
+    await create_index(
+        conn,
+        "ix_video_snapshots_created_at",
+        "video_snapshots",
+        ["created_at"],
+        include=("video_id", *_DELTAS),
+    )
+    await create_index(
+        conn,
+        "ix_video_daily_stats_day_deltas",
+        "video_daily_stats",
+        ["day"],
+        include=("video_id", *_DELTAS),
+    )
+    await create_index(
+        conn,
+        "ix_video_daily_stats_creator_id_day",
+        "video_daily_stats",
+        ["creator_id", "day"],
+        include=("video_id", *_DELTAS),
+    )
+    # Одноколоночные индексы первой версии video_daily_stats перекрыты составными
+    await drop_index(conn, "ix_video_daily_stats_day")
+    await drop_index(conn, "ix_video_daily_stats_creator_id")
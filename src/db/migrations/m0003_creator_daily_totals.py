@@ -0,0 +1,39 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db.migrations.ops import create_index
+
+
+description = "creator_daily_totals for measure=final by creator and day"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS creator_daily_totals ("
+        "creator_id uuid NOT NULL, "
+        "day date NOT NULL, "
+        "videos_count integer NOT NULL, "
+        "views_count bigint NOT NULL, "
+        "likes_count bigint NOT NULL, "
+        "comments_count bigint NOT NULL, "
+        "reports_count bigint NOT NULL, "
+        "PRIMARY KEY (creator_id, day))"
+    ))
+    # Заполняется по уже загруженным videos; таблицу, которую уже ведет импорт, не трогаем.
+    # SQL записан здесь, а не взят из ingest.rollups: миграция не должна меняться вместе с кодом
+    result = await conn.execute(text("SELECT EXISTS (SELECT 1 FROM creator_daily_totals)"))
+    if not result.scalar_one():
+        await conn.execute(text(
+            "INSERT INTO creator_daily_totals "
+            "(creator_id, day, videos_count, views_count, likes_count, comments_count, reports_count) "
+            "SELECT creator_id, video_created_at::date, count(*), "
+            "sum(views_count), sum(likes_count), sum(comments_count), sum(reports_count) "
+            "FROM videos GROUP BY creator_id, video_created_at::date"
+        ))
+    await create_index(
+        conn,
+        "ix_creator_daily_totals_day",
+        "creator_daily_totals",
+        ["day"],
+        include=("creator_id", "videos_count", "views_count", "likes_count", "comments_count", "reports_count"),
+    )
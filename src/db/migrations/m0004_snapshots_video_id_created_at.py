@@ -0,0 +1,17 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db.migrations.ops import create_index, drop_index
+
+
+description = "(video_id, created_at) index for the previous snapshot lookup in ingest.snapshots"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await create_index(
+        conn,
+        "ix_video_snapshots_video_id_created_at",
+        "video_snapshots",
+        ["video_id", "created_at"],
+    )
+    # Поиск по video_id покрывается новым индексом
+    await drop_index(conn, "ix_video_snapshots_video_id")
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+description = "video_daily_hll: HyperLogLog registers of videos with snapshots per day"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS video_daily_hll ("
+        "day date NOT NULL, "
+        "bucket smallint NOT NULL, "
+        "rank smallint NOT NULL, "
+        "PRIMARY KEY (day, bucket))"
+    ))
+    # Заполняется по уже посчитанным video_daily_stats; таблицу, которую уже ведет импорт, не трогаем.
+    # Регистры как в db.hll при HLL_PRECISION = 12: bucket - младшие 12 бит хэша video_id,
+    # rank - позиция первой единицы в старших 52 битах
+    result = await conn.execute(text("SELECT EXISTS (SELECT 1 FROM video_daily_hll)"))
+    if not result.scalar_one():
+        await conn.execute(text(
+            "INSERT INTO video_daily_hll (day, bucket, rank) "
+            "SELECT day, hashtextextended(video_id::text, 0) & 4095 AS bucket, "
+            "max(53 - length(ltrim("
+            "((hashtextextended(video_id::text, 0) >> 12) & 4503599627370495)::bit(52)::text, '0'))) "
+            "FROM video_daily_stats GROUP BY day, bucket"
+        ))
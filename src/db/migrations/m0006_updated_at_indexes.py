@@ -0,0 +1,11 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from db.migrations.ops import create_index
+
+
+description = "updated_at indexes for incremental reads of the columnar store"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    await create_index(conn, "ix_videos_updated_at", "videos", ["updated_at"])
+    await create_index(conn, "ix_video_snapshots_updated_at", "video_snapshots", ["updated_at"])
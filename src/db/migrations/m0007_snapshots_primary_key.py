@@ -0,0 +1,33 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+description = "video_snapshots primary key (id, created_at) as in the partitionable model"
+
+
+async def upgrade(conn: AsyncConnection) -> None:
+    result = await conn.execute(text(
+        "SELECT c.conname, array_agg(a.attname::text ORDER BY k.n) "
+        "FROM pg_constraint c "
+        "CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, n) "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum "
+        "WHERE c.conrelid = to_regclass('video_snapshots') AND c.contype = 'p' "
+        "GROUP BY c.conname"
+    ))
+    primary_key = result.one_or_none()
+    # Секционированная таблица и таблицы, созданные по новой модели, уже с новым ключом
+    if primary_key is None or primary_key[1] != ["id", "created_at"]:
+        # Индекс строится без блокировки записи, затем ключ подменяется одним ALTER TABLE;
+        # недостроенный индекс прерванного запуска пересоздается
+        await conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS video_snapshots_id_created_at_key"))
+        await conn.execute(text(
+            "CREATE UNIQUE INDEX CONCURRENTLY video_snapshots_id_created_at_key "
+            "ON video_snapshots (id, created_at)"
+        ))
+        drop = f"DROP CONSTRAINT {primary_key[0]}, " if primary_key is not None else ""
+        await conn.execute(text(
+            f"ALTER TABLE video_snapshots {drop}"
+            "ADD CONSTRAINT video_snapshots_pkey PRIMARY KEY USING INDEX video_snapshots_id_created_at_key"
+        ))
+    # UNIQUE (id) первой версии модели: уникальность id без created_at мешает секционированию
+    await conn.execute(text("ALTER TABLE video_snapshots DROP CONSTRAINT IF EXISTS video_snapshots_id_key"))
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+async def _relkind(conn: AsyncConnection, table: str) -> str | None:
+    result = await conn.execute(
+        text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    )
+    return result.scalar_one_or_none()
+
+
+async def create_index(
+    conn: AsyncConnection,
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    include: Sequence[str] = (),
+    using: str = "btree",
+) -> None:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS без блокировки записи в таблицу.
+
+    Недостроенный после прерванного CONCURRENTLY индекс (indisvalid = false) пересоздается.
+    На секционированных таблицах CONCURRENTLY не поддерживается, там индекс строится обычным образом.
+    """
+    relkind = await _relkind(conn, table)
+    if relkind is None:
+        raise ValueError(f"Table {table} does not exist")
+
+    result = await conn.execute(
+        text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "WHERE i.indexrelid = to_regclass(:name)"
+        ),
+        {"name": name},
+    )
+    valid = result.scalar_one_or_none()
+    if valid is True:
+        return
+    if valid is False:
+        await drop_index(conn, name)
+
+    concurrently = "" if relkind == "p" else "CONCURRENTLY "
+    sql = f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} USING {using} ({', '.join(columns)})"
+    if include:
+        sql += f" INCLUDE ({', '.join(include)})"
+    await conn.execute(text(sql))
+
+
+async def drop_index(conn: AsyncConnection, name: str) -> None:
+    # Индекс секционированной таблицы (relkind 'I') CONCURRENTLY удалить нельзя
+    concurrently = "" if await _relkind(conn, name) == "I" else "CONCURRENTLY "
+    await conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+logger = logging.getLogger(__name__)
+
+DATA_CHANGED_CHANNEL = "video_data_changed"
+
+
+async def notify_data_changed(session: AsyncSession) -> None:
+    """NOTIFY уходит подписчикам только при коммите транзакции сессии.
+
+    Одинаковые уведомления внутри транзакции Postgres схлопывает в одно.
+    """
+    await session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": DATA_CHANGED_CHANNEL})
+
+
+async def listen_data_changed(
+    engine: AsyncEngine,
+    on_change: Callable[[], Awaitable[None]],
+    reconnect_delay: float = 5.0,
+) -> None:
+    """Фоновая задача: держит соединение с LISTEN и вызывает on_change после уведомлений.
+
+    on_change выполняется одним воркером: уведомления, пришедшие пока он работает
+    (импорт шлет по одному на пачку), схлопываются в один следующий вызов.
+    """
+    changed = asyncio.Event()
+    worker = asyncio.create_task(_run_on_change(changed, on_change))
+    try:
+        await _listen(engine, changed, reconnect_delay)
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+
+async def _run_on_change(changed: asyncio.Event, on_change: Callable[[], Awaitable[None]]) -> None:
+    while True:
+        await changed.wait()
+        changed.clear()
+        try:
+            await on_change()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Data change handler failed")
+
+
+async def _listen(engine: AsyncEngine, changed: asyncio.Event, reconnect_delay: float) -> None:
+    while True:
+        try:
+            async with engine.connect() as conn:
+                raw_connection = await conn.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                lost = asyncio.Event()
+
+                def handle_notification(*args) -> None:
+                    changed.set()
+
+                driver_connection.add_termination_listener(lambda *args: lost.set())
+                await driver_connection.add_listener(DATA_CHANGED_CHANNEL, handle_notification)
+                # Пропущенные за время переподключения изменения
+                changed.set()
+                try:
+                    await lost.wait()
+                finally:
+                    if not driver_connection.is_closed():
+                        await driver_connection.remove_listener(
+                            DATA_CHANGED_CHANNEL, handle_notification
+                        )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Data change listener failed, reconnecting")
+        await asyncio.sleep(reconnect_delay)
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_TABLE = "video_snapshots"
+
+_PARTITIONS_LOCK_KEY = 7_301_845_113
+
+# Секции, о которых процесс уже знает: не нужно ходить в каталог на каждую пачку
+_known_partitions: set[date] = set()
+_interval_cache: dict[str, str | None] = {}
+
+
+def period_start(day: date, interval: str) -> date:
+    if interval == "month":
+        return day.replace(day=1)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unsupported partition interval: {interval}")
+
+
+def next_period_start(start: date, interval: str) -> date:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    raise ValueError(f"Unsupported partition interval: {interval}")
+
+
+def partition_name(start: date) -> str:
+    return f"{SNAPSHOTS_TABLE}_p{start:%Y%m%d}"
+
+
+def _utc_day(ts: datetime) -> date:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.date()
+
+
+async def partition_interval(conn: AsyncConnection | AsyncSession) -> str | None:
+    """Интервал секционирования video_snapshots, None если таблица не секционирована."""
+    if SNAPSHOTS_TABLE in _interval_cache:
+        return _interval_cache[SNAPSHOTS_TABLE]
+    result = await conn.execute(
+        text(
+            "SELECT c.relkind::text, obj_description(c.oid, 'pg_class') "
+            "FROM pg_class c WHERE c.oid = to_regclass(:table)"
+        ),
+        {"table": SNAPSHOTS_TABLE},
+    )
+    row = result.one_or_none()
+    interval = None
+    if row is not None and row[0] == "p":
+        comment = row[1] or ""
+        if not comment.startswith("partition_interval="):
+            raise RuntimeError(f"{SNAPSHOTS_TABLE} is partitioned but has no partition_interval comment")
+        interval = comment.split("=", 1)[1]
+    _interval_cache[SNAPSHOTS_TABLE] = interval
+    return interval
+
+
+async def existing_partitions(conn: AsyncConnection | AsyncSession) -> set[date]:
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": SNAPSHOTS_TABLE},
+    )
+    prefix = f"{SNAPSHOTS_TABLE}_p"
+    return {
+        datetime.strptime(name[len(prefix):], "%Y%m%d").date()
+        for name in result.scalars()
+        if name.startswith(prefix)
+    }
+
+
+async def create_partitions(conn: AsyncConnection | AsyncSession, starts: Iterable[date], interval: str) -> list[str]:
+    """Секции video_snapshots для периодов, начинающихся в starts.
+
+    Секция создается отдельной таблицей и подключается через ATTACH PARTITION: он берет
+    SHARE UPDATE EXCLUSIVE вместо ACCESS EXCLUSIVE у CREATE TABLE ... PARTITION OF и не
+    конфликтует с параллельной записью. Внешний ключ секции все равно ждет открытые
+    транзакции, пишущие в videos, поэтому вызывать не из транзакции, которая в них пишет.
+    """
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PARTITIONS_LOCK_KEY})
+    existing = await existing_partitions(conn)
+    created = []
+    for start in sorted(set(starts) - existing):
+        end = next_period_start(start, interval)
+        name = partition_name(start)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} "
+            f"(LIKE {SNAPSHOTS_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        await conn.execute(text(
+            f"ALTER TABLE {SNAPSHOTS_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+        ))
+        created.append(name)
+    return created
+
+
+async def ensure_snapshot_partitions(
+    session: AsyncSession,
+    timestamps: Iterable[datetime],
+    before_commit: Callable[[], Awaitable[None]] | None = None,
+) -> bool:
+    """Создает недостающие секции под created_at снапшотов.
+
+    Если секции пришлось создавать, текущая транзакция сессии коммитится до этого
+    (перед коммитом вызывается before_commit), поэтому вызывать нужно между
+    консистентными пачками записей. Возвращает True, если был коммит.
+    """
+    interval = await partition_interval(session)
+    if interval is None:
+        return False
+
+    starts = {period_start(_utc_day(ts), interval) for ts in timestamps}
+    missing = starts - _known_partitions
+    if not missing:
+        return False
+
+    _known_partitions.update(await existing_partitions(session))
+    missing -= _known_partitions
+    if not missing:
+        return False
+
+    if before_commit is not None:
+        await before_commit()
+    await session.commit()
+    await create_partitions(session, missing, interval)
+    await session.commit()
+    _known_partitions.update(missing)
+    return True
+
+
+async def ensure_upcoming_partitions(conn: AsyncConnection | AsyncSession, ahead: int) -> list[str]:
+    """Секции с текущего периода и на ahead периодов вперед."""
+    interval = await partition_interval(conn)
+    if interval is None:
+        return []
+    start = period_start(datetime.now(timezone.utc).date(), interval)
+    starts = [start]
+    for _ in range(ahead):
+        starts.append(next_period_start(starts[-1], interval))
+    return await create_partitions(conn, starts, interval)
+
+
+async def partition_maintenance_loop(engine: AsyncEngine, ahead: int, interval_seconds: float = 6 * 3600) -> None:
+    """Фоновая задача бота: будущие секции создаются заранее, до прихода снапшотов."""
+    while True:
+        try:
+            async with engine.begin() as conn:
+                for name in await ensure_upcoming_partitions(conn, ahead):
+                    logger.info("Created partition %s", name)
+        except Exception:
+            logger.exception("Snapshot partition maintenance failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def partitioned_snapshots_table(interval: str) -> Table:
+    """Копия таблицы VideoSnapshot с PARTITION BY RANGE (created_at) в отдельной MetaData.
+
+    Таблица модели не меняется: секционирование есть только в DDL этой копии.
+    """
+    from models.video_snapshots import VideoSnapshot
+    from models.videos import Video
+
+    metadata = MetaData()
+    # videos нужна в той же MetaData для внешнего ключа video_id
+    Video.__table__.to_metadata(metadata)
+    table = VideoSnapshot.__table__.to_metadata(metadata)
+    table.dialect_options["postgresql"]["partition_by"] = "RANGE (created_at)"
+    # Интервал запоминается в самой БД, секции дальше нарезаются по нему, а не по настройкам
+    table.comment = f"partition_interval={interval}"
+    return table
+
+
+async def create_schema(conn: AsyncConnection, interval: str) -> None:
+    """Таблицы моделей, которых еще нет; с interval не none video_snapshots создается секционированной."""
+    from db import Base
+
+    if interval == "none":
+        await conn.run_sync(Base.metadata.create_all)
+        return
+    tables = [table for table in Base.metadata.sorted_tables if table.name != SNAPSHOTS_TABLE]
+    await conn.run_sync(Base.metadata.create_all, tables=tables)
+    await conn.run_sync(partitioned_snapshots_table(interval).create, checkfirst=True)
+
+
+async def convert_to_partitioned(conn: AsyncConnection, interval: str) -> int:
+    """Перенос обычной video_snapshots в секционированную таблицу, возвращает число строк.
+
+    Выполняется одной транзакцией под ACCESS EXCLUSIVE: запись в снапшоты на это время встает.
+    """
+    if await partition_interval(conn) is not None:
+        raise RuntimeError(f"{SNAPSHOTS_TABLE} is already partitioned")
+
+    legacy = f"{SNAPSHOTS_TABLE}_unpartitioned"
+    await conn.execute(text(f"LOCK TABLE {SNAPSHOTS_TABLE} IN ACCESS EXCLUSIVE MODE"))
+    await conn.execute(text(f"ALTER TABLE {SNAPSHOTS_TABLE} RENAME TO {legacy}"))
+    # Имена индексов уникальны в схеме, старые нужно освободить для новой таблицы
+    result = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table"), {"table": legacy}
+    )
+    for index_name in result.scalars().all():
+        await conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name[:50]}_unpart"))
+    result = await conn.execute(
+        text("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"),
+        {"table": legacy},
+    )
+    for constraint_name in result.scalars().all():
+        await conn.execute(text(
+            f"ALTER TABLE {legacy} RENAME CONSTRAINT {constraint_name} TO {constraint_name[:50]}_unpart"
+        ))
+
+    table = partitioned_snapshots_table(interval)
+    await conn.run_sync(table.create)
+    _interval_cache.pop(SNAPSHOTS_TABLE, None)
+
+    result = await conn.execute(text(
+        f"SELECT (min(created_at) AT TIME ZONE 'UTC')::date, "
+        f"(max(created_at) AT TIME ZONE 'UTC')::date FROM {legacy}"
+    ))
+    first_day, last_day = result.one()
+    if first_day is not None:
+        starts = [period_start(first_day, interval)]
+        while next_period_start(starts[-1], interval) <= last_day:
+            starts.append(next_period_start(starts[-1], interval))
+        await create_partitions(conn, starts, interval)
+
+    columns = ", ".join(column.name for column in table.columns)
+    result = await conn.execute(text(
+        f"INSERT INTO {SNAPSHOTS_TABLE} ({columns}) SELECT {columns} FROM {legacy}"
+    ))
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+    return result.rowcount
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def copy_records(
+    session: AsyncSession,
+    table_name: str,
+    records: Sequence[tuple],
+    columns: Sequence[str],
+) -> None:
+    """COPY через asyncpg в транзакции сессии.
+
+    Сессия уже должна была выполнить хотя бы один запрос, иначе транзакция
+    SQLAlchemy ещё не открыта и COPY уйдёт мимо неё.
+    """
+    if not records:
+        return
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        table_name, records=records, columns=columns
+    )
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import re
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, Iterator, TextIO
+
+
+_READ_SIZE = 1 << 20
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+_NDJSON_SUFFIXES = {".ndjson", ".jsonl"}
+
+_decoder = json.JSONDecoder()
+
+
+def detect_format(path: str | Path) -> str:
+    return "ndjson" if Path(path).suffix.lower() in _NDJSON_SUFFIXES else "json"
+
+
+def _byte_len(s: str) -> int:
+    return len(s) if s.isascii() else len(s.encode("utf-8"))
+
+
+class _JsonStream:
+    """Буфер поверх текстового файла, из которого значения достаются через raw_decode."""
+
+    def __init__(self, f: TextIO, read_size: int = _READ_SIZE):
+        self._f = f
+        self._read_size = read_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        # Смещение начала буфера в байтах относительно места, откуда начато чтение
+        self._buf_offset = 0
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Буфер растёт хотя бы вдвое, чтобы длинный элемент не декодировался заново на каждый мегабайт
+        data = self._f.read(max(self._read_size, len(self._buf) - self._pos))
+        if not data:
+            self._eof = True
+            return False
+        self._buf_offset += _byte_len(self._buf[:self._pos])
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def position(self) -> int:
+        return self._buf_offset + _byte_len(self._buf[:self._pos])
+
+    def peek(self) -> str | None:
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return None
+
+    def expect(self, ch: str) -> None:
+        found = self.peek()
+        if found != ch:
+            raise ValueError(f"Expected {ch!r} in JSON stream, got {found!r}")
+        self._pos += 1
+
+    def decode(self):
+        if self.peek() is None:
+            raise ValueError("Unexpected end of JSON stream")
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # Число в конце буфера могло быть обрезано чтением
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def _open_array(stream: _JsonStream, key: str = "videos") -> None:
+    """Ставит поток на первый элемент массива key: {key: [...]} или просто [...]."""
+    first = stream.peek()
+    if first == "{":
+        stream.expect("{")
+        while True:
+            if stream.peek() == "}":
+                raise ValueError(f"JSON object has no {key!r} field")
+            name = stream.decode()
+            stream.expect(":")
+            if name == key:
+                break
+            stream.decode()
+            if stream.peek() == ",":
+                stream.expect(",")
+    elif first != "[":
+        raise ValueError(f"JSON input must be an object with {key!r} or an array")
+    stream.expect("[")
+
+
+def _iter_array_items(stream: _JsonStream, key: str = "videos") -> Iterator[dict]:
+    if stream.peek() == "]":
+        return
+    while True:
+        yield stream.decode()
+        ch = stream.peek()
+        if ch == ",":
+            stream.expect(",")
+            continue
+        if ch == "]":
+            return
+        raise ValueError(f"Expected ',' or ']' in {key} array, got {ch!r}")
+
+
+def iter_json_items(f: TextIO, key: str = "videos") -> Iterator[dict]:
+    """Элементы массива key по одному: {key: [...]} или просто [...]."""
+    stream = _JsonStream(f)
+    _open_array(stream, key)
+    yield from _iter_array_items(stream, key)
+
+
+def iter_json_videos(f: TextIO) -> Iterator[dict]:
+    """Элементы массива videos по одному: {"videos": [...]} или просто [...]."""
+    return iter_json_items(f, "videos")
+
+
+def iter_ndjson_videos(f: TextIO) -> Iterator[dict]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_items(
+    path: str | Path,
+    input_format: str = "auto",
+    key: str = "videos",
+    start: int = 0,
+    limit: int | None = None,
+) -> Iterator[dict]:
+    """Элементы массива key (или строки NDJSON) из файла по одному.
+
+    start - байтовое смещение начала элемента (см. plan_chunks), limit - сколько элементов прочитать.
+    """
+    if input_format == "auto":
+        input_format = detect_format(path)
+    if input_format not in ("json", "ndjson"):
+        raise ValueError(f"Unsupported input format: {input_format}")
+
+    with open(path, "rb") as raw:
+        raw.seek(start)
+        f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        if input_format == "ndjson":
+            items = iter_ndjson_videos(f)
+        elif start:
+            items = _iter_array_items(_JsonStream(f), key)
+        else:
+            items = iter_json_items(f, key)
+        yield from islice(items, limit)
+
+
+def iter_videos(
+    path: str | Path,
+    input_format: str = "auto",
+    start: int = 0,
+    limit: int | None = None,
+) -> Iterator[dict]:
+    """Видео из файла по одному (см. iter_items)."""
+    return iter_items(path, input_format, "videos", start, limit)
+
+
+def plan_chunks(path: str | Path, input_format: str = "auto", chunk_size: int = 10_000) -> list[tuple[int, int]]:
+    """Разбивка файла на чанки по chunk_size видео: список (байтовое смещение, количество).
+
+    Для NDJSON файл просто читается построчно, JSON приходится один раз разобрать целиком.
+    """
+    if input_format == "auto":
+        input_format = detect_format(path)
+
+    chunks: list[list[int]] = []
+    if input_format == "ndjson":
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    if not chunks or chunks[-1][1] >= chunk_size:
+                        chunks.append([offset, 0])
+                    chunks[-1][1] += 1
+                offset += len(line)
+    elif input_format == "json":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            stream = _JsonStream(f)
+            _open_array(stream, "videos")
+            if stream.peek() != "]":
+                while True:
+                    if not chunks or chunks[-1][1] >= chunk_size:
+                        stream.peek()
+                        chunks.append([stream.position(), 0])
+                    stream.decode()
+                    chunks[-1][1] += 1
+                    ch = stream.peek()
+                    if ch == ",":
+                        stream.expect(",")
+                        continue
+                    if ch == "]":
+                        break
+                    raise ValueError(f"Expected ',' or ']' in videos array, got {ch!r}")
+    else:
+        raise ValueError(f"Unsupported input format: {input_format}")
+
+    return [(start, count) for start, count in chunks]
+
+
+async def stream_video_chunks(
+    path: str | Path,
+    input_format: str = "auto",
+    chunk_size: int = 1000,
+    start: int = 0,
+    limit: int | None = None,
+) -> AsyncIterator[list[dict]]:
+    """Разбор файла в отдельном потоке с опережением на один чанк.
+
+    Пока потребитель пишет текущий чанк в БД, следующий уже разбирается,
+    а в памяти одновременно держится не больше двух чанков.
+    """
+    videos = iter_videos(path, input_format, start, limit)
+
+    def next_chunk() -> list[dict]:
+        chunk = []
+        for video_data in videos:
+            chunk.append(video_data)
+            if len(chunk) >= chunk_size:
+                break
+        return chunk
+
+    pending = asyncio.ensure_future(asyncio.to_thread(next_chunk))
+    try:
+        while True:
+            chunk = await pending
+            if not chunk:
+                return
+            pending = asyncio.ensure_future(asyncio.to_thread(next_chunk))
+            yield chunk
+    finally:
+        # Генератор нельзя закрывать, пока поток ещё читает из него
+        await asyncio.wait([pending])
+        videos.close()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import column, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from db.hll import hll_registers
+from ingest.copy import copy_records
+
+
+DAILY_STATS_COLUMNS = (
+    "video_id",
+    "day",
+    "creator_id",
+    "delta_views_count",
+    "delta_likes_count",
+    "delta_comments_count",
+    "delta_reports_count",
+    "snapshots_count",
+)
+
+_DELTA_COLUMNS = DAILY_STATS_COLUMNS[3:]
+
+CREATOR_TOTALS_COLUMNS = (
+    "creator_id",
+    "day",
+    "videos_count",
+    "views_count",
+    "likes_count",
+    "comments_count",
+    "reports_count",
+)
+
+_TOTALS_COLUMNS = CREATOR_TOTALS_COLUMNS[2:]
+
+_DAILY_HLL = table("video_daily_hll", column("day"), column("bucket"), column("rank"))
+
+def aggregate_daily_stats(
+    snapshots: Iterable[tuple[uuid.UUID, uuid.UUID, datetime, int, int, int, int]],
+) -> list[tuple]:
+    """Свертка снапшотов (video_id, creator_id, created_at, delta_views, delta_likes,
+    delta_comments, delta_reports) в строки video_daily_stats."""
+    totals: dict[tuple, list[int]] = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for video_id, creator_id, created_at, views, likes, comments, reports in snapshots:
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc)
+        acc = totals[(video_id, created_at.date(), creator_id)]
+        acc[0] += views
+        acc[1] += likes
+        acc[2] += comments
+        acc[3] += reports
+        acc[4] += 1
+    return [(*key, *values) for key, values in totals.items()]
+
+
+async def add_daily_stats(session: AsyncSession, rows: list[tuple]) -> None:
+    """Прибавление строк из aggregate_daily_stats к video_daily_stats.
+
+    Строки должны быть уникальны по (video_id, day), aggregate_daily_stats это гарантирует.
+    Upsert идет в порядке ключа конфликта: параллельные импорты берут блокировки строк
+    в одном порядке и не попадают во взаимную блокировку.
+    """
+    if not rows:
+        return
+    await session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS video_daily_stats_stage "
+        "(LIKE video_daily_stats) ON COMMIT DROP"
+    ))
+    await copy_records(session, "video_daily_stats_stage", rows, DAILY_STATS_COLUMNS)
+
+    columns = ", ".join(DAILY_STATS_COLUMNS)
+    updates = ", ".join(
+        f"{column} = video_daily_stats.{column} + EXCLUDED.{column}" for column in _DELTA_COLUMNS
+    )
+    await session.execute(text(
+        f"INSERT INTO video_daily_stats ({columns}) "
+        f"SELECT {columns} FROM video_daily_stats_stage ORDER BY video_id, day "
+        f"ON CONFLICT (video_id, day) DO UPDATE SET {updates}"
+    ))
+    await add_daily_hll(session, table("video_daily_stats_stage", column("video_id"), column("day")))
+    await session.execute(text("TRUNCATE video_daily_stats_stage"))
+
+
+async def rebuild_daily_stats(session: AsyncSession) -> None:
+    """Полный пересчет video_daily_stats и video_daily_hll по video_snapshots."""
+    await session.execute(text("TRUNCATE video_daily_stats"))
+    await session.execute(text(
+        f"INSERT INTO video_daily_stats ({', '.join(DAILY_STATS_COLUMNS)}) "
+        "SELECT s.video_id, (s.created_at AT TIME ZONE 'UTC')::date, v.creator_id, "
+        "sum(s.delta_views_count), sum(s.delta_likes_count), "
+        "sum(s.delta_comments_count), sum(s.delta_reports_count), count(*) "
+        "FROM video_snapshots s JOIN videos v ON v.id = s.video_id "
+        "GROUP BY s.video_id, (s.created_at AT TIME ZONE 'UTC')::date, v.creator_id"
+    ))
+    await rebuild_daily_hll(session)
+
+
+async def add_daily_hll(session: AsyncSession | AsyncConnection, source) -> None:
+    """Добавление пар (video_id, day) из source в регистры video_daily_hll.
+
+    Регистр только растет, поэтому повторное добавление тех же пар ничего не меняет.
+    Регистры пишутся в порядке (day, bucket), как и остальные upsert в агрегаты.
+    """
+    registers = hll_registers(source)
+    registers = registers.order_by(registers.selected_columns.day, registers.selected_columns.bucket)
+    stmt = insert(_DAILY_HLL).from_select(["day", "bucket", "rank"], registers)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=["day", "bucket"],
+        set_={"rank": stmt.excluded.rank},
+        where=stmt.excluded.rank > _DAILY_HLL.c.rank,
+    ))
+
+
+async def rebuild_daily_hll(session: AsyncSession | AsyncConnection) -> None:
+    """Полный пересчет video_daily_hll по video_daily_stats."""
+    await session.execute(text("TRUNCATE video_daily_hll"))
+    await add_daily_hll(session, table("video_daily_stats", column("video_id"), column("day")))
+
+
+def aggregate_creator_totals(
+    videos: Iterable[tuple[uuid.UUID, datetime, int, int, int, int, int]],
+) -> list[tuple]:
+    """Свертка изменений видео (creator_id, video_created_at, новых видео, views, likes,
+    comments, reports) в строки creator_daily_totals.
+
+    Для новых видео передаются их счетчики и 1, для обновленных - прирост счетчиков и 0.
+    """
+    totals: dict[tuple, list[int]] = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for creator_id, video_created_at, videos_count, views, likes, comments, reports in videos:
+        acc = totals[(creator_id, video_created_at.date())]
+        acc[0] += videos_count
+        acc[1] += views
+        acc[2] += likes
+        acc[3] += comments
+        acc[4] += reports
+    return [(*key, *values) for key, values in totals.items()]
+
+
+async def add_creator_totals(session: AsyncSession, rows: list[tuple]) -> None:
+    """Прибавление строк из aggregate_creator_totals к creator_daily_totals.
+
+    Вызывается в той же транзакции, что и запись в videos, иначе итоги разойдутся со счетчиками.
+    Строки пишутся в порядке (creator_id, day), см. add_daily_stats.
+    """
+    if not rows:
+        return
+    await session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS creator_daily_totals_stage "
+        "(LIKE creator_daily_totals) ON COMMIT DROP"
+    ))
+    await copy_records(session, "creator_daily_totals_stage", rows, CREATOR_TOTALS_COLUMNS)
+
+    columns = ", ".join(CREATOR_TOTALS_COLUMNS)
+    updates = ", ".join(
+        f"{column} = creator_daily_totals.{column} + EXCLUDED.{column}" for column in _TOTALS_COLUMNS
+    )
+    await session.execute(text(
+        f"INSERT INTO creator_daily_totals ({columns}) "
+        f"SELECT {columns} FROM creator_daily_totals_stage ORDER BY creator_id, day "
+        f"ON CONFLICT (creator_id, day) DO UPDATE SET {updates}"
+    ))
+    await session.execute(text("TRUNCATE creator_daily_totals_stage"))
+
+
+async def rebuild_creator_totals(session: AsyncSession) -> None:
+    """Полный пересчет creator_daily_totals по videos."""
+    await session.execute(text("TRUNCATE creator_daily_totals"))
+    await session.execute(text(
+        f"INSERT INTO creator_daily_totals ({', '.join(CREATOR_TOTALS_COLUMNS)}) "
+        "SELECT creator_id, video_created_at::date, count(*), "
+        "sum(views_count), sum(likes_count), sum(comments_count), sum(reports_count) "
+        "FROM videos GROUP BY creator_id, video_created_at::date"
+    ))
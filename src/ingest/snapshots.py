@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Sequence
+
+from sqlalchemy import Date, Uuid, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.notifications import notify_data_changed
+from db.partitions import ensure_snapshot_partitions
+from ingest.copy import copy_records
+from ingest.rollups import add_daily_hll
+
+
+# Строка фида: абсолютные счетчики видео на момент created_at
+FEED_COLUMNS = (
+    "video_id",
+    "created_at",
+    "views_count",
+    "likes_count",
+    "comments_count",
+    "reports_count",
+)
+
+_COUNTERS = FEED_COLUMNS[2:]
+_DELTAS = tuple(f"delta_{column}" for column in _COUNTERS)
+
+
+@dataclass
+class SnapshotIngestResult:
+    inserted: int
+    # Повторы внутри пачки и замеры не новее последнего снапшота видео
+    skipped: int
+    # video_id, которых нет в videos
+    unknown_videos: int
+    videos_updated: int
+
+
+def feed_row(item: dict) -> tuple:
+    """Строка фида из JSON-объекта; наивное created_at считается UTC."""
+    created_at = datetime.fromisoformat(item["created_at"])
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (
+        uuid.UUID(str(item["video_id"])),
+        created_at,
+        int(item.get("views_count", 0)),
+        int(item.get("likes_count", 0)),
+        int(item.get("comments_count", 0)),
+        int(item.get("reports_count", 0)),
+    )
+
+
+def _comma(columns: Sequence[str], prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{column}" for column in columns)
+
+
+# Прирост считается к предыдущему замеру: внутри пачки - через lag, для первого
+# замера видео в пачке - к последнему снапшоту в БД (или к нулю, если снапшотов нет).
+# Замеры не новее последнего снапшота отбрасываются: они сломали бы приросты уже записанных.
+_DELTAS_SQL = f"""
+INSERT INTO snapshot_feed_deltas
+WITH batch AS (
+    SELECT DISTINCT ON (video_id, created_at) {_comma(FEED_COLUMNS)}
+    FROM snapshot_feed_stage
+    ORDER BY video_id, created_at
+),
+last AS (
+    SELECT b.video_id, l.created_at, {_comma(_COUNTERS, "l.")}
+    FROM (SELECT DISTINCT video_id FROM batch) b
+    CROSS JOIN LATERAL (
+        SELECT s.created_at, {_comma(_COUNTERS, "s.")}
+        FROM video_snapshots s
+        WHERE s.video_id = b.video_id
+        ORDER BY s.created_at DESC
+        LIMIT 1
+    ) l
+),
+fresh AS (
+    SELECT {_comma(FEED_COLUMNS, "b.")}, v.creator_id
+    FROM batch b
+    JOIN videos v ON v.id = b.video_id
+    LEFT JOIN last ON last.video_id = b.video_id
+    WHERE last.created_at IS NULL OR b.created_at > last.created_at
+)
+SELECT
+    f.video_id, f.creator_id, f.created_at,
+    {_comma(_COUNTERS, "f.")},
+    {", ".join(
+        f"f.{column} - lag(f.{column}, 1, coalesce(last.{column}, 0)) OVER w"
+        for column in _COUNTERS
+    )}
+FROM fresh f
+LEFT JOIN last ON last.video_id = f.video_id
+WINDOW w AS (PARTITION BY f.video_id ORDER BY f.created_at)
+"""
+
+
+async def _create_temp_tables(session: AsyncSession) -> None:
+    await session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS snapshot_feed_stage ("
+        "video_id uuid NOT NULL, created_at timestamptz NOT NULL, "
+        "views_count integer NOT NULL, likes_count integer NOT NULL, "
+        "comments_count integer NOT NULL, reports_count integer NOT NULL"
+        ") ON COMMIT DROP"
+    ))
+    await session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS snapshot_feed_deltas ("
+        "video_id uuid NOT NULL, creator_id uuid NOT NULL, created_at timestamptz NOT NULL, "
+        "views_count integer NOT NULL, likes_count integer NOT NULL, "
+        "comments_count integer NOT NULL, reports_count integer NOT NULL, "
+        "delta_views_count integer NOT NULL, delta_likes_count integer NOT NULL, "
+        "delta_comments_count integer NOT NULL, delta_reports_count integer NOT NULL"
+        ") ON COMMIT DROP"
+    ))
+
+
+async def ingest_snapshots(
+    session: AsyncSession,
+    rows: Sequence[tuple[uuid.UUID, datetime, int, int, int, int]],
+) -> SnapshotIngestResult:
+    """Пачка замеров (video_id, created_at, views, likes, comments, reports) в БД.
+
+    Приросты, снапшоты, video_daily_stats, video_daily_hll, creator_daily_totals и счетчики videos
+    считаются в SQL по всей пачке сразу, в транзакции сессии; коммит - за вызывающим.
+    created_at должен быть с таймзоной. Видео пачки блокируются до коммита, так что
+    параллельные пачки с общими видео выполняются по очереди.
+    """
+    if not rows:
+        return SnapshotIngestResult(0, 0, 0, 0)
+
+    # Недостающие секции создаются до записи, с коммитом предыдущих пачек
+    await ensure_snapshot_partitions(session, (row[1] for row in rows))
+
+    # Первый execute открывает транзакцию, в которой дальше работает COPY
+    await _create_temp_tables(session)
+    await copy_records(session, "snapshot_feed_stage", rows, FEED_COLUMNS)
+
+    # Порядок блокировок по id, чтобы встречные пачки не ловили deadlock
+    await session.execute(text(
+        "SELECT id FROM videos "
+        "WHERE id IN (SELECT DISTINCT video_id FROM snapshot_feed_stage) "
+        "ORDER BY id FOR UPDATE"
+    ))
+    unknown_videos, unknown_rows = (await session.execute(text(
+        "SELECT count(DISTINCT video_id), count(*) FROM snapshot_feed_stage s "
+        "WHERE NOT EXISTS (SELECT 1 FROM videos v WHERE v.id = s.video_id)"
+    ))).one()
+
+    await session.execute(text(_DELTAS_SQL))
+
+    inserted = (await session.execute(text(
+        f"INSERT INTO video_snapshots (id, video_id, {_comma(_COUNTERS)}, {_comma(_DELTAS)}, created_at) "
+        f"SELECT gen_random_uuid(), video_id, {_comma(_COUNTERS)}, {_comma(_DELTAS)}, created_at "
+        "FROM snapshot_feed_deltas"
+    ))).rowcount
+
+    await session.execute(text(
+        "INSERT INTO video_daily_stats "
+        f"(video_id, day, creator_id, {_comma(_DELTAS)}, snapshots_count) "
+        "SELECT video_id, (created_at AT TIME ZONE 'UTC')::date, creator_id, "
+        f"{', '.join(f'sum({column})' for column in _DELTAS)}, count(*) "
+        "FROM snapshot_feed_deltas GROUP BY 1, 2, 3 ORDER BY 1, 2 "
+        "ON CONFLICT (video_id, day) DO UPDATE SET "
+        + ", ".join(
+            f"{column} = video_daily_stats.{column} + EXCLUDED.{column}"
+            for column in (*_DELTAS, "snapshots_count")
+        )
+    ))
+    await add_daily_hll(session, text(
+        "SELECT video_id, (created_at AT TIME ZONE 'UTC')::date AS day FROM snapshot_feed_deltas"
+    ).columns(video_id=Uuid, day=Date).subquery())
+
+    # Новые счетчики видео - последний замер пачки; итоги креатора меняются на разницу
+    # со старыми счетчиками, поэтому пересчитываются до UPDATE videos
+    latest = (
+        "SELECT DISTINCT ON (video_id) video_id, "
+        f"{_comma(_COUNTERS)} FROM snapshot_feed_deltas ORDER BY video_id, created_at DESC"
+    )
+    await session.execute(text(
+        f"INSERT INTO creator_daily_totals (creator_id, day, videos_count, {_comma(_COUNTERS)}) "
+        "SELECT v.creator_id, v.video_created_at::date, 0, "
+        + ", ".join(f"sum(l.{column} - v.{column})" for column in _COUNTERS)
+        + f" FROM ({latest}) l JOIN videos v ON v.id = l.video_id GROUP BY 1, 2 ORDER BY 1, 2 "
+        "ON CONFLICT (creator_id, day) DO UPDATE SET "
+        + ", ".join(f"{column} = creator_daily_totals.{column} + EXCLUDED.{column}" for column in _COUNTERS)
+    ))
+    videos_updated = (await session.execute(text(
+        "UPDATE videos v SET "
+        + ", ".join(f"{column} = l.{column}" for column in _COUNTERS)
+        + f", updated_at = now() FROM ({latest}) l WHERE v.id = l.video_id"
+    ))).rowcount
+
+    await session.execute(text("TRUNCATE snapshot_feed_stage, snapshot_feed_deltas"))
+    if inserted:
+        # Бот сбросит кэш результатов, когда транзакция закоммитится
+        await notify_data_changed(session)
+
+    return SnapshotIngestResult(
+        inserted=inserted,
+        skipped=len(rows) - inserted - unknown_rows,
+        unknown_videos=unknown_videos,
+        videos_updated=videos_updated,
+    )
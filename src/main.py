@@ -1,27 +1,214 @@
 import asyncio
 import logging
+import multiprocessing
+import os
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
+from bot.concurrency import ChatRateLimitMiddleware, OrderedConcurrencyMiddleware
 from bot.handlers import router
+from bot.webhook import serve_webhook
 
 from config.settings import settings
+from db.database import created_engines, dispose_engines, get_engine, pool_stats
+from db.notifications import listen_data_changed
+from db.partitions import partition_maintenance_loop
+from monitoring.metrics import DB_POOL_CONNECTIONS, metrics_log_loop, set_common_labels
+from monitoring.server import serve_metrics
+from nlq.service import on_data_changed, refresh_columnar_store, save_columnar_store
 
-dp = Dispatcher()
-dp.include_router(router)
+logger = logging.getLogger(__name__)
 
-async def main() -> None:
+
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    # Бакет без токенов отбросил бы все апдейты: 0 в любой из настроек выключает ограничение
+    if settings.BOT_RATE_LIMIT_PER_MINUTE > 0 and settings.BOT_RATE_LIMIT_BURST > 0:
+        # Раньше очереди пользователя: отброшенные апдейты не ждут и не занимают хендлеры
+        dp.update.outer_middleware(
+            ChatRateLimitMiddleware(
+                per_minute=settings.BOT_RATE_LIMIT_PER_MINUTE,
+                burst=settings.BOT_RATE_LIMIT_BURST,
+            )
+        )
+    dp.update.outer_middleware(
+        OrderedConcurrencyMiddleware(
+            max_in_flight=settings.BOT_MAX_CONCURRENT_HANDLERS,
+            per_user_limit=settings.BOT_USER_QUEUE_LIMIT,
+        )
+    )
+    dp.include_router(router)
+    return dp
+
+
+def _pool_gauges() -> dict[tuple[str, ...], float]:
+    # Выгрузка метрик не должна создавать пулы, которые процесс не использует
+    return {
+        (name, state): value
+        for name, pool_engine in created_engines().items()
+        for state, value in pool_stats(pool_engine).items()
+    }
+
+
+DB_POOL_CONNECTIONS.set_function(_pool_gauges)
+
+
+def setup_logging() -> None:
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s",
     )
 
+
+def create_bot() -> Bot:
     if not settings.BOT_TOKEN:
         raise ValueError("BOT_TOKEN не найден в переменных окружения!")
 
-    bot = Bot(token=settings.BOT_TOKEN)
-    await dp.start_polling(bot)
+    session = None
+    if settings.TELEGRAM_API_URL:
+        # Локальный Bot API сервер или заглушка из scripts/stub_telegram.py
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.BOT_TOKEN, session=session)
+
+
+def start_background_tasks(
+    maintain_partitions: bool = True, serve_metrics_port: bool = False, save_columnar: bool = True
+) -> list[asyncio.Task]:
+    tasks = [
+        # Импорт новых данных сбрасывает кэш результатов и дочитывается в колоночную копию
+        asyncio.create_task(listen_data_changed(get_engine(), on_data_changed)),
+    ]
+    if settings.COLUMNAR_BACKEND:
+        from nlq.columnar import columnar_refresh_loop, columnar_save_loop
+
+        tasks.append(
+            asyncio.create_task(
+                columnar_refresh_loop(refresh_columnar_store, settings.COLUMNAR_REFRESH_INTERVAL_SECONDS)
+            )
+        )
+        if save_columnar and settings.COLUMNAR_SNAPSHOT_PATH and settings.COLUMNAR_SNAPSHOT_INTERVAL_SECONDS:
+            tasks.append(
+                asyncio.create_task(
+                    columnar_save_loop(save_columnar_store, settings.COLUMNAR_SNAPSHOT_INTERVAL_SECONDS)
+                )
+            )
+    if settings.METRICS_LOG_INTERVAL_SECONDS:
+        tasks.append(asyncio.create_task(metrics_log_loop(settings.METRICS_LOG_INTERVAL_SECONDS)))
+    if serve_metrics_port and settings.METRICS_PORT:
+        tasks.append(
+            asyncio.create_task(
+                serve_metrics(settings.METRICS_HOST, settings.METRICS_PORT, settings.METRICS_PATH)
+            )
+        )
+    if maintain_partitions:
+        tasks.append(
+            asyncio.create_task(
+                partition_maintenance_loop(get_engine(), settings.SNAPSHOT_PARTITIONS_AHEAD)
+            )
+        )
+    return tasks
+
+
+async def stop_background_tasks(tasks: list[asyncio.Task], save_columnar: bool = True) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if save_columnar:
+        # Следующий процесс стартует с этой копии и дочитает только новое
+        try:
+            await save_columnar_store()
+        except Exception:
+            logger.exception("Columnar store save failed")
+
+
+async def run_polling() -> None:
+    bot = create_bot()
+    dp = create_dispatcher()
+    background_tasks = start_background_tasks(serve_metrics_port=True)
+    try:
+        await dp.start_polling(
+            bot,
+            handle_as_tasks=True,
+            tasks_concurrency_limit=settings.BOT_MAX_PENDING_UPDATES,
+        )
+    finally:
+        await stop_background_tasks(background_tasks)
+
+
+async def run_webhook(worker_index: int = 0) -> None:
+    bot = create_bot()
+    dp = create_dispatcher()
+    # Секции, setWebhook и файл колоночной копии - забота одного процесса, кэш у каждого свой
+    is_primary = worker_index == 0
+    background_tasks = start_background_tasks(maintain_partitions=is_primary, save_columnar=is_primary)
+    try:
+        if is_primary and settings.WEBHOOK_URL:
+            await bot.set_webhook(
+                settings.WEBHOOK_URL,
+                secret_token=settings.WEBHOOK_SECRET,
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            )
+        await serve_webhook(
+            dp,
+            bot,
+            host=settings.WEBHOOK_HOST,
+            port=settings.WEBHOOK_PORT,
+            path=settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET,
+            drain_timeout=settings.WEBHOOK_DRAIN_TIMEOUT_SECONDS,
+            reuse_port=settings.WEBHOOK_WORKERS > 1,
+            metrics_path=settings.METRICS_PATH,
+        )
+    finally:
+        await stop_background_tasks(background_tasks, save_columnar=is_primary)
+        await dispose_engines()
+
+
+def webhook_worker(worker_index: int) -> None:
+    setup_logging()
+    # Метрики у каждого процесса свои, различаются меткой
+    set_common_labels(worker=str(worker_index))
+    asyncio.run(run_webhook(worker_index))
+
+
+def run_webhook_workers(workers: int) -> None:
+    """Несколько процессов слушают один порт (SO_REUSEPORT).
+
+    SIGTERM/SIGINT пересылается воркерам: каждый перестает принимать апдейты
+    и дожидается начатых, главный процесс ждет их завершения.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=webhook_worker, args=(index,), name=f"webhook-{index}")
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward_signal(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+    for process in processes:
+        process.join()
+
+
+async def main() -> None:
+    setup_logging()
+    await run_polling()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-    
\ No newline at end of file
+    if settings.BOT_MODE == "webhook":
+        if settings.WEBHOOK_WORKERS > 1:
+            run_webhook_workers(settings.WEBHOOK_WORKERS)
+        else:
+            setup_logging()
+            asyncio.run(run_webhook())
+    else:
+        asyncio.run(main())
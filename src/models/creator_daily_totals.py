@@ -0,0 +1,38 @@
+from sqlalchemy import BigInteger, Column, Date, Index, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from db import Base
+
+
+class CreatorDailyTotal(Base):
+    """Текущие счетчики видео креатора, опубликованных в один день.
+
+    Сумма по дням дает итоги креатора за все время; measure=final по целым дням
+    читается отсюда вместо строк videos.
+    """
+
+    __tablename__ = 'creator_daily_totals'
+
+    creator_id = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)  # дата video_created_at
+
+    videos_count = Column(Integer, default=0, nullable=False)
+    views_count = Column(BigInteger, default=0, nullable=False)
+    likes_count = Column(BigInteger, default=0, nullable=False)
+    comments_count = Column(BigInteger, default=0, nullable=False)
+    reports_count = Column(BigInteger, default=0, nullable=False)
+
+    __table_args__ = (
+        Index(
+            'ix_creator_daily_totals_day',
+            'day',
+            postgresql_include=[
+                'creator_id',
+                'videos_count',
+                'views_count',
+                'likes_count',
+                'comments_count',
+                'reports_count',
+            ],
+        ),
+    )
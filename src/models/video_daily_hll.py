@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Date, SmallInteger
+
+from db import Base
+
+
+class VideoDailyHll(Base):
+    """Регистры HyperLogLog по video_id видео, у которых были снапшоты за день (UTC).
+
+    Приближенный COUNT(DISTINCT video_id) за период без чтения video_daily_stats, см. db.hll.
+    """
+
+    __tablename__ = 'video_daily_hll'
+
+    day = Column(Date, primary_key=True)
+    bucket = Column(SmallInteger, primary_key=True)
+    rank = Column(SmallInteger, nullable=False)
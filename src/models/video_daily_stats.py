@@ -0,0 +1,45 @@
+from sqlalchemy import BigInteger, Column, Date, ForeignKey, Index, Integer
+from sqlalchemy.dialects.postgresql import UUID
+
+from db import Base
+
+
+class VideoDailyStat(Base):
+    __tablename__ = 'video_daily_stats'
+
+    video_id = Column(UUID(as_uuid=True), ForeignKey('videos.id'), primary_key=True)
+    day = Column(Date, primary_key=True)  # день замера в UTC
+    creator_id = Column(UUID(as_uuid=True), nullable=False)
+
+    delta_views_count = Column(BigInteger, default=0, nullable=False)
+    delta_likes_count = Column(BigInteger, default=0, nullable=False)
+    delta_comments_count = Column(BigInteger, default=0, nullable=False)
+    delta_reports_count = Column(BigInteger, default=0, nullable=False)
+
+    snapshots_count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index(
+            'ix_video_daily_stats_day_deltas',
+            'day',
+            postgresql_include=[
+                'video_id',
+                'delta_views_count',
+                'delta_likes_count',
+                'delta_comments_count',
+                'delta_reports_count',
+            ],
+        ),
+        Index(
+            'ix_video_daily_stats_creator_id_day',
+            'creator_id',
+            'day',
+            postgresql_include=[
+                'video_id',
+                'delta_views_count',
+                'delta_likes_count',
+                'delta_comments_count',
+                'delta_reports_count',
+            ],
+        ),
+    )
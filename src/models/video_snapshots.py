@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 
 from db import Base
@@ -8,8 +8,9 @@ from db import Base
 class VideoSnapshot(Base):
     __tablename__ = 'video_snapshots'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
-    video_id = Column(UUID(as_uuid=True), ForeignKey('videos.id'), nullable=False, index=True)
+    # created_at входит в первичный ключ, иначе таблицу нельзя секционировать по нему
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False)
+    video_id = Column(UUID(as_uuid=True), ForeignKey('videos.id'), nullable=False)
 
     views_count = Column(Integer, nullable=False)
     likes_count = Column(Integer, nullable=False)
@@ -21,5 +22,24 @@ class VideoSnapshot(Base):
     delta_comments_count = Column(Integer, nullable=False)
     delta_reports_count = Column(Integer, nullable=False)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)  # время замера (раз в час)
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False)  # время замера (раз в час)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Сумма приростов за диапазон времени читается index-only сканом,
+    # последний снапшот видео (для приростов при загрузке фида) - по (video_id, created_at)
+    __table_args__ = (
+        Index(
+            'ix_video_snapshots_created_at',
+            'created_at',
+            postgresql_include=[
+                'video_id',
+                'delta_views_count',
+                'delta_likes_count',
+                'delta_comments_count',
+                'delta_reports_count',
+            ],
+        ),
+        Index('ix_video_snapshots_video_id_created_at', 'video_id', 'created_at'),
+        # Дочитывание колоночной копии (nlq.columnar) по времени вставки
+        Index('ix_video_snapshots_updated_at', 'updated_at'),
+    )
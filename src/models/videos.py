@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Integer, DateTime, func
+from sqlalchemy import Column, Integer, DateTime, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 
 from db import Base
@@ -18,4 +18,22 @@ class Video(Base):
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # Покрывающие индексы под запросы nlq.sql_builder: диапазон по video_created_at,
+    # опционально с creator_id, счетчики берутся прямо из индекса
+    __table_args__ = (
+        Index(
+            'ix_videos_video_created_at',
+            'video_created_at',
+            postgresql_include=['views_count', 'likes_count', 'comments_count', 'reports_count'],
+        ),
+        Index(
+            'ix_videos_creator_id_video_created_at',
+            'creator_id',
+            'video_created_at',
+            postgresql_include=['views_count', 'likes_count', 'comments_count', 'reports_count'],
+        ),
+        # Дочитывание колоночной копии (nlq.columnar) по времени изменения
+        Index('ix_videos_updated_at', 'updated_at'),
+    )
     
\ No newline at end of file
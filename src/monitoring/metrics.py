@@ -0,0 +1,254 @@
+"""Метрики процесса в текстовом формате Prometheus без сторонних библиотек.
+
+Значения живут в памяти процесса: при нескольких воркерах вебхука каждый
+отдает свои, в метках их различает worker. HTTP-эндпоинт - в monitoring.server,
+чтобы импорт метрик из nlq не тянул aiohttp.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Границы бакетов гистограмм задержек, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY: dict[str, "_Metric"] = {}
+_common_labels: dict[str, str] = {}
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{k}="{v}"' for k, v in _common_labels.items()]
+    pairs += [f'{k}="{v}"' for k, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        if name in _REGISTRY:
+            raise ValueError(f"Metric {name} is already registered")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _REGISTRY[name] = self
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines += self._samples()
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+    def snapshot(self) -> dict:
+        return {",".join(key) or "value": value for key, value in sorted(self._values.items())}
+
+
+class Gauge(_Metric):
+    """Значения считываются в момент выгрузки функцией {значения меток: число}."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Callable[[], dict[tuple[str, ...], float]] | None = None
+
+    def set_function(self, function: Callable[[], dict[tuple[str, ...], float]]) -> None:
+        self._function = function
+
+    def _collect(self) -> dict[tuple[str, ...], float]:
+        if self._function is None:
+            return {}
+        try:
+            return self._function()
+        except Exception:
+            logger.warning("Gauge %s collection failed", self.name, exc_info=True)
+            return {}
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._collect().items())
+        ]
+
+    def snapshot(self) -> dict:
+        return {",".join(key) or "value": value for key, value in sorted(self._collect().items())}
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # Последний элемент - бакет +Inf
+            series = self._series[key] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series.total)}")
+            lines.append(f"{self.name}_count{labels} {series.count}")
+        return lines
+
+    def _quantile(self, series: _HistogramSeries, q: float) -> float:
+        """Верхняя граница бакета, в который попадает квантиль."""
+        rank = q * series.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, series.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            ",".join(key) or "value": {
+                "count": series.count,
+                "avg_ms": round(series.total / series.count * 1000, 2),
+                "p50_ms_le": self._quantile(series, 0.5) * 1000,
+                "p95_ms_le": self._quantile(series, 0.95) * 1000,
+            }
+            for key, series in sorted(self._series.items())
+            if series.count
+        }
+
+
+def set_common_labels(**labels: str) -> None:
+    """Метки, добавляемые ко всем сериям (например, номер воркера)."""
+    _common_labels.update({k: str(v) for k, v in labels.items()})
+
+
+def render_text() -> str:
+    lines: list[str] = []
+    for metric in _REGISTRY.values():
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    return {name: metric.snapshot() for name, metric in _REGISTRY.items()}
+
+
+async def metrics_log_loop(interval: float) -> None:
+    """Раз в interval секунд пишет все метрики одной JSON-строкой в лог."""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("metrics %s", json.dumps(snapshot(), ensure_ascii=False, default=str))
+
+
+# Метрики конвейера NLQ
+STAGE_SECONDS = Histogram(
+    "nlq_stage_duration_seconds",
+    "Duration of NLQ pipeline stages (parse, build, db, send)",
+    ("stage",),
+)
+INTENT_PARSES = Counter(
+    "nlq_intent_parse_total",
+    "Intent parses not served from the intent LRU, by source (json, rule_based, invalid_json, failed)",
+    ("source",),
+)
+INTENT_CACHE_LOOKUPS = Counter(
+    "nlq_intent_cache_lookups_total",
+    "Intent LRU lookups by result (hit, miss)",
+    ("result",),
+)
+RESULT_CACHE_LOOKUPS = Counter(
+    "nlq_result_cache_lookups_total",
+    "Result cache lookups by result (hit, miss, error)",
+    ("result",),
+)
+SLOW_QUERIES = Counter(
+    "nlq_slow_queries_total",
+    "DB queries slower than SLOW_QUERY_THRESHOLD_MS",
+)
+COALESCED_CALLS = Counter(
+    "coalesced_calls_total",
+    "Calls that joined an identical call already in flight instead of running their own",
+    ("flight",),
+)
+RATE_LIMITED_UPDATES = Counter(
+    "bot_rate_limited_updates_total",
+    "Updates dropped by the per-chat rate limiter",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connection pool state by engine (main, read) and state (size, checked_in, checked_out, overflow)",
+    ("engine", "state"),
+)
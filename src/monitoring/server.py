@@ -0,0 +1,34 @@
+"""HTTP-эндпоинт /metrics на aiohttp: маршрут в приложении вебхука или отдельный сервер."""
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from aiohttp import web
+
+from monitoring.metrics import render_text
+
+logger = logging.getLogger(__name__)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_text(), content_type="text/plain", charset="utf-8")
+
+
+def add_metrics_route(app: web.Application, path: str) -> None:
+    app.router.add_get(path, metrics_handler)
+
+
+async def serve_metrics(host: str, port: int, path: str) -> None:
+    """Отдельный HTTP-сервер для /metrics (в режиме polling), работает до отмены."""
+    app = web.Application()
+    add_metrics_route(app, path)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info("Metrics listening on %s:%s%s", host, port, path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any
+
+from nlq.schemas import QueryIntent
+from nlq.time_range import UtcDateTimeRange
+
+
+class ResultCacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def clear(self) -> None: ...
+
+
+class InMemoryResultCache(ResultCacheBackend):
+    """LRU с TTL на запись в памяти процесса."""
+
+    def __init__(self, max_entries: int = 1024):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class RedisResultCache(ResultCacheBackend):
+    """Общий кэш для нескольких процессов бота, нужен пакет redis.
+
+    Инвалидация - инкремент поколения, которое входит в ключ: старые записи
+    перестают читаться и доживают свой TTL.
+    """
+
+    def __init__(self, url: str, prefix: str = "nlq:result"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("RESULT_CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._redis = redis_asyncio.from_url(url)
+        self._prefix = prefix
+
+    async def _generation(self) -> int:
+        value = await self._redis.get(f"{self._prefix}:generation")
+        return int(value or 0)
+
+    async def get(self, key: str) -> Any | None:
+        value = await self._redis.get(f"{self._prefix}:{await self._generation()}:{key}")
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._redis.set(
+            f"{self._prefix}:{await self._generation()}:{key}",
+            json.dumps(value),
+            ex=max(1, int(ttl)),
+        )
+
+    async def clear(self) -> None:
+        await self._redis.incr(f"{self._prefix}:generation")
+
+
+def cache_key(intent: QueryIntent, tr: UtcDateTimeRange) -> str:
+    """Канонический ключ: интент без confidence и исходного time_range плюс разрешенный диапазон.
+
+    "вчера" и between на вчерашнюю дату дают один и тот же ключ.
+    """
+    data = intent.model_dump(mode="json", exclude={"confidence", "time_range"})
+    data["range"] = [tr.start.isoformat(), tr.end.isoformat()]
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+def is_closed_range(tr: UtcDateTimeRange, now_utc: datetime | None = None) -> bool:
+    """Диапазон целиком в прошлых сутках: новые снапшоты в него уже не попадут."""
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    if now_utc.tzinfo is not None:
+        now_utc = now_utc.astimezone(timezone.utc).replace(tzinfo=None)
+    today_start = datetime.combine(now_utc.date(), datetime.min.time())
+    end = tr.end if tr.end.tzinfo is None else tr.end.astimezone(timezone.utc).replace(tzinfo=None)
+    return end <= today_start
@@ -0,0 +1,558 @@
+"""Колоночная копия videos и video_snapshots в памяти процесса - бэкенд execute_intent без Postgres.
+
+Видео отсортированы по времени публикации, приросты снапшотов - по времени замера,
+поэтому диапазон интента находится двоичным поиском (searchsorted), а ответ - векторными
+масками и суммами. Время - int64 микросекунды UTC, счетчики - int32, video_id и creator_id
+заменены номерами в словарях. Нужен пакет numpy.
+
+Обновление инкрементальное: видео и снапшоты дочитываются по updated_at (время вставки),
+поэтому дозагрузки с давним created_at (исторический дамп, опоздавший фид) тоже попадают
+в копию. Строки за последние COLUMNAR_REFRESH_OVERLAP_SECONDS перечитываются: updated_at -
+время начала транзакции, и транзакция короче перекрытия не потеряется. Уже загруженные
+снапшоты из перекрытия отсеиваются по id; снапшоты после вставки не меняются.
+
+Копию можно сохранить в файл (save) и после рестарта отобразить его в память без чтения
+(from_file): массивы отображаются как есть, из БД дочитываются только строки новее
+сохраненных отметок updated_at. После дочитывания число строк сверяется с БД: если файл
+не сходится с ней (удаления, переимпорт), копия загружается заново; до конца загрузки
+ответы идут по копии из файла.
+
+Формат файла: _FILE_MAGIC, длина заголовка (uint64 LE), заголовок JSON с отметками
+и смещениями массивов, массивы с выравниванием _FILE_ALIGN.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from nlq.schemas import GroupBy, Measure, Metric, QueryIntent
+from nlq.time_range import UtcDateTimeRange
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+# Нижняя граница для первой загрузки
+_BEGINNING = datetime(1900, 1, 1, tzinfo=timezone.utc)
+_DAY_US = 86_400_000_000
+# 1970-01-01 - четверг, неделя (как date_trunc('week')) начинается с понедельника
+_EPOCH_WEEKDAY = 3
+_FETCH_ROWS = 50_000
+
+_FILE_MAGIC = b"VACOL002"
+_FILE_ALIGN = 64
+# Массивы файла в порядке записи; id - по 16 байт на UUID в порядке номеров
+_FILE_ARRAYS = (
+    "video_ids",
+    "creator_ids",
+    "video_creator",
+    "video_time",
+    "video_counters",
+    "v_time",
+    "v_creator",
+    "v_counters",
+    "s_time",
+    "s_video",
+    "s_deltas",
+    "recent_snapshots",
+)
+
+# Порядок счетчиков в массивах: (4, n) для видео и для приростов
+_METRIC_ROW = {
+    Metric.views: 0,
+    Metric.likes: 1,
+    Metric.comments: 2,
+    Metric.reports: 3,
+}
+
+_VIDEOS_COLUMNS_SQL = (
+    "SELECT id, creator_id, (extract(epoch FROM video_created_at) * 1000000)::bigint, "
+    "views_count, likes_count, comments_count, reports_count, updated_at FROM videos"
+)
+_VIDEOS_SQL = f"{_VIDEOS_COLUMNS_SQL} WHERE updated_at >= :since"
+# Видео снапшотов, которых нет в копии: транзакция, записавшая видео, шла дольше перекрытия
+_VIDEOS_BY_ID_SQL = f"{_VIDEOS_COLUMNS_SQL} WHERE id = ANY(:ids)"
+
+_COUNTS_SQL = "SELECT (SELECT count(*) FROM videos), (SELECT count(*) FROM video_snapshots)"
+
+_SNAPSHOTS_SQL = (
+    "SELECT id, video_id, (extract(epoch FROM created_at) * 1000000)::bigint, "
+    "delta_views_count, delta_likes_count, delta_comments_count, delta_reports_count, updated_at "
+    "FROM video_snapshots WHERE updated_at >= :since"
+)
+
+
+def _micros(value: datetime) -> int:
+    """Микросекунды от эпохи; наивное время считается UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _uuid_array(ids) -> "np.ndarray":
+    """UUID как массив V16: для np.isin без объектов Python."""
+    return np.frombuffer(b"".join(value.bytes for value in ids), "V16")
+
+
+def _day_label(day: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=int(day))).isoformat()
+
+
+def _group(keys, values=None, distinct=None):
+    """Уникальные ключи и по ним: сумма values, число разных distinct или число строк."""
+    if not keys.size:
+        return keys, np.zeros(0, np.int64)
+    if distinct is not None:
+        width = int(distinct.max()) + 1
+        pairs = np.unique(keys.astype(np.int64) * width + distinct)
+        return np.unique(pairs // width, return_counts=True)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    if values is None:
+        counts = np.diff(np.r_[starts, sorted_keys.size])
+        return sorted_keys[starts], counts
+    return sorted_keys[starts], np.add.reduceat(values[order].astype(np.int64), starts)
+
+
+class ColumnarStore:
+    def __init__(self, overlap_seconds: float = 3 * 3600):
+        if np is None:
+            raise RuntimeError("COLUMNAR_BACKEND requires the 'numpy' package")
+        self._overlap = timedelta(seconds=overlap_seconds)
+        self._lock = asyncio.Lock()
+        self.ready = False
+        # Копия из файла сверяется с БД при первом дочитывании
+        self._verify_counts = False
+        self._clear()
+
+    def _clear(self) -> None:
+        # Номера видео; после from_file словарь строится при первом дочитывании
+        self._video_codes: dict[uuid.UUID, int] | None = {}
+        self._video_ids_file = None
+        self._creator_codes: dict[uuid.UUID, int] = {}
+        self._creators: list[uuid.UUID] = []
+        self._videos_seen_at: datetime | None = None
+        # now() транзакции последнего дочитывания снапшотов и id снапшотов,
+        # которые следующее дочитывание прочитает повторно
+        self._snapshots_seen_at: datetime | None = None
+        self._recent_snapshots = np.zeros(0, "V16")
+
+        # По номеру видео - в порядке появления
+        self._video_creator = np.zeros(0, np.int32)
+        self._video_time = np.zeros(0, np.int64)
+        self._video_counters = np.zeros((4, 0), np.int32)
+
+        # Видео по времени публикации
+        self._v_time = np.zeros(0, np.int64)
+        self._v_creator = np.zeros(0, np.int32)
+        self._v_counters = np.zeros((4, 0), np.int32)
+
+        # Приросты снапшотов по времени замера
+        self._s_time = np.zeros(0, np.int64)
+        self._s_video = np.zeros(0, np.int32)
+        self._s_deltas = np.zeros((4, 0), np.int32)
+
+    @property
+    def snapshots_count(self) -> int:
+        return int(self._s_time.size)
+
+    @property
+    def videos_count(self) -> int:
+        return int(self._v_time.size)
+
+    def _video_index(self) -> dict[uuid.UUID, int]:
+        if self._video_codes is None:
+            raw = self._video_ids_file.tobytes()
+            self._video_codes = {uuid.UUID(bytes=raw[i:i + 16]): code for code, i in enumerate(range(0, len(raw), 16))}
+            self._video_ids_file = None
+        return self._video_codes
+
+    def _code(self, codes: dict, value, values: list | None = None) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            if values is not None:
+                values.append(value)
+        return code
+
+    async def refresh(self, session: AsyncSession) -> None:
+        """Дочитать изменения из БД; videos и снапшоты читаются из одного снимка данных.
+
+        Изменения собираются в отдельной копии состояния, пока ответы идут по старым
+        массивам, и подменяют их разом, без await между таблицами: ответ не увидит новые
+        видео без их снапшотов или наполовину перезагруженную копию.
+
+        Если дочитывание не удалось, копия сбрасывается (ready = False, ответы идут из
+        Postgres) и следующий вызов загружает ее заново.
+        """
+        async with self._lock:
+            staged = self._staged()
+            try:
+                await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                await staged._refresh_videos(session)
+                await staged._refresh_snapshots(session)
+                if staged._verify_counts:
+                    await staged._reload_if_diverged(session)
+                await session.commit()
+            except BaseException:
+                self.ready = False
+                self._clear()
+                raise
+            vars(self).update(vars(staged))
+            self.ready = True
+
+    def _staged(self) -> "ColumnarStore":
+        """Копия состояния для дочитывания, массивы общие с текущим.
+
+        Дочитывание не меняет массивы на месте, а заменяет их новыми. Словари номеров
+        и список креаторов только растут, а ответ ищет в них лишь то, что есть в массивах,
+        поэтому их можно не копировать.
+        """
+        staged = object.__new__(type(self))
+        vars(staged).update(vars(self))
+        return staged
+
+    async def _reload_if_diverged(self, session: AsyncSession) -> None:
+        # Вызывается на копии состояния из refresh: _clear не трогает массивы, по которым
+        # идут ответы, и готовая копия ни на момент не остается пустой
+        videos, snapshots = (await session.execute(text(_COUNTS_SQL))).one()
+        self._verify_counts = False
+        if (videos, snapshots) == (self.videos_count, self.snapshots_count):
+            return
+        logger.warning(
+            "Columnar store file has %d videos and %d snapshots, the database %d and %d; reloading",
+            self.videos_count,
+            self.snapshots_count,
+            videos,
+            snapshots,
+        )
+        self._clear()
+        await self._refresh_videos(session)
+        await self._refresh_snapshots(session)
+
+    async def _refresh_videos(self, session: AsyncSession) -> None:
+        since = _BEGINNING if self._videos_seen_at is None else self._videos_seen_at - self._overlap
+        result = await session.stream(
+            text(_VIDEOS_SQL), {"since": since}, execution_options={"yield_per": _FETCH_ROWS}
+        )
+        changed = False
+        async for rows in result.partitions():
+            self._apply_videos(rows)
+            changed = True
+        if changed:
+            self._sort_videos()
+
+    async def _load_videos(self, session: AsyncSession, video_ids: set[uuid.UUID]) -> None:
+        rows = (await session.execute(text(_VIDEOS_BY_ID_SQL), {"ids": list(video_ids)})).all()
+        logger.warning("Columnar store: %d videos were missed by updated_at, loaded by id", len(rows))
+        if rows:
+            self._apply_videos(rows)
+            self._sort_videos()
+
+    def _apply_videos(self, rows) -> None:
+        video_codes = self._video_index()
+        codes = np.fromiter((self._code(video_codes, row[0]) for row in rows), np.int64, len(rows))
+        creators = np.fromiter(
+            (self._code(self._creator_codes, row[1], self._creators) for row in rows), np.int32, len(rows)
+        )
+        columns = np.array([row[2:7] for row in rows], dtype=np.int64).T
+        # Новые массивы вместо записи на месте: старые могут еще читаться ответами
+        grow = len(video_codes) - self._video_creator.size
+        self._video_creator = np.concatenate([self._video_creator, np.zeros(grow, np.int32)])
+        self._video_time = np.concatenate([self._video_time, np.zeros(grow, np.int64)])
+        self._video_counters = np.concatenate([self._video_counters, np.zeros((4, grow), np.int32)], axis=1)
+        self._video_creator[codes] = creators
+        self._video_time[codes] = columns[0]
+        self._video_counters[:, codes] = columns[1:]
+        seen_at = max(row[7] for row in rows)
+        if self._videos_seen_at is None or seen_at > self._videos_seen_at:
+            self._videos_seen_at = seen_at
+
+    def _sort_videos(self) -> None:
+        order = np.argsort(self._video_time, kind="stable")
+        self._v_time = self._video_time[order]
+        self._v_creator = self._video_creator[order]
+        self._v_counters = self._video_counters[:, order]
+
+    async def _refresh_snapshots(self, session: AsyncSession) -> None:
+        seen_at = (await session.execute(text("SELECT now()"))).scalar_one()
+        since = _BEGINNING if self._snapshots_seen_at is None else self._snapshots_seen_at - self._overlap
+        recent_since = seen_at - self._overlap
+        result = await session.stream(
+            text(_SNAPSHOTS_SQL),
+            {"since": since},
+            execution_options={"yield_per": _FETCH_ROWS},
+        )
+        video_codes = self._video_index()
+        times, videos, deltas, recent = [], [], [], []
+        # (номер пачки, позиции, video_id) снапшотов, чьих видео нет в копии
+        unknown = []
+        async for rows in result.partitions():
+            ids = _uuid_array(row[0] for row in rows)
+            recent.append(ids[np.fromiter((row[7] >= recent_since for row in rows), bool, len(rows))])
+            fresh = ~np.isin(ids, self._recent_snapshots)
+            if not fresh.any():
+                continue
+            rows = [row for row, keep in zip(rows, fresh) if keep]
+            codes = np.fromiter((video_codes.get(row[1], -1) for row in rows), np.int32, len(rows))
+            missing = np.flatnonzero(codes < 0)
+            if missing.size:
+                unknown.append((len(videos), missing, [rows[i][1] for i in missing]))
+            videos.append(codes)
+            columns = np.array([row[2:7] for row in rows], dtype=np.int64).T
+            times.append(columns[0])
+            deltas.append(columns[1:].astype(np.int32))
+
+        if unknown:
+            await self._load_videos(session, {video_id for _, _, ids in unknown for video_id in ids})
+            video_codes = self._video_index()
+            for part, positions, ids in unknown:
+                videos[part][positions] = [video_codes[video_id] for video_id in ids]
+
+        self._snapshots_seen_at = seen_at
+        self._recent_snapshots = np.concatenate(recent) if recent else np.zeros(0, "V16")
+        if not times:
+            return
+        new_time = np.concatenate(times)
+        order = np.argsort(new_time, kind="stable")
+        new_time = new_time[order]
+        new_video = np.concatenate(videos)[order]
+        new_deltas = np.concatenate(deltas, axis=1)[:, order]
+        if self._s_time.size and new_time[0] < self._s_time[-1]:
+            # Дозагрузка в прошлое: вставка на свои места по времени замера
+            at = np.searchsorted(self._s_time, new_time, side="right")
+            self._s_time = np.insert(self._s_time, at, new_time)
+            self._s_video = np.insert(self._s_video, at, new_video)
+            self._s_deltas = np.insert(self._s_deltas, at, new_deltas, axis=1)
+        else:
+            self._s_time = np.concatenate([self._s_time, new_time])
+            self._s_video = np.concatenate([self._s_video, new_video])
+            self._s_deltas = np.concatenate([self._s_deltas, new_deltas], axis=1)
+
+    async def save(self, path: str) -> None:
+        """Записать копию в файл: рядом во временный, затем атомарная замена."""
+        async with self._lock:
+            if not self.ready:
+                return
+            video_ids = (
+                np.frombuffer(b"".join(video_id.bytes for video_id in self._video_codes), np.uint8)
+                if self._video_codes is not None
+                else self._video_ids_file
+            )
+            arrays = {
+                "video_ids": video_ids.reshape(-1, 16),
+                "creator_ids": np.frombuffer(b"".join(c.bytes for c in self._creators), np.uint8).reshape(-1, 16),
+                "video_creator": self._video_creator,
+                "video_time": self._video_time,
+                "video_counters": self._video_counters,
+                "v_time": self._v_time,
+                "v_creator": self._v_creator,
+                "v_counters": self._v_counters,
+                "s_time": self._s_time,
+                "s_video": self._s_video,
+                "s_deltas": self._s_deltas,
+                "recent_snapshots": self._recent_snapshots.view(np.uint8).reshape(-1, 16),
+            }
+            meta = {
+                "videos_seen_at": _isoformat(self._videos_seen_at),
+                "snapshots_seen_at": _isoformat(self._snapshots_seen_at),
+            }
+            # Запись больших массивов не должна останавливать ответы бота
+            await asyncio.to_thread(_write_file, path, arrays, meta)
+
+    @classmethod
+    def from_file(cls, path: str, overlap_seconds: float = 3 * 3600) -> "ColumnarStore":
+        """Копия из файла save, готовая отвечать сразу: массивы отображаются в память без чтения.
+
+        Отображение copy-on-write: дочитывание меняет страницы в памяти процесса, не файл.
+        """
+        store = cls(overlap_seconds)
+        header, arrays = _map_file(path)
+        store._video_codes = None
+        store._video_ids_file = arrays["video_ids"]
+        raw = arrays["creator_ids"].tobytes()
+        store._creators = [uuid.UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16)]
+        store._creator_codes = {creator: code for code, creator in enumerate(store._creators)}
+        for name in _FILE_ARRAYS[2:-1]:
+            setattr(store, f"_{name}", arrays[name])
+        store._recent_snapshots = np.ascontiguousarray(arrays["recent_snapshots"]).view("V16").reshape(-1)
+        if header["videos_seen_at"] is not None:
+            store._videos_seen_at = datetime.fromisoformat(header["videos_seen_at"])
+        if header["snapshots_seen_at"] is not None:
+            store._snapshots_seen_at = datetime.fromisoformat(header["snapshots_seen_at"])
+        store._verify_counts = True
+        store.ready = True
+        return store
+
+    def answer(self, intent: QueryIntent, tr: UtcDateTimeRange, row_limit: int | None = None) -> int | dict:
+        """Ответ в формате IntentResult.value: число, {Metric.value: число} или
+        {"rows": [[bucket, число], ...], "truncated": bool} не больше row_limit строк."""
+        metrics = intent.all_metrics
+        if intent.measure == Measure.delta_sum and Metric.videos in metrics:
+            raise ValueError("delta_sum is not supported for metric=videos")
+        filters = intent.filters
+        final = intent.measure == Measure.final
+
+        times = self._v_time if final else self._s_time
+        lo, hi = np.searchsorted(times, [_micros(tr.start), _micros(tr.end)], side="left")
+        window = slice(int(lo), int(hi))
+        if final:
+            creators = self._v_creator[window]
+            counters = self._v_counters[:, window]
+            video_ids = None
+        else:
+            video_ids = self._s_video[window]
+            creators = self._video_creator[video_ids]
+            counters = self._s_deltas[:, window]
+
+        mask = None
+        if filters.creator_id:
+            creator = self._creator_codes.get(uuid.UUID(filters.creator_id), -1)
+            mask = creators == creator
+        if final and filters.min_views is not None:
+            views = counters[_METRIC_ROW[Metric.views]] >= filters.min_views
+            mask = views if mask is None else mask & views
+
+        def take(column):
+            return column if mask is None else column[mask]
+
+        if intent.group_by is not None:
+            return self._grouped(intent, take, times[window], creators, counters, video_ids, row_limit)
+
+        values = {}
+        for metric in metrics:
+            if metric == Metric.videos:
+                # В videos id уникален, в снапшотах - считаются разные видео
+                if final:
+                    values[metric] = int(hi - lo) if mask is None else int(np.count_nonzero(mask))
+                else:
+                    values[metric] = int(np.unique(take(video_ids)).size)
+            elif filters.unique_videos and not final:
+                values[metric] = int(np.unique(take(video_ids)).size)
+            else:
+                values[metric] = int(take(counters[_METRIC_ROW[metric]]).sum(dtype=np.int64))
+        if intent.metrics:
+            return {metric.value: value for metric, value in values.items()}
+        return values[intent.metric]
+
+    def _grouped(self, intent, take, times, creators, counters, video_ids, row_limit) -> dict:
+        if intent.group_by == GroupBy.creator:
+            keys = take(creators)
+        else:
+            keys = take(times) // _DAY_US
+            if intent.group_by == GroupBy.week:
+                keys = keys - (keys + _EPOCH_WEEKDAY) % 7
+
+        final = intent.measure == Measure.final
+        if intent.metric == Metric.videos and final:
+            buckets, values = _group(keys)
+        elif intent.filters.unique_videos and not final:
+            buckets, values = _group(keys, distinct=take(video_ids))
+        else:
+            buckets, values = _group(keys, values=take(counters[_METRIC_ROW[intent.metric]]))
+
+        if intent.group_by == GroupBy.creator:
+            rows = sorted(
+                ([str(self._creators[bucket]), int(value)] for bucket, value in zip(buckets, values)),
+                key=lambda row: (-row[1], row[0]),
+            )
+        else:
+            rows = [[_day_label(bucket), int(value)] for bucket, value in zip(buckets, values)]
+        truncated = row_limit is not None and len(rows) > row_limit
+        return {"rows": rows[:row_limit] if truncated else rows, "truncated": truncated}
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return value.isoformat() if value is not None else None
+
+
+def _write_file(path: str, arrays: dict, meta: dict) -> None:
+    layout = {}
+    offset = 0
+    for name in _FILE_ARRAYS:
+        array = arrays[name]
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // _FILE_ALIGN) * _FILE_ALIGN
+    header = json.dumps({**meta, "arrays": layout}).encode()
+    data_start = -(-(len(_FILE_MAGIC) + 8 + len(header)) // _FILE_ALIGN) * _FILE_ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_FILE_MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name in _FILE_ARRAYS:
+            f.seek(data_start + layout[name]["offset"])
+            np.ascontiguousarray(arrays[name]).tofile(f)
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _map_file(path: str) -> tuple[dict, dict]:
+    with open(path, "rb") as f:
+        if f.read(len(_FILE_MAGIC)) != _FILE_MAGIC:
+            raise ValueError(f"{path} is not a columnar store file")
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    data_start = -(-(len(_FILE_MAGIC) + 8 + header_size) // _FILE_ALIGN) * _FILE_ALIGN
+    arrays = {}
+    for name in _FILE_ARRAYS:
+        spec = header["arrays"][name]
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            # Пустой массив отобразить нельзя
+            arrays[name] = np.zeros(shape, np.dtype(spec["dtype"]))
+            continue
+        arrays[name] = np.memmap(
+            path, dtype=np.dtype(spec["dtype"]), mode="c", offset=data_start + spec["offset"], shape=shape
+        )
+    return header, arrays
+
+
+async def refresh_store(store: ColumnarStore, session_maker: Callable[[], AsyncSession]) -> None:
+    started_at = asyncio.get_running_loop().time()
+    async with session_maker() as session:
+        await store.refresh(session)
+    logger.info(
+        "Columnar store refreshed in %.2f s: %d videos, %d snapshots",
+        asyncio.get_running_loop().time() - started_at,
+        store.videos_count,
+        store.snapshots_count,
+    )
+
+
+async def columnar_refresh_loop(refresh: Callable[[], Awaitable[None]], interval: float) -> None:
+    """Фоновая задача: первая загрузка сразу, дальше дочитывание раз в interval секунд."""
+    while True:
+        try:
+            await refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Columnar store refresh failed")
+        await asyncio.sleep(interval)
+
+
+async def columnar_save_loop(save: Callable[[], Awaitable[None]], interval: float) -> None:
+    """Фоновая задача: сохранение копии раз в interval секунд."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await save()
+        except Exception:
+            logger.exception("Columnar store save failed")
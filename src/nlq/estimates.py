@@ -0,0 +1,78 @@
+"""Оценки числа строк по таблицам - для выбора между точным и приближенным запросом.
+
+Строки берутся из статистики планировщика (pg_class.reltuples), границы - min/max
+колонки времени по индексу; доля диапазона запроса считается равномерной.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass(frozen=True)
+class TableEstimate:
+    rows: int
+    # Границы колонки времени, naive UTC; None - таблица пуста
+    first: datetime | None
+    last: datetime | None
+
+
+# Таблица -> колонка, по которой запросы режут диапазон
+_TIME_COLUMNS = {
+    "videos": "video_created_at",
+    "video_snapshots": "created_at",
+    "video_daily_stats": "day",
+}
+
+_estimates: dict[str, TableEstimate] = {}
+_refreshed_at: float | None = None
+
+
+def _naive_utc(value: date | datetime | None, end: bool = False) -> datetime | None:
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        # День покрывает сутки целиком
+        return datetime.combine(value, datetime.min.time()) + (timedelta(days=1) if end else timedelta())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def refresh_row_estimates(session: AsyncSession, max_age: float = 0) -> None:
+    """Перечитать оценки, если они старше max_age секунд."""
+    global _refreshed_at
+    if _refreshed_at is not None and time.monotonic() - _refreshed_at < max_age:
+        return
+    for table, column in _TIME_COLUMNS.items():
+        # У секционированной таблицы строки лежат в секциях; reltuples = -1 - не анализировалась
+        rows = (await session.execute(
+            text(
+                "SELECT coalesce(sum(greatest(c.reltuples, 0)), 0)::bigint FROM pg_class c "
+                "WHERE (c.oid = to_regclass(:table) AND c.relkind = 'r') "
+                "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table))"
+            ),
+            {"table": table},
+        )).scalar_one()
+        first, last = (await session.execute(text(f"SELECT min({column}), max({column}) FROM {table}"))).one()
+        _estimates[table] = TableEstimate(rows, _naive_utc(first), _naive_utc(last, end=True))
+    _refreshed_at = time.monotonic()
+
+
+def estimated_rows(table: str, start: date | datetime, end: date | datetime) -> int | None:
+    """Оценка строк table в [start, end), None - оценок еще нет."""
+    estimate = _estimates.get(table)
+    if estimate is None:
+        return None
+    if estimate.first is None or not estimate.rows:
+        return 0
+    start, end = _naive_utc(start), _naive_utc(end)
+    span = (estimate.last - estimate.first).total_seconds()
+    overlap = (min(end, estimate.last) - max(start, estimate.first)).total_seconds()
+    if span <= 0:
+        return estimate.rows if start <= estimate.first < end else 0
+    return int(estimate.rows * min(max(overlap / span, 0.0), 1.0))
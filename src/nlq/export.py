@@ -0,0 +1,114 @@
+"""Выгрузка строк под интент в CSV или Parquet без материализации результата.
+
+Строки читаются серверным курсором (session.stream) пачками по chunk_rows и сразу
+дописываются в файл: в памяти одновременно не больше одной пачки.
+"""
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from nlq.schemas import ExportFormat, QueryIntent
+from nlq.sql_builder import build_export_statement
+from nlq.time_range import to_utc_datetime_range
+
+
+@dataclass
+class ExportResult:
+    rows: int
+    # Остановились на max_rows, в БД есть еще строки
+    truncated: bool
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: list[str]):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Пачка - одна row group; схема берется из первой пачки."""
+
+    def __init__(self, path: str, columns: list[str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package") from e
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._columns = columns
+        self._writer = None
+
+    def write(self, rows) -> None:
+        data = {
+            column: [str(value) if column.endswith("_id") else value for value in values]
+            for column, values in zip(self._columns, zip(*rows))
+        }
+        table = self._pa.Table.from_pydict(data)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is None:
+            # Пустая выгрузка - файл без строк, но со столбцами
+            self._pq.write_table(self._pa.table({column: [] for column in self._columns}), self._path)
+        else:
+            self._writer.close()
+
+
+_WRITERS = {
+    ExportFormat.csv: _CsvWriter,
+    ExportFormat.parquet: _ParquetWriter,
+}
+
+
+async def export_intent(
+    session: AsyncSession,
+    intent: QueryIntent,
+    path: str,
+    chunk_rows: int = 10_000,
+    max_rows: int | None = None,
+    statement_timeout_ms: int | None = None,
+) -> ExportResult:
+    """Записать строки build_export_statement в path в формате intent.export (по умолчанию CSV)."""
+    q, params = build_export_statement(intent, to_utc_datetime_range(intent.time_range))
+    if statement_timeout_ms is not None:
+        # Выгрузка дольше обычного запроса бота: таймаут только на эту транзакцию
+        await session.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": str(statement_timeout_ms)},
+        )
+
+    written = 0
+    truncated = False
+    result = await session.stream(q, params, execution_options={"yield_per": chunk_rows})
+    writer = _WRITERS[intent.export or ExportFormat.csv](path, list(result.keys()))
+    try:
+        async for rows in result.partitions():
+            if max_rows is not None and written + len(rows) > max_rows:
+                rows = rows[: max_rows - written]
+                truncated = True
+            if rows:
+                writer.write(rows)
+                written += len(rows)
+            if truncated:
+                break
+    finally:
+        await result.close()
+        writer.close()
+    return ExportResult(rows=written, truncated=truncated)
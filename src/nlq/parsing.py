@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+from pydantic import ValidationError
+
+from config.settings import settings
+from monitoring.metrics import INTENT_CACHE_LOOKUPS, INTENT_PARSES
+from nlq.rule_based_intent import parse_intent_rule_based
+from nlq.schemas import QueryIntent
+
+
+def normalize_text(text: str) -> str:
+    # Регистр не трогаем: JSON-intent чувствителен к нему
+    return " ".join(text.split())
+
+
+def _looks_like_json(text: str) -> bool:
+    return text.startswith("{") and text.endswith("}")
+
+
+def _parse_uncached(text: str) -> QueryIntent:
+    if _looks_like_json(text):
+        try:
+            intent = QueryIntent.model_validate_json(text)
+        except ValidationError:
+            INTENT_PARSES.inc(source="invalid_json")
+        else:
+            INTENT_PARSES.inc(source="json")
+            return intent
+    try:
+        intent = parse_intent_rule_based(text)
+    except ValueError:
+        INTENT_PARSES.inc(source="failed")
+        raise
+    INTENT_PARSES.inc(source="rule_based")
+    return intent
+
+
+# LRU создается при первом разборе: размер берется из настроек, которые при импорте не читаются
+_parse_cached = None
+
+
+def _parse_normalized(text: str) -> QueryIntent:
+    global _parse_cached
+    if _parse_cached is None:
+        _parse_cached = lru_cache(maxsize=settings.INTENT_CACHE_MAX_ENTRIES)(_parse_uncached)
+    misses = _parse_cached.cache_info().misses
+    try:
+        return _parse_cached(text)
+    finally:
+        # Неразобранный текст - тоже промах: lru_cache считает его, но не запоминает
+        INTENT_CACHE_LOOKUPS.inc(result="miss" if _parse_cached.cache_info().misses > misses else "hit")
+
+
+def parse_intent(text: str) -> QueryIntent:
+    """Интент из JSON или текста на естественном языке, с LRU по нормализованному тексту.
+
+    Возвращается общий для одинаковых сообщений объект - менять его нельзя.
+    Неразобранные сообщения не кэшируются (ValueError пробрасывается).
+    """
+    return _parse_normalized(normalize_text(text))
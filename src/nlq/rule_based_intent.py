@@ -3,89 +3,201 @@ from __future__ import annotations
 import re
 from datetime import date
 
-from nlq.schemas import Filters, Measure, Metric, QueryIntent, TimeRange, TimeRangeType
-
-
-_UUID_RE = re.compile(
-    r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+from nlq.schemas import ExportFormat, Filters, GroupBy, Measure, Metric, QueryIntent, TimeRange, TimeRangeType
+
+
+_MONTHS = "января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря"
+
+# Ключевые слова ищутся как подстроки текста в нижнем регистре
+_KEYWORD_GROUPS = {
+    "all_time": ("за всё время", "за все время", "в системе", "all time", "all-time"),
+    "today": ("сегодня", "today"),
+    "yesterday": ("вчера", "yesterday"),
+    "last_week": ("за неделю", "за последнюю неделю"),
+    "last_month": ("за месяц", "за последний месяц"),
+    GroupBy.day: ("по дням", "by day", "per day", "daily"),
+    GroupBy.week: ("по неделям", "by week", "per week", "weekly"),
+    GroupBy.creator: ("по креаторам", "по авторам", "by creator", "per creator"),
+    ExportFormat.csv: ("выгрузи", "выгрузк", "экспорт", "export", "csv"),
+    ExportFormat.parquet: ("parquet",),
+    "approximate": ("примерно", "приблизительно", "approx", "roughly"),
+    "delta": ("прирост", "увелич", "рост", "delta", "на сколько"),
+    Metric.views: ("просмотр", "views"),
+    Metric.likes: ("лайк", "likes"),
+    Metric.comments: ("коммент", "comments"),
+    Metric.reports: ("репорт", "жалоб", "reports"),
+    Metric.videos: ("видео", "ролик", "видос"),
+}
+
+_KEYWORDS = {word: kind for kind, words in _KEYWORD_GROUPS.items() for word in words}
+
+_PERIOD_DAYS = {"last_week": 7, "last_month": 30}
+
+
+def _keyword_pattern(words) -> str:
+    """Альтернатива слов в виде префиксного дерева: на каждой позиции проверяется одна ветка."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in node.items() if ch]
+        if not branches:
+            return ""
+        is_word_end = "" in node
+        body = branches[0] if len(branches) == 1 and not is_word_end else "(?:" + "|".join(branches) + ")"
+        return body + ("?" if is_word_end else "")
+
+    return emit(trie)
+
+
+def _first_chars(*alternatives: str) -> str:
+    return "[" + re.escape("".join(sorted(set("".join(alternatives))))) + "]"
+
+
+# Слова, с которых начинаются структурные токены
+_MORE_THAN_WORDS = ("больше", "более", "свыше")
+_UNIQUE_WORDS = ("разных", "различных", "уникальных")
+_LAST_WORDS = ("last", "за")
+_TOP_WORDS = ("топ", "top")
+
+# Все, что ищется в тексте, - одна регулярка по тексту в нижнем регистре:
+# сообщение сканируется один раз, тип совпадения - имя внешней группы (lastgroup).
+# Структурные токены стоят раньше ключевых слов, чтобы "больше 100 просмотров"
+# и "разных видео" разбирались целиком. Lookahead по первым символам токенов
+# отсекает позиции, с которых ничего не начинается.
+_STRUCTURED_WORD_FIRST_CHARS = "".join(
+    w[0] for w in (">", *_MORE_THAN_WORDS, *_UNIQUE_WORDS, *_LAST_WORDS, *_TOP_WORDS)
+)
+_TOKEN_RE = re.compile(
+    rf"(?={_first_chars('0123456789abcdef', _STRUCTURED_WORD_FIRST_CHARS, *(w[0] for w in _KEYWORDS))})(?:"
+    r"(?=[0-9a-f])(?:"
+    r"(?P<uuid>\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b)"
+    r"|(?P<date_iso>\b(?P<iso_y>\d{4})-(?P<iso_m>\d{2})-(?P<iso_d>\d{2})\b)"
+    r"|(?P<date_dmy>\b(?P<dmy_d>\d{1,2})\.(?P<dmy_m>\d{1,2})\.(?P<dmy_y>\d{4})\b)"
+    rf"|(?P<date_ru>\b(?P<ru_d>\d{{1,2}})\s+(?P<ru_month>{_MONTHS})\s+(?P<ru_y>\d{{4}})\b)"
+    r")"
+    rf"|(?={_first_chars(_STRUCTURED_WORD_FIRST_CHARS)})(?:"
+    rf"(?P<min_views>(?:\b(?:{'|'.join(_MORE_THAN_WORDS)})|>)\s*(?P<min_views_n>\d{{1,9}})\s*(?:просмотров|просмотра|просмотр|views)\b)"
+    rf"|(?P<unique_videos>\b(?:{'|'.join(_UNIQUE_WORDS)})\s+(?:видео|видеоролик|видеороликов|ролик|роликов)\b)"
+    rf"|(?P<last_n_days>(?:{'|'.join(_LAST_WORDS)})\s+(?P<last_n>\d{{1,4}})\s*(?:days|дн(?:ей|я)?))"
+    rf"|(?P<top_n>\b(?:{'|'.join(_TOP_WORDS)})(?:[\s-]*(?P<top_n_value>\d{{1,3}}))?(?![^\W\d]))"
+    r")"
+    rf"|(?P<keyword>{_keyword_pattern(_KEYWORDS)})"
+    r")"
 )
 
-_DATE_ISO_RE = re.compile(r"\b(?P<y>\d{4})-(?P<m>\d{2})-(?P<d>\d{2})\b")
-_DATE_DMY_RE = re.compile(r"\b(?P<d>\d{1,2})\.(?P<m>\d{1,2})\.(?P<y>\d{4})\b")
-_LAST_N_DAYS_RE = re.compile(r"(?:last|за)\s+(?P<n>\d{1,4})\s*(?:days|дн(?:ей|я)?)", re.IGNORECASE)
-_RUSSIAN_MONTH_DATE_RE = re.compile(r"\b(?P<d>\d{1,2})\s+(?P<month>января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)\s+(?P<y>\d{4})\b", re.IGNORECASE)
-_MORE_THAN_VIEWS_RE = re.compile(r"\b(?:больше|более|свыше|>\s*)\s*(?P<n>\d{1,9})\s*(?:просмотров|просмотра|просмотр|views)\b", re.IGNORECASE)
-_UNIQUE_VIDEOS_RE = re.compile(r"\b(?:разных|различных|уникальных)\s+(?:видео|видеоролик|видеороликов|ролик|роликов)\b", re.IGNORECASE)
+_MONTH_MAP = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4,
+    "мая": 5, "июня": 6, "июля": 7, "августа": 8,
+    "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
+}
 
+# Приоритет метрик, если в тексте упомянуто несколько
+_METRIC_PRIORITY = (Metric.views, Metric.likes, Metric.comments, Metric.reports, Metric.videos)
 
-def _parse_date(token: str) -> date | None:
-    m = _DATE_ISO_RE.search(token)
-    if m:
-        return date(int(m.group("y")), int(m.group("m")), int(m.group("d")))
+_DATE_TOKENS = ("date_iso", "date_dmy", "date_ru")
 
-    m = _DATE_DMY_RE.search(token)
-    if m:
-        return date(int(m.group("y")), int(m.group("m")), int(m.group("d")))
 
-    m = _RUSSIAN_MONTH_DATE_RE.search(token)
-    if m:
-        month_map = {
-            "января": 1, "февраля": 2, "марта": 3, "апреля": 4,
-            "мая": 5, "июня": 6, "июля": 7, "августа": 8,
-            "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
-        }
-        return date(int(m.group("y")), month_map[m.group("month").lower()], int(m.group("d")))
+def _token_date(m: re.Match) -> date:
+    kind = m.lastgroup
+    if kind == "date_iso":
+        return date(int(m.group("iso_y")), int(m.group("iso_m")), int(m.group("iso_d")))
+    if kind == "date_dmy":
+        return date(int(m.group("dmy_y")), int(m.group("dmy_m")), int(m.group("dmy_d")))
+    return date(int(m.group("ru_y")), _MONTH_MAP[m.group("ru_month")], int(m.group("ru_d")))
 
-    return None
+
+def _between_range(date_tokens: list[re.Match]) -> TimeRange:
+    if len(date_tokens) >= 2:
+        start, end = _token_date(date_tokens[0]), _token_date(date_tokens[1])
+        return TimeRange(type=TimeRangeType.between, **{"from": start}, to=end)
+    d = _token_date(date_tokens[0])
+    return TimeRange(type=TimeRangeType.between, **{"from": d}, to=d)
 
 
 def parse_intent_rule_based(user_text: str) -> QueryIntent:
     text = user_text.strip()
     low = text.lower()
-
-    metric: Metric | None = None
-    video_keywords = [
-        "видео",
-        "видеоролик",
-        "видеороликов",
-        "ролик",
-        "ролика",
-        "роликов",
-        "видос",
-        "видосик",
-        "видеозапись",
-        "видеозаписей",
-    ]
-
-    if any(k in low for k in ["просмотр", "просмотры", "просмотров", "views"]):
-        metric = Metric.views
-    elif any(k in low for k in ["лайк", "лайки", "лайков", "likes"]):
-        metric = Metric.likes
-    elif any(k in low for k in ["коммент", "комменты", "комментар", "comments"]):
-        metric = Metric.comments
-    elif any(k in low for k in ["репорт", "репорты", "жалоб", "жалобы", "reports"]):
-        metric = Metric.reports
-    elif any(k in low for k in video_keywords):
-        metric = Metric.videos
-
-    if metric is None:
-        raise ValueError("Unsupported metric")
-
+    # creator_id берется из исходного текста, если lower() не поменял длину
+    same_offsets = len(low) == len(text)
+
+    metrics: set[Metric] = set()
+    # Метрики, названные словами, в порядке упоминания: "просмотры, лайки и комментарии"
+    named_metrics: list[Metric] = []
+    period_days = None
+    group_by = None
+    limit = None
     measure = Measure.final
-    if any(k in low for k in ["прирост", "увелич", "рост", "delta", "на сколько"]):
-        measure = Measure.delta_sum
-
     creator_id = None
-    m_uuid = _UUID_RE.search(text)
-    if m_uuid:
-        creator_id = m_uuid.group(0)
-
     min_views = None
-    m_views = _MORE_THAN_VIEWS_RE.search(text)
-    if m_views:
-        min_views = int(m_views.group("n"))
-
-    unique_videos = bool(_UNIQUE_VIDEOS_RE.search(text))
+    unique_videos = False
+    approximate = False
+    export = None
+    last_n = None
+    all_time = today = yesterday = False
+    date_tokens: list[re.Match] = []
+
+    for m in _TOKEN_RE.finditer(low):
+        kind = m.lastgroup
+        if kind in _DATE_TOKENS:
+            date_tokens.append(m)
+        elif kind == "uuid":
+            if creator_id is None:
+                creator_id = text[m.start():m.end()] if same_offsets else m.group()
+        elif kind == "min_views":
+            if min_views is None:
+                min_views = int(m.group("min_views_n"))
+            metrics.add(Metric.views)
+        elif kind == "unique_videos":
+            unique_videos = True
+            metrics.add(Metric.videos)
+        elif kind == "last_n_days":
+            if last_n is None:
+                last_n = int(m.group("last_n"))
+        elif kind == "top_n":
+            group_by = GroupBy.creator
+            if m.group("top_n_value") and limit is None:
+                limit = int(m.group("top_n_value"))
+        else:
+            keyword = _KEYWORDS[m.group()]
+            if keyword == "all_time":
+                all_time = True
+            elif keyword == "today":
+                today = True
+            elif keyword == "yesterday":
+                yesterday = True
+            elif isinstance(keyword, GroupBy):
+                if group_by is None:
+                    group_by = keyword
+            elif keyword in _PERIOD_DAYS:
+                if period_days is None:
+                    period_days = _PERIOD_DAYS[keyword]
+            elif keyword == "delta":
+                measure = Measure.delta_sum
+            elif keyword == "approximate":
+                approximate = True
+            elif isinstance(keyword, ExportFormat):
+                # "выгрузи в parquet": явный формат важнее слова "выгрузи"
+                if export is None or keyword == ExportFormat.parquet:
+                    export = keyword
+            else:
+                metrics.add(keyword)
+                if keyword not in named_metrics:
+                    named_metrics.append(keyword)
+
+    # "видео" в перечислении обычно подлежащее ("сколько просмотров и лайков у видео")
+    listed_metrics = [m for m in named_metrics if m != Metric.videos]
+    if len(listed_metrics) >= 2 and not unique_videos and group_by is None:
+        metric = listed_metrics[0]
+    else:
+        listed_metrics = None
+        metric = next((candidate for candidate in _METRIC_PRIORITY if candidate in metrics), None)
+    if metric is None:
+        raise ValueError("Unsupported metric")
 
     filters = Filters(
         creator_id=creator_id,
@@ -94,38 +206,25 @@ def parse_intent_rule_based(user_text: str) -> QueryIntent:
     )
 
     # time_range
-    if any(k in low for k in ["за всё время", "за все время", "в системе", "all time", "all-time"]):
+    if all_time:
         time_range = TimeRange(type=TimeRangeType.last_n_days, n=36500)
-    elif "сегодня" in low or "today" in low:
+    elif today:
         time_range = TimeRange(type=TimeRangeType.today)
-    elif "вчера" in low or "yesterday" in low:
+    elif yesterday:
         time_range = TimeRange(type=TimeRangeType.yesterday)
+    elif last_n is not None:
+        time_range = TimeRange(type=TimeRangeType.last_n_days, n=last_n)
+    elif period_days is not None:
+        time_range = TimeRange(type=TimeRangeType.last_n_days, n=period_days)
+    elif date_tokens:
+        # Сначала даты ISO, потом ДД.ММ.ГГГГ, потом "1 ноября 2025"
+        date_tokens.sort(key=lambda m: _DATE_TOKENS.index(m.lastgroup))
+        time_range = _between_range(date_tokens)
+    elif export is not None:
+        # "выгрузи все видео креатора" - без периода выгружается все
+        time_range = TimeRange(type=TimeRangeType.last_n_days, n=36500)
     else:
-        m_last = _LAST_N_DAYS_RE.search(low)
-        if m_last:
-            time_range = TimeRange(type=TimeRangeType.last_n_days, n=int(m_last.group("n")))
-        else:
-            dates: list[date] = []
-            for m in _DATE_ISO_RE.finditer(text):
-                dates.append(date(int(m.group("y")), int(m.group("m")), int(m.group("d"))))
-            for m in _DATE_DMY_RE.finditer(text):
-                dates.append(date(int(m.group("y")), int(m.group("m")), int(m.group("d"))))
-            for m in _RUSSIAN_MONTH_DATE_RE.finditer(text):
-                month_map = {
-                    "января": 1, "февраля": 2, "марта": 3, "апреля": 4,
-                    "мая": 5, "июня": 6, "июля": 7, "августа": 8,
-                    "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
-                }
-                dates.append(date(int(m.group("y")), month_map[m.group("month").lower()], int(m.group("d"))))
-
-            if len(dates) >= 2:
-                start, end = dates[0], dates[1]
-                time_range = TimeRange(type=TimeRangeType.between, **{"from": start}, to=end)
-            elif len(dates) == 1:
-                d = dates[0]
-                time_range = TimeRange(type=TimeRangeType.between, **{"from": d}, to=d)
-            else:
-                time_range = TimeRange(type=TimeRangeType.today)
+        time_range = TimeRange(type=TimeRangeType.today)
 
     if metric == Metric.videos and measure == Measure.delta_sum:
         raise ValueError("delta_sum is not supported for metric=videos")
@@ -136,4 +235,9 @@ def parse_intent_rule_based(user_text: str) -> QueryIntent:
         time_range=time_range,
         filters=filters,
         confidence=1.0,
+        metrics=listed_metrics,
+        group_by=group_by,
+        limit=limit or None,
+        approximate=approximate,
+        export=export,
     )
@@ -20,6 +20,17 @@ class Measure(str, Enum):
     delta_sum = "delta_sum"
 
 
+class GroupBy(str, Enum):
+    day = "day"
+    week = "week"
+    creator = "creator"
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    parquet = "parquet"
+
+
 class TimeRangeType(str, Enum):
     last_n_days = "last_n_days"
     today = "today"
@@ -74,6 +85,15 @@ class QueryIntent(BaseModel):
     time_range: TimeRange
     filters: Filters | None = Field(default_factory=Filters)
     confidence: Optional[float] = Field(default=None, ge=0, le=1)
+    # Несколько метрик с одной мерой в одном ответе; metric - одна из них
+    metrics: Optional[list[Metric]] = None
+    # Разбивка ответа по дням, неделям или топ-limit креаторов
+    group_by: Optional[GroupBy] = None
+    limit: Optional[int] = Field(default=None, ge=1)
+    # Разрешить приближенный ответ (выборка строк, HyperLogLog), если точный прочитает слишком много
+    approximate: bool = False
+    # Вместо числа - файл со строками videos (final) или снапшотов (delta_sum) под фильтры
+    export: Optional[ExportFormat] = None
 
     @model_validator(mode="before")
     @classmethod
@@ -83,6 +103,42 @@ class QueryIntent(BaseModel):
             data["filters"] = {}
         return data
 
+    @model_validator(mode="before")
+    @classmethod
+    def _default_metric_from_metrics(cls, data):
+        if isinstance(data, dict) and data.get("metric") is None and data.get("metrics"):
+            data = dict(data)
+            data["metric"] = data["metrics"][0]
+        return data
+
+    @model_validator(mode="after")
+    def _validate_metrics(self) -> "QueryIntent":
+        if self.metrics is None:
+            return self
+        metrics = list(dict.fromkeys(self.metrics))
+        if self.metric not in metrics:
+            metrics.insert(0, self.metric)
+        if len(metrics) == 1:
+            metrics = None
+        elif self.measure == Measure.delta_sum and Metric.videos in metrics:
+            raise ValueError("delta_sum is not supported for metric=videos")
+        elif self.filters is not None and self.filters.unique_videos:
+            raise ValueError("unique_videos is not supported with several metrics")
+        if metrics is not None and self.group_by is not None:
+            raise ValueError("group_by is not supported with several metrics")
+        self.metrics = metrics
+        return self
+
+    @model_validator(mode="after")
+    def _validate_export(self) -> "QueryIntent":
+        if self.export is not None and self.group_by is not None:
+            raise ValueError("group_by is not supported for export")
+        return self
+
+    @property
+    def all_metrics(self) -> list[Metric]:
+        return self.metrics or [self.metric]
+
     model_config = {
         "populate_by_name": True,
         "extra": "forbid",
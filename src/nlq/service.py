@@ -1,12 +1,274 @@
 from __future__ import annotations
 
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Executable
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from nlq.schemas import QueryIntent
-from nlq.sql_builder import build_scalar_query
+from config.settings import settings
+from monitoring.metrics import RESULT_CACHE_LOOKUPS, SLOW_QUERIES, STAGE_SECONDS
+from nlq.cache import (
+    InMemoryResultCache,
+    RedisResultCache,
+    ResultCacheBackend,
+    cache_key,
+    is_closed_range,
+)
+from db.database import async_database_session_maker
+from nlq.estimates import refresh_row_estimates
+from nlq.schemas import Measure, QueryIntent
+from nlq.sql_builder import (
+    build_grouped_statement,
+    build_metrics_statement,
+    build_scalar_plan,
+    group_row_limit,
+    uses_row_estimates,
+)
+from nlq.time_range import to_utc_datetime_range
+
+if TYPE_CHECKING:
+    # numpy грузится, только если включен COLUMNAR_BACKEND
+    from nlq.columnar import ColumnarStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IntentResult:
+    # Число; для нескольких метрик - {Metric.value: число};
+    # для group_by - {"rows": [[bucket, число], ...], "truncated": bool}
+    value: int | dict
+    # Посчитан по выборке или HyperLogLog; колоночная копия всегда считает точно
+    approximate: bool = False
+
+
+_result_cache: ResultCacheBackend | None = None
+_columnar_store: ColumnarStore | None = None
+
+
+def get_result_cache() -> ResultCacheBackend | None:
+    global _result_cache
+    if _result_cache is None:
+        if settings.RESULT_CACHE_BACKEND == "memory":
+            _result_cache = InMemoryResultCache(settings.RESULT_CACHE_MAX_ENTRIES)
+        elif settings.RESULT_CACHE_BACKEND == "redis":
+            _result_cache = RedisResultCache(settings.REDIS_URL)
+    return _result_cache
+
+
+def set_result_cache(backend: ResultCacheBackend | None) -> None:
+    global _result_cache
+    _result_cache = backend
+
+
+async def invalidate_result_cache() -> None:
+    cache = get_result_cache()
+    if cache is not None:
+        await cache.clear()
+
+
+def _load_columnar_store() -> ColumnarStore:
+    from nlq.columnar import ColumnarStore
+
+    path = settings.COLUMNAR_SNAPSHOT_PATH
+    if path and os.path.exists(path):
+        try:
+            store = ColumnarStore.from_file(path, settings.COLUMNAR_REFRESH_OVERLAP_SECONDS)
+        except Exception:
+            logger.warning("Columnar store file %s is unreadable, loading from the database", path, exc_info=True)
+        else:
+            logger.info(
+                "Columnar store mapped from %s: %d videos, %d snapshots",
+                path,
+                store.videos_count,
+                store.snapshots_count,
+            )
+            return store
+    return ColumnarStore(settings.COLUMNAR_REFRESH_OVERLAP_SECONDS)
+
+
+def get_columnar_store() -> ColumnarStore | None:
+    global _columnar_store
+    if _columnar_store is None and settings.COLUMNAR_BACKEND:
+        _columnar_store = _load_columnar_store()
+    return _columnar_store
+
+
+def set_columnar_store(store: ColumnarStore | None) -> None:
+    global _columnar_store
+    _columnar_store = store
+
+
+def _columnar_ready() -> bool:
+    store = get_columnar_store()
+    return store is not None and store.ready
+
+
+async def refresh_columnar_store() -> None:
+    store = get_columnar_store()
+    if store is not None:
+        from nlq.columnar import refresh_store
+
+        await refresh_store(store, async_database_session_maker)
+
+
+async def save_columnar_store() -> None:
+    """Сохранить копию в COLUMNAR_SNAPSHOT_PATH для быстрого старта следующего процесса."""
+    store = get_columnar_store()
+    if store is None or not settings.COLUMNAR_SNAPSHOT_PATH:
+        return
+    started_at = time.perf_counter()
+    await store.save(settings.COLUMNAR_SNAPSHOT_PATH)
+    logger.info(
+        "Columnar store saved to %s in %.2f s", settings.COLUMNAR_SNAPSHOT_PATH, time.perf_counter() - started_at
+    )
+
+
+async def on_data_changed() -> None:
+    """Новые данные в БД: дочитать их в колоночную копию и сбросить кэш результатов."""
+    try:
+        await refresh_columnar_store()
+    finally:
+        await invalidate_result_cache()
+
+
+async def _cache_get(cache: ResultCacheBackend, key: str) -> IntentResult | None:
+    try:
+        entry = await cache.get(key)
+    except Exception:
+        logger.warning("Result cache read failed", exc_info=True)
+        RESULT_CACHE_LOOKUPS.inc(result="error")
+        return None
+    # Записи прежнего формата (одно значение без признака) считаются промахом
+    if not isinstance(entry, dict) or "value" not in entry:
+        RESULT_CACHE_LOOKUPS.inc(result="miss")
+        return None
+    RESULT_CACHE_LOOKUPS.inc(result="hit")
+    return IntentResult(entry["value"], entry.get("approximate", False))
+
+
+async def _cache_set(cache: ResultCacheBackend, key: str, result: IntentResult, ttl: float) -> None:
+    try:
+        await cache.set(key, {"value": result.value, "approximate": result.approximate}, ttl)
+    except Exception:
+        logger.warning("Result cache write failed", exc_info=True)
+
+
+def intent_key(intent: QueryIntent) -> str:
+    """Ключ интента с разрешенным периодом: одинаков у запросов с одним и тем же ответом."""
+    return cache_key(intent, to_utc_datetime_range(intent.time_range))
+
+
+async def get_cached_result(intent: QueryIntent) -> IntentResult | None:
+    """Ответ из кэша результатов без обращения к БД, None при промахе."""
+    cache = get_result_cache()
+    # Пока есть колоночная копия, кэш не пишется и может быть старым
+    if cache is None or _columnar_ready():
+        return None
+    return await _cache_get(cache, intent_key(intent))
+
+
+def _bucket_label(bucket) -> str:
+    if isinstance(bucket, datetime):
+        return bucket.date().isoformat()
+    return str(bucket)
+
+
+async def _log_slow_query(session: AsyncSession, q: Executable, params: dict, elapsed: float) -> None:
+    """Текст запроса с параметрами, а при SLOW_QUERY_EXPLAIN - и его план.
+
+    EXPLAIN ANALYZE выполняет запрос еще раз, поэтому план включается отдельной настройкой.
+    """
+    SLOW_QUERIES.inc()
+    connection = await session.connection()
+    compiled = q.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    bound = compiled.construct_params(params)
+    positional = tuple(bound[name] for name in compiled.positiontup)
+    logger.warning("Slow query (%.0f ms): %s; params=%r", elapsed * 1000, compiled, positional)
+    if not settings.SLOW_QUERY_EXPLAIN:
+        return
+    try:
+        result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}", positional)
+    except Exception:
+        logger.warning("EXPLAIN of slow query failed", exc_info=True)
+        return
+    logger.warning("Slow query plan:\n%s", "\n".join(row[0] for row in result))
+
+
+async def _fetch_grouped(session: AsyncSession, q: Executable, params: dict) -> dict:
+    limit = params["row_limit"] - 1
+    rows: list[list] = []
+    truncated = False
+    # Строки читаются курсором по мере прихода, лишние не материализуются
+    result = await session.stream(q, params)
+    try:
+        async for bucket, value in result:
+            if len(rows) == limit:
+                truncated = True
+                break
+            rows.append([_bucket_label(bucket), int(value)])
+    finally:
+        await result.close()
+    return {"rows": rows, "truncated": truncated}
+
+
+async def execute_intent(session: AsyncSession, intent: QueryIntent) -> IntentResult:
+    """Ответ вместе с признаком приближенности; в кэше они хранятся вместе."""
+    tr = to_utc_datetime_range(intent.time_range)
+
+    # Колоночная копия в памяти отвечает быстрее кэша и всегда свежее его
+    if _columnar_ready():
+        with STAGE_SECONDS.time(stage="columnar"):
+            return IntentResult(
+                get_columnar_store().answer(intent, tr, group_row_limit(intent) if intent.group_by is not None else None)
+            )
+
+    cache = get_result_cache()
+    key = cache_key(intent, tr) if cache is not None else None
+    if cache is not None:
+        cached = await _cache_get(cache, key)
+        if cached is not None:
+            return cached
+
+    if uses_row_estimates(intent, tr):
+        # Точный или приближенный запрос выбирается по оценкам размеров таблиц
+        await refresh_row_estimates(session, settings.APPROXIMATE_ESTIMATES_TTL_SECONDS)
+
+    approximate = False
+    with STAGE_SECONDS.time(stage="build"):
+        if intent.group_by is not None:
+            q, params = build_grouped_statement(intent, tr)
+        elif intent.metrics:
+            q, params = build_metrics_statement(intent, tr)
+        else:
+            q, params, approximate = build_scalar_plan(intent, tr)
+
+    start = time.perf_counter()
+    if intent.group_by is not None:
+        value = await _fetch_grouped(session, q, params)
+    elif intent.metrics:
+        row = (await session.execute(q, params)).one()
+        value = {metric: int(count) for metric, count in row._mapping.items()}
+    else:
+        value = int((await session.execute(q, params)).scalar_one())
+    elapsed = time.perf_counter() - start
+    STAGE_SECONDS.observe(elapsed, stage="db")
+    if settings.SLOW_QUERY_THRESHOLD_MS and elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        await _log_slow_query(session, q, params, elapsed)
 
-async def execute_intent(session: AsyncSession, intent: QueryIntent) -> int:
-    q = build_scalar_query(intent)
-    result = await session.execute(q)
-    value = result.scalar_one()
-    return int(value)
+    result = IntentResult(value, approximate)
+    if cache is not None:
+        # Прирост за прошлые сутки больше не меняется; final - текущие счетчики видео,
+        # они меняются с каждым снапшотом при любом диапазоне публикации
+        ttl = (
+            settings.RESULT_CACHE_CLOSED_TTL_SECONDS
+            if intent.measure == Measure.delta_sum and is_closed_range(tr)
+            else settings.RESULT_CACHE_TTL_SECONDS
+        )
+        await _cache_set(cache, key, result, ttl)
+    return result
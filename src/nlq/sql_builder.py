@@ -1,11 +1,34 @@
 from __future__ import annotations
 
-from sqlalchemy import func, select
+from dataclasses import dataclass, replace
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Any
 
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    bindparam,
+    cast,
+    func,
+    literal,
+    literal_column,
+    select,
+    union,
+    union_all,
+)
+
+from config.settings import settings
+from db.hll import hll_bucket, hll_estimate, hll_rank
+from models.creator_daily_totals import CreatorDailyTotal
+from models.video_daily_hll import VideoDailyHll
+from models.video_daily_stats import VideoDailyStat
 from models.video_snapshots import VideoSnapshot
 from models.videos import Video
-from nlq.schemas import Metric, QueryIntent
-from nlq.time_range import to_utc_datetime_range
+from nlq.estimates import estimated_rows
+from nlq.schemas import GroupBy, Measure, Metric, QueryIntent
+from nlq.time_range import UtcDateTimeRange, to_utc_datetime_range
 
 
 _METRIC_TO_VIDEO_COL = {
@@ -22,61 +45,616 @@ _METRIC_TO_SNAPSHOT_DELTA_COL = {
     Metric.reports: VideoSnapshot.delta_reports_count,
 }
 
+_METRIC_TO_DAILY_DELTA_COL = {
+    Metric.views: VideoDailyStat.delta_views_count,
+    Metric.likes: VideoDailyStat.delta_likes_count,
+    Metric.comments: VideoDailyStat.delta_comments_count,
+    Metric.reports: VideoDailyStat.delta_reports_count,
+}
 
-def build_scalar_query(intent: QueryIntent):
-    if intent.measure.value == "final":
-        if intent.metric == Metric.videos:
-            q = select(func.count(Video.id) if not intent.filters.unique_videos else func.count(func.distinct(Video.id)))
-        else:
-            metric_col = _METRIC_TO_VIDEO_COL[intent.metric]
-            q = select(func.coalesce(func.sum(metric_col), 0))
+# У видео в итогах креатора счетчик - videos_count, уникальность id не нужна
+_METRIC_TO_TOTALS_COL = {
+    Metric.views: CreatorDailyTotal.views_count,
+    Metric.likes: CreatorDailyTotal.likes_count,
+    Metric.comments: CreatorDailyTotal.comments_count,
+    Metric.reports: CreatorDailyTotal.reports_count,
+    Metric.videos: CreatorDailyTotal.videos_count,
+}
 
-        tr = to_utc_datetime_range(intent.time_range)
-        start = tr.start.replace(tzinfo=None)
-        end = tr.end.replace(tzinfo=None)
-        q = q.select_from(Video).where(
-            Video.video_created_at >= start,
-            Video.video_created_at < end,
+
+@dataclass(frozen=True)
+class _QueryShape:
+    """Все, что определяет структуру SQL; значения фильтров и границ идут параметрами."""
+
+    measure: Measure
+    metric: Metric
+    unique_videos: bool
+    by_creator: bool
+    by_min_views: bool
+    rollup: bool = False
+    # measure=final по creator_daily_totals (границы - first_day/last_day)
+    totals: bool = False
+    head: bool = False
+    tail: bool = False
+    # Непустой - одна строка с колонкой на каждую метрику (имя колонки - Metric.value)
+    metrics: tuple[Metric, ...] = ()
+    # Строки (bucket, value) с группировкой, не больше row_limit
+    group_by: GroupBy | None = None
+    # Суммы по выборке TABLESAMPLE (процент - sample_percent), разные видео - по HyperLogLog
+    approximate: bool = False
+    # Строки для выгрузки вместо агрегата
+    export: bool = False
+
+
+def _whole_days(start: datetime, end: datetime) -> tuple[date, date] | None:
+    """Полуинтервал целых дней [first_day, last_day) внутри [start, end)."""
+    first_day = start.date()
+    if start.time() != time.min:
+        first_day += timedelta(days=1)
+    last_day = end.date()
+    if first_day >= last_day:
+        return None
+    return first_day, last_day
+
+
+def _totals_where(q, shape: _QueryShape):
+    q = q.select_from(CreatorDailyTotal).where(
+        CreatorDailyTotal.day >= bindparam("first_day"),
+        CreatorDailyTotal.day < bindparam("last_day"),
+    )
+    if shape.by_creator:
+        q = q.where(CreatorDailyTotal.creator_id == bindparam("creator_id"))
+    return q
+
+
+def _final_query(shape: _QueryShape):
+    if shape.totals:
+        return _totals_where(select(func.coalesce(func.sum(_METRIC_TO_TOTALS_COL[shape.metric]), 0)), shape)
+    if shape.metric == Metric.videos:
+        q = select(func.count(Video.id) if not shape.unique_videos else func.count(func.distinct(Video.id)))
+    else:
+        metric_col = _METRIC_TO_VIDEO_COL[shape.metric]
+        q = select(func.coalesce(func.sum(metric_col), 0))
+    return _final_where(q, shape)
+
+
+def _final_where(q, shape: _QueryShape):
+    q = q.select_from(Video).where(
+        Video.video_created_at >= bindparam("start"),
+        Video.video_created_at < bindparam("end"),
+    )
+
+    if shape.by_creator:
+        q = q.where(Video.creator_id == bindparam("creator_id"))
+
+    if shape.by_min_views:
+        q = q.where(Video.views_count >= bindparam("min_views"))
+
+    return q
+
+
+def _raw_delta_query(shape: _QueryShape, start: str = "start", end: str = "end", video_ids: bool = False):
+    if video_ids:
+        q = select(VideoSnapshot.video_id)
+    elif shape.unique_videos:
+        q = select(func.count(func.distinct(VideoSnapshot.video_id)))
+    else:
+        delta_col = _METRIC_TO_SNAPSHOT_DELTA_COL[shape.metric]
+        q = select(func.coalesce(func.sum(delta_col), 0))
+    return _snapshot_where(q, shape, start, end)
+
+
+def _snapshot_where(q, shape: _QueryShape, start: str = "start", end: str = "end"):
+    q = q.select_from(VideoSnapshot).where(
+        VideoSnapshot.created_at >= bindparam(start),
+        VideoSnapshot.created_at < bindparam(end),
+    )
+
+    if shape.by_creator:
+        q = q.join(Video, Video.id == VideoSnapshot.video_id).where(
+            Video.creator_id == bindparam("creator_id")
         )
 
-        if intent.filters.creator_id:
-            q = q.where(Video.creator_id == intent.filters.creator_id)
+    return q
+
+
+def _rollup_edges(shape: _QueryShape) -> list[tuple[str, str]]:
+    edges = []
+    if shape.head:
+        edges.append(("start", "first_day_start"))
+    if shape.tail:
+        edges.append(("last_day_start", "end"))
+    return edges
+
+
+def _rollup_where(q, shape: _QueryShape):
+    q = q.where(
+        VideoDailyStat.day >= bindparam("first_day"),
+        VideoDailyStat.day < bindparam("last_day"),
+    )
+    if shape.by_creator:
+        q = q.where(VideoDailyStat.creator_id == bindparam("creator_id"))
+    return q
+
+
+def _rollup_delta_query(shape: _QueryShape):
+    """Целые дни из video_daily_stats, неполные края диапазона - из video_snapshots."""
+    edges = _rollup_edges(shape)
 
-        if intent.filters.min_views is not None:
-            q = q.where(Video.views_count >= intent.filters.min_views)
+    if shape.unique_videos:
+        if not edges:
+            return _rollup_where(select(func.count(func.distinct(VideoDailyStat.video_id))), shape)
+        parts = [_rollup_where(select(VideoDailyStat.video_id), shape)]
+        for edge_start, edge_end in edges:
+            parts.append(_raw_delta_query(shape, edge_start, edge_end, video_ids=True))
+        return select(func.count()).select_from(union(*parts).subquery())
 
+    delta_col = _METRIC_TO_DAILY_DELTA_COL[shape.metric]
+    q = _rollup_where(select(func.coalesce(func.sum(delta_col), 0)), shape)
+    if not edges:
         return q
 
-    if intent.measure.value == "delta_sum":
-        if intent.metric == Metric.videos:
-            raise ValueError("delta_sum is not supported for metric=videos")
-        delta_col = _METRIC_TO_SNAPSHOT_DELTA_COL[intent.metric]
+    total = q.scalar_subquery()
+    for edge_start, edge_end in edges:
+        total = total + _raw_delta_query(shape, edge_start, edge_end).scalar_subquery()
+    return select(total)
 
-        tr = to_utc_datetime_range(intent.time_range)
 
-        if intent.filters.unique_videos:
-            q = (
-                select(func.count(func.distinct(VideoSnapshot.video_id)))
-                .select_from(VideoSnapshot)
-                .join(Video, Video.id == VideoSnapshot.video_id)
-                .where(
-                    VideoSnapshot.created_at >= tr.start,
-                    VideoSnapshot.created_at < tr.end,
-                )
-            )
-        else:
-            q = (
-                select(func.coalesce(func.sum(delta_col), 0))
-                .select_from(VideoSnapshot)
-                .where(
-                    VideoSnapshot.created_at >= tr.start,
-                    VideoSnapshot.created_at < tr.end,
-                )
+def _sum_columns(metric_to_col: dict, metrics) -> list:
+    return [func.coalesce(func.sum(metric_to_col[m]), 0).label(m.value) for m in metrics]
+
+
+def _multi_final_query(shape: _QueryShape):
+    if shape.totals:
+        return _totals_where(select(*_sum_columns(_METRIC_TO_TOTALS_COL, shape.metrics)), shape)
+    columns = [
+        func.count(Video.id).label(m.value) if m == Metric.videos
+        else func.coalesce(func.sum(_METRIC_TO_VIDEO_COL[m]), 0).label(m.value)
+        for m in shape.metrics
+    ]
+    return _final_where(select(*columns), shape)
+
+
+def _multi_delta_query(shape: _QueryShape):
+    """Все метрики одним проходом: суммы по нескольким колонкам одной выборки."""
+    if not shape.rollup:
+        return _snapshot_where(select(*_sum_columns(_METRIC_TO_SNAPSHOT_DELTA_COL, shape.metrics)), shape)
+
+    edges = _rollup_edges(shape)
+    if not edges:
+        return _rollup_where(select(*_sum_columns(_METRIC_TO_DAILY_DELTA_COL, shape.metrics)), shape)
+
+    # Дни из агрегатов и края из снапшотов - одна выборка через UNION ALL,
+    # суммы по всем метрикам считаются поверх нее
+    parts = [
+        _rollup_where(select(*(_METRIC_TO_DAILY_DELTA_COL[m].label(m.value) for m in shape.metrics)), shape)
+    ]
+    for edge_start, edge_end in edges:
+        parts.append(
+            _snapshot_where(
+                select(*(_METRIC_TO_SNAPSHOT_DELTA_COL[m].label(m.value) for m in shape.metrics)),
+                shape,
+                edge_start,
+                edge_end,
             )
+        )
+    deltas = union_all(*parts).subquery()
+    return select(*(func.coalesce(func.sum(deltas.c[m.value]), 0).label(m.value) for m in shape.metrics))
+
+
+def _date_bucket(group_by: GroupBy, col):
+    return func.date_trunc(literal_column(f"'{group_by.value}'"), col)
+
+
+def _snapshot_bucket(shape: _QueryShape):
+    if shape.group_by == GroupBy.creator:
+        return Video.creator_id
+    # Дни и недели по UTC, как в video_daily_stats
+    return _date_bucket(shape.group_by, func.timezone("UTC", VideoSnapshot.created_at))
+
+
+def _snapshot_rows(shape: _QueryShape, start: str = "start", end: str = "end"):
+    value = VideoSnapshot.video_id if shape.unique_videos else _METRIC_TO_SNAPSHOT_DELTA_COL[shape.metric]
+    q = select(_snapshot_bucket(shape).label("bucket"), value.label("value")).select_from(VideoSnapshot)
+    if shape.by_creator or shape.group_by == GroupBy.creator:
+        q = q.join(Video, Video.id == VideoSnapshot.video_id)
+    q = q.where(
+        VideoSnapshot.created_at >= bindparam(start),
+        VideoSnapshot.created_at < bindparam(end),
+    )
+    if shape.by_creator:
+        q = q.where(Video.creator_id == bindparam("creator_id"))
+    return q
+
+
+def _rollup_rows(shape: _QueryShape):
+    if shape.group_by == GroupBy.creator:
+        bucket = VideoDailyStat.creator_id
+    else:
+        bucket = _date_bucket(shape.group_by, cast(VideoDailyStat.day, DateTime))
+    value = VideoDailyStat.video_id if shape.unique_videos else _METRIC_TO_DAILY_DELTA_COL[shape.metric]
+    return _rollup_where(select(bucket.label("bucket"), value.label("value")), shape)
+
+
+def _order_and_limit(q, shape: _QueryShape, bucket, value):
+    if shape.group_by == GroupBy.creator:
+        q = q.order_by(value.desc(), bucket)
+    else:
+        q = q.order_by(bucket)
+    return q.limit(bindparam("row_limit"))
+
+
+def _grouped_totals_query(shape: _QueryShape):
+    if shape.group_by == GroupBy.creator:
+        bucket = CreatorDailyTotal.creator_id
+    else:
+        bucket = _date_bucket(shape.group_by, cast(CreatorDailyTotal.day, DateTime))
+    value = func.coalesce(func.sum(_METRIC_TO_TOTALS_COL[shape.metric]), 0)
+    q = _totals_where(select(bucket.label("bucket"), value.label("value")), shape).group_by(bucket)
+    return _order_and_limit(q, shape, bucket, value)
+
+
+def _grouped_final_query(shape: _QueryShape):
+    if shape.totals:
+        return _grouped_totals_query(shape)
+    if shape.group_by == GroupBy.creator:
+        bucket = Video.creator_id
+    else:
+        bucket = _date_bucket(shape.group_by, Video.video_created_at)
+    if shape.metric == Metric.videos:
+        value = func.count(func.distinct(Video.id)) if shape.unique_videos else func.count(Video.id)
+    else:
+        value = func.coalesce(func.sum(_METRIC_TO_VIDEO_COL[shape.metric]), 0)
+    q = _final_where(select(bucket.label("bucket"), value.label("value")), shape).group_by(bucket)
+    return _order_and_limit(q, shape, bucket, value)
+
+
+def _grouped_delta_query(shape: _QueryShape):
+    if shape.rollup:
+        parts = [_rollup_rows(shape)]
+        parts.extend(_snapshot_rows(shape, edge_start, edge_end) for edge_start, edge_end in _rollup_edges(shape))
+        rows = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    else:
+        rows = _snapshot_rows(shape).subquery()
+
+    if shape.unique_videos:
+        value = func.count(func.distinct(rows.c.value))
+    else:
+        value = func.coalesce(func.sum(rows.c.value), 0)
+    q = select(rows.c.bucket, value.label("value")).group_by(rows.c.bucket)
+    return _order_and_limit(q, shape, rows.c.bucket, value)
+
+
+_SAMPLE_PERCENT = bindparam("sample_percent", type_=Float)
+
 
-        if intent.filters.creator_id:
-            q = q.where(Video.creator_id == intent.filters.creator_id)
+def _sample_of(model):
+    # REPEATABLE: одна и та же выборка на неизменных данных, ответ не прыгает между запросами
+    return model.__table__.tablesample(func.system(_SAMPLE_PERCENT), seed=literal(0))
 
+
+def _scaled(value):
+    """Сумма по выборке, пересчитанная на всю таблицу."""
+    return cast(func.round(value * 100.0 / _SAMPLE_PERCENT), BigInteger)
+
+
+def _sampled_final_query(shape: _QueryShape):
+    sample = _sample_of(Video)
+    if shape.metric == Metric.videos:
+        # id уникален, поэтому unique_videos не меняет подсчет
+        value = func.count()
+    else:
+        value = func.coalesce(func.sum(sample.c[_METRIC_TO_VIDEO_COL[shape.metric].key]), 0)
+    q = select(_scaled(value)).select_from(sample).where(
+        sample.c.video_created_at >= bindparam("start"),
+        sample.c.video_created_at < bindparam("end"),
+    )
+    if shape.by_min_views:
+        q = q.where(sample.c.views_count >= bindparam("min_views"))
+    return q
+
+
+def _sampled_delta_query(shape: _QueryShape):
+    """Целые дни или весь диапазон - по выборке, неполные края - точно по снапшотам."""
+    if shape.rollup:
+        sample = _sample_of(VideoDailyStat)
+        value = sample.c[_METRIC_TO_DAILY_DELTA_COL[shape.metric].key]
+        where = (sample.c.day >= bindparam("first_day"), sample.c.day < bindparam("last_day"))
+    else:
+        sample = _sample_of(VideoSnapshot)
+        value = sample.c[_METRIC_TO_SNAPSHOT_DELTA_COL[shape.metric].key]
+        where = (sample.c.created_at >= bindparam("start"), sample.c.created_at < bindparam("end"))
+    q = select(_scaled(func.coalesce(func.sum(value), 0))).select_from(sample).where(*where)
+    edges = _rollup_edges(shape)
+    if not edges:
         return q
+    total = q.scalar_subquery()
+    for edge_start, edge_end in edges:
+        total = total + _raw_delta_query(shape, edge_start, edge_end).scalar_subquery()
+    return select(total)
+
+
+def _hll_unique_query(shape: _QueryShape):
+    """Разные видео: регистры целых дней из video_daily_hll и хэши видео краевых снапшотов."""
+    parts = [
+        select(VideoDailyHll.bucket, VideoDailyHll.rank).where(
+            VideoDailyHll.day >= bindparam("first_day"),
+            VideoDailyHll.day < bindparam("last_day"),
+        )
+    ]
+    for edge_start, edge_end in _rollup_edges(shape):
+        edge = select(
+            hll_bucket(VideoSnapshot.video_id).label("bucket"),
+            hll_rank(VideoSnapshot.video_id).label("rank"),
+        )
+        parts.append(_snapshot_where(edge, shape, edge_start, edge_end))
+    rows = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    registers = select(rows.c.bucket, func.max(rows.c.rank).label("rank")).group_by(rows.c.bucket)
+    return hll_estimate(registers.subquery())
+
+
+def _approximate_query(shape: _QueryShape):
+    if shape.measure == Measure.final:
+        return _sampled_final_query(shape)
+    if shape.unique_videos:
+        return _hll_unique_query(shape)
+    return _sampled_delta_query(shape)
+
+
+def _export_query(shape: _QueryShape):
+    if shape.measure == Measure.final:
+        q = select(
+            Video.id.label("video_id"),
+            Video.creator_id,
+            Video.video_created_at,
+            *_METRIC_TO_VIDEO_COL.values(),
+        )
+        return _final_where(q, shape).order_by(Video.video_created_at, Video.id)
+
+    q = (
+        select(
+            VideoSnapshot.video_id,
+            Video.creator_id,
+            VideoSnapshot.created_at,
+            VideoSnapshot.views_count,
+            VideoSnapshot.likes_count,
+            VideoSnapshot.comments_count,
+            VideoSnapshot.reports_count,
+            *_METRIC_TO_SNAPSHOT_DELTA_COL.values(),
+        )
+        .select_from(VideoSnapshot)
+        .join(Video, Video.id == VideoSnapshot.video_id)
+        .where(
+            VideoSnapshot.created_at >= bindparam("start"),
+            VideoSnapshot.created_at < bindparam("end"),
+        )
+    )
+    if shape.by_creator:
+        q = q.where(Video.creator_id == bindparam("creator_id"))
+    if shape.by_min_views:
+        q = q.where(Video.views_count >= bindparam("min_views"))
+    return q.order_by(VideoSnapshot.created_at)
+
+
+@lru_cache(maxsize=256)
+def _statement_for_shape(shape: _QueryShape):
+    # Один и тот же объект запроса на форму: ключ кэша компиляции SQLAlchemy
+    # считается у него один раз, дальше переиспользуется скомпилированный SQL
+    if shape.export:
+        return _export_query(shape)
+    if shape.group_by is not None:
+        if shape.measure == Measure.final:
+            return _grouped_final_query(shape)
+        return _grouped_delta_query(shape)
+    if shape.metrics:
+        if shape.measure == Measure.final:
+            return _multi_final_query(shape)
+        return _multi_delta_query(shape)
+    if shape.approximate:
+        return _approximate_query(shape)
+    if shape.measure == Measure.final:
+        return _final_query(shape)
+    if shape.rollup:
+        return _rollup_delta_query(shape)
+    return _raw_delta_query(shape)
+
+
+def _shape_and_params(
+    intent: QueryIntent,
+    tr: UtcDateTimeRange | None,
+    metrics: tuple[Metric, ...] = (),
+    group_by: GroupBy | None = None,
+) -> tuple[_QueryShape, dict[str, Any]]:
+    if tr is None:
+        tr = to_utc_datetime_range(intent.time_range)
+
+    filters = intent.filters
+    shape_kwargs = dict(
+        measure=intent.measure,
+        metric=intent.metric,
+        unique_videos=bool(filters.unique_videos),
+        by_creator=bool(filters.creator_id),
+        metrics=metrics,
+        group_by=group_by,
+    )
+    params: dict[str, Any] = {}
+    if filters.creator_id:
+        params["creator_id"] = filters.creator_id
+
+    if intent.measure == Measure.final:
+        start = tr.start.replace(tzinfo=None)
+        end = tr.end.replace(tzinfo=None)
+        # Итоги креаторов хранятся по дням публикации и не знают просмотров отдельного видео
+        if (
+            settings.USE_CREATOR_TOTALS
+            and filters.min_views is None
+            and start.time() == time.min
+            and end.time() == time.min
+        ):
+            shape = _QueryShape(**shape_kwargs, by_min_views=False, totals=True)
+            params.update(first_day=start.date(), last_day=end.date())
+            return shape, params
+
+        shape = _QueryShape(**shape_kwargs, by_min_views=filters.min_views is not None)
+        params["start"] = start
+        params["end"] = end
+        if filters.min_views is not None:
+            params["min_views"] = filters.min_views
+        return shape, params
+
+    if intent.measure == Measure.delta_sum:
+        if Metric.videos in (metrics or (intent.metric,)):
+            raise ValueError("delta_sum is not supported for metric=videos")
+
+        days = _whole_days(tr.start, tr.end) if settings.USE_DAILY_ROLLUPS else None
+        if days is None:
+            shape = _QueryShape(**shape_kwargs, by_min_views=False)
+            params.update(start=tr.start, end=tr.end)
+            return shape, params
+
+        first_day, last_day = days
+        first_day_start = datetime.combine(first_day, time.min)
+        last_day_start = datetime.combine(last_day, time.min)
+        shape = _QueryShape(
+            **shape_kwargs,
+            by_min_views=False,
+            rollup=True,
+            head=tr.start < first_day_start,
+            tail=last_day_start < tr.end,
+        )
+        params.update(first_day=first_day, last_day=last_day)
+        if shape.head:
+            params.update(start=tr.start, first_day_start=first_day_start)
+        if shape.tail:
+            params.update(last_day_start=last_day_start, end=tr.end)
+        return shape, params
 
     raise ValueError(f"Unsupported measure: {intent.measure}")
+
+
+def _estimated_range(shape: _QueryShape, params: dict[str, Any]) -> tuple[str, Any, Any] | None:
+    """Таблица и диапазон, по оценке которых выбирается приближенная форма; None - форма всегда точная.
+
+    Итоги креаторов (measure=final по целым дням без min_views) - строка на креатора и день:
+    они читаются быстрее выборки и точны, поэтому имеют приоритет над TABLESAMPLE.
+    Запросы по одному креатору идут по индексу креатора и тоже остаются точными: выборка
+    по всей таблице дала бы на них большую ошибку.
+    """
+    if shape.by_creator or shape.totals:
+        return None
+    if shape.measure == Measure.final:
+        return "videos", params["start"], params["end"]
+    if shape.rollup:
+        return "video_daily_stats", params["first_day"], params["last_day"]
+    if shape.unique_videos:
+        # Скетчи хранятся по целым дням
+        return None
+    return "video_snapshots", params["start"], params["end"]
+
+
+def _approximate_shape(shape: _QueryShape, params: dict[str, Any]) -> tuple[_QueryShape, dict[str, Any]]:
+    """Приближенная форма вместо точной, если точная прочитает не меньше APPROXIMATE_MIN_ROWS строк."""
+    estimated = _estimated_range(shape, params)
+    if estimated is None:
+        return shape, params
+    rows = estimated_rows(*estimated)
+    if rows is None or rows < settings.APPROXIMATE_MIN_ROWS:
+        return shape, params
+    if not (shape.unique_videos and shape.rollup):
+        percent = 100.0 * settings.APPROXIMATE_SAMPLE_ROWS / max(rows, 1)
+        params = {**params, "sample_percent": min(max(percent, 0.01), 100.0)}
+    return replace(shape, approximate=True), params
+
+
+def _scalar_shape_and_params(
+    intent: QueryIntent, tr: UtcDateTimeRange | None
+) -> tuple[_QueryShape, dict[str, Any]]:
+    shape, params = _shape_and_params(intent, tr)
+    if intent.approximate:
+        shape, params = _approximate_shape(shape, params)
+    return shape, params
+
+
+def uses_row_estimates(intent: QueryIntent, tr: UtcDateTimeRange | None = None) -> bool:
+    """Зависит ли выбор запроса от оценок размеров таблиц (см. nlq.estimates).
+
+    False у форм, которые всегда точные: группировка, несколько метрик, итоги креаторов,
+    один креатор; для них оценки можно не обновлять.
+    """
+    if not intent.approximate or intent.group_by is not None or intent.metrics:
+        return False
+    return _estimated_range(*_shape_and_params(intent, tr)) is not None
+
+
+def build_scalar_plan(
+    intent: QueryIntent, tr: UtcDateTimeRange | None = None
+) -> tuple[Any, dict[str, Any], bool]:
+    """Запрос, его параметры и признак приближенного ответа.
+
+    С intent.approximate форма выбирается по текущим оценкам размеров таблиц,
+    поэтому признак берется из той же формы, по которой построен запрос.
+    """
+    shape, params = _scalar_shape_and_params(intent, tr)
+    return _statement_for_shape(shape), params, shape.approximate
+
+
+def build_scalar_statement(intent: QueryIntent, tr: UtcDateTimeRange | None = None) -> tuple[Any, dict[str, Any]]:
+    """Закэшированный параметризованный запрос под форму интента и его параметры.
+
+    С intent.approximate запрос может быть приближенным, см. build_scalar_plan.
+    """
+    q, params, _ = build_scalar_plan(intent, tr)
+    return q, params
+
+
+def build_metrics_statement(intent: QueryIntent, tr: UtcDateTimeRange | None = None) -> tuple[Any, dict[str, Any]]:
+    """Один запрос на все intent.all_metrics: одна строка, колонка на метрику с именем Metric.value."""
+    shape, params = _shape_and_params(intent, tr, tuple(intent.all_metrics))
+    return _statement_for_shape(shape), params
+
+
+def build_scalar_query(intent: QueryIntent, tr: UtcDateTimeRange | None = None):
+    q, params = build_scalar_statement(intent, tr)
+    return q.params(params)
+
+
+def group_row_limit(intent: QueryIntent) -> int:
+    """Сколько строк показать: топ креаторов - intent.limit, дни и недели - все, но не больше GROUP_BY_MAX_ROWS."""
+    if intent.group_by == GroupBy.creator:
+        return min(intent.limit or settings.GROUP_BY_TOP_N_DEFAULT, settings.GROUP_BY_MAX_ROWS)
+    return min(intent.limit or settings.GROUP_BY_MAX_ROWS, settings.GROUP_BY_MAX_ROWS)
+
+
+def build_grouped_statement(intent: QueryIntent, tr: UtcDateTimeRange | None = None) -> tuple[Any, dict[str, Any]]:
+    """Строки (bucket, value) по intent.group_by; row_limit на одну больше лимита, чтобы заметить обрезку."""
+    if intent.group_by is None:
+        raise ValueError("group_by is required")
+    shape, params = _shape_and_params(intent, tr, group_by=intent.group_by)
+    params["row_limit"] = group_row_limit(intent) + 1
+    return _statement_for_shape(shape), params
+
+
+def build_export_statement(intent: QueryIntent, tr: UtcDateTimeRange | None = None) -> tuple[Any, dict[str, Any]]:
+    """Строки под фильтры и период интента: videos по дате публикации (measure=final)
+    или снапшоты по времени замера (delta_sum, min_views - по текущим просмотрам видео)."""
+    if tr is None:
+        tr = to_utc_datetime_range(intent.time_range)
+    filters = intent.filters
+    shape = _QueryShape(
+        measure=intent.measure,
+        metric=intent.metric,
+        unique_videos=False,
+        by_creator=bool(filters.creator_id),
+        by_min_views=filters.min_views is not None,
+        export=True,
+    )
+    params: dict[str, Any] = {}
+    if intent.measure == Measure.final:
+        params.update(start=tr.start.replace(tzinfo=None), end=tr.end.replace(tzinfo=None))
+    else:
+        params.update(start=tr.start, end=tr.end)
+    if filters.creator_id:
+        params["creator_id"] = filters.creator_id
+    if filters.min_views is not None:
+        params["min_views"] = filters.min_views
+    return _statement_for_shape(shape), params